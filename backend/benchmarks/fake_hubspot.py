@@ -0,0 +1,194 @@
+"""
+Local stand-in for the HubSpot API, for benchmarks and offline development.
+
+Serves the OAuth token endpoints, CRM object list, search and batch read
+endpoints and the v4 batch association read endpoint from synthetic data,
+with configurable latency, error rate and 429 injection. Point the backend at it with HUBSPOT_API_BASE_URL.
+
+Run from the backend directory:
+    python -m benchmarks.fake_hubspot --port 8100 --records 5000 --latency-ms 20-80
+"""
+import argparse
+import asyncio
+import random
+import secrets
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+@dataclass
+class FakeHubSpotConfig:
+    records: int = 1000
+    latency_ms: Tuple[float, float] = (0.0, 0.0)
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    changed_records: int = 5
+    hub_id: int = 1
+    rate_limit_max: int = 100
+    rate_limit_interval_ms: int = 10000
+
+config = FakeHubSpotConfig()
+app = FastAPI(title="Fake HubSpot")
+
+OBJECT_PROPERTIES = {
+    "contacts": lambda i: {
+        "firstname": f"First{i}", "lastname": f"Last{i}", "email": f"contact{i}@example.com",
+        "phone": "+1234567890", "company": f"Company {i % 50}", "website": "https://example.com",
+        "lastmodifieddate": "2024-01-15T14:30:00.000Z",
+    },
+    "deals": lambda i: {
+        "dealname": f"Deal {i}", "amount": str(1000 + i), "dealstage": "appointmentscheduled",
+        "closedate": "2024-03-15T00:00:00.000Z", "pipeline": "default",
+        "hs_lastmodifieddate": "2024-01-15T14:30:00.000Z",
+    },
+    "companies": lambda i: {
+        "name": f"Company {i}", "domain": f"company{i}.example.com", "industry": "SOFTWARE",
+        "phone": "+1234567890", "city": "Boston", "hs_lastmodifieddate": "2024-01-15T14:30:00.000Z",
+    },
+    "tickets": lambda i: {
+        "subject": f"Ticket {i}", "content": "Something is broken", "hs_ticket_priority": "HIGH",
+        "hs_pipeline_stage": "1", "hs_pipeline": "0", "hs_lastmodifieddate": "2024-01-15T14:30:00.000Z",
+    },
+}
+
+def _record(object_type: str, index: int, properties: Optional[List[str]] = None) -> Dict[str, Any]:
+    values = {
+        "createdate": "2024-01-01T12:00:00.000Z",
+        "hs_created_by_user_id": "1",
+        "hs_object_id": str(index),
+        **OBJECT_PROPERTIES[object_type](index),
+    }
+    if properties:
+        values = {name: values.get(name) for name in properties}
+    return {"id": str(index), "properties": values, "archived": False}
+
+def _rate_limit_headers() -> Dict[str, str]:
+    return {
+        "X-HubSpot-RateLimit-Max": str(config.rate_limit_max),
+        "X-HubSpot-RateLimit-Interval-Milliseconds": str(config.rate_limit_interval_ms),
+        "X-HubSpot-RateLimit-Remaining": str(config.rate_limit_max - 1),
+    }
+
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    low, high = config.latency_ms
+    if high > 0:
+        await asyncio.sleep(random.uniform(low, high) / 1000)
+
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return JSONResponse(
+            {"status": "error", "category": "RATE_LIMITS", "message": "You have reached your secondly limit."},
+            status_code=429,
+            headers={**_rate_limit_headers(), "X-HubSpot-RateLimit-Remaining": "0", "Retry-After": "1"},
+        )
+    if roll < config.rate_limit_rate + config.error_rate:
+        return JSONResponse({"status": "error", "message": "Internal error"}, status_code=500)
+
+    response = await call_next(request)
+    response.headers.update(_rate_limit_headers())
+    return response
+
+@app.post("/oauth/v1/token")
+async def token():
+    return {
+        "token_type": "bearer",
+        "access_token": secrets.token_hex(16),
+        "refresh_token": secrets.token_hex(16),
+        "expires_in": 1800,
+    }
+
+@app.get("/oauth/v1/access-tokens/{access_token}")
+async def access_token_info(access_token: str):
+    return {"token": access_token, "hub_id": config.hub_id, "app_id": 1, "expires_in": 1800}
+
+@app.get("/crm/v3/objects/{object_type}")
+async def list_objects(object_type: str, limit: int = 10, after: int = 0, properties: Optional[str] = None):
+    if object_type not in OBJECT_PROPERTIES:
+        return JSONResponse({"status": "error", "message": "Unknown object type"}, status_code=400)
+
+    requested = properties.split(",") if properties else None
+    end = min(after + min(limit, 100), config.records)
+    body: Dict[str, Any] = {"results": [_record(object_type, index, requested) for index in range(after, end)]}
+    if end < config.records:
+        body["paging"] = {"next": {"after": str(end)}}
+    return body
+
+@app.post("/crm/v3/objects/{object_type}/search")
+async def search_objects(object_type: str, request: Request):
+    # Every search reports the same few "recently modified" records
+    body = await request.json()
+    count = min(config.changed_records, config.records)
+    return {
+        "total": count,
+        "results": [_record(object_type, index, body.get("properties")) for index in range(count)],
+    }
+
+@app.post("/crm/v3/objects/{object_type}/batch/read")
+async def batch_read_objects(object_type: str, request: Request):
+    body = await request.json()
+    ids = [int(entry["id"]) for entry in body.get("inputs", []) if str(entry.get("id", "")).isdigit()]
+    return {
+        "status": "COMPLETE",
+        "results": [_record(object_type, index, body.get("properties")) for index in ids if index < config.records],
+    }
+
+# Every record is linked to company i % COMPANY_COUNT (matching the contacts' company
+# property) and to the record with the same index of every other type
+COMPANY_COUNT = 50
+MAX_LINKED_RECORDS = 10
+
+def _linked_ids(from_type: str, to_type: str, index: int) -> List[int]:
+    if to_type == "companies":
+        return [index % COMPANY_COUNT]
+    if from_type == "companies":
+        linked = range(index, config.records, COMPANY_COUNT) if index < COMPANY_COUNT else []
+        return list(linked)[:MAX_LINKED_RECORDS]
+    return [index]
+
+@app.post("/crm/v4/associations/{from_type}/{to_type}/batch/read")
+async def batch_read_associations(from_type: str, to_type: str, request: Request):
+    body = await request.json()
+    ids = [int(entry["id"]) for entry in body.get("inputs", []) if str(entry.get("id", "")).isdigit()]
+    results = []
+    for index in ids:
+        linked = _linked_ids(from_type, to_type, index) if index < config.records else []
+        if linked:
+            results.append({
+                "from": {"id": str(index)},
+                "to": [
+                    {"toObjectId": target, "associationTypes": [{"category": "HUBSPOT_DEFINED", "typeId": 1, "label": None}]}
+                    for target in linked
+                ],
+            })
+    return {"status": "COMPLETE", "results": results}
+
+def _parse_latency(value: str) -> Tuple[float, float]:
+    low, _, high = value.partition("-")
+    return float(low), float(high or low)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--records", type=int, default=config.records, help="Records per object type")
+    parser.add_argument("--latency-ms", default="0", help="Added latency per request, e.g. 50 or 20-80")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--changed-records", type=int, default=config.changed_records,
+                        help="Records returned by every search (incremental sync)")
+    args = parser.parse_args()
+
+    config.records = args.records
+    config.latency_ms = _parse_latency(args.latency_ms)
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    config.changed_records = args.changed_records
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Load benchmark for the backend API.
+
+Drives /items/{integration_type}, /check-auth/{integration_type} and the OAuth
+callback at fixed concurrency levels and reports p50/p95/p99 latency, requests
+per second and memory. Results are saved as JSON so runs can be compared.
+
+Start the fake HubSpot service and a backend pointed at it, then run the suite
+from the backend directory:
+    python -m benchmarks.fake_hubspot --port 8100 --latency-ms 20-80 &
+    HUBSPOT_API_BASE_URL=http://127.0.0.1:8100 uvicorn main:app --port 8000 &
+    python -m benchmarks.load_test --concurrency 1,10,50 --requests 500 --server-pid <uvicorn pid>
+
+Or run the app in this process (still needs Redis and the fake HubSpot service):
+    python -m benchmarks.load_test --in-process --hubspot-url http://127.0.0.1:8100
+
+Compare against an earlier run:
+    python -m benchmarks.load_test --compare benchmarks/results/load-20240101-120000.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+BENCH_TOKEN = "bench-token"
+
+# Scenario: (prepare, run). prepare does untimed setup for request n; run sends the timed request.
+Prepare = Callable[[httpx.AsyncClient, int], Awaitable[Any]]
+Run = Callable[[httpx.AsyncClient, int, Any], Awaitable[httpx.Response]]
+
+async def _no_prepare(client: httpx.AsyncClient, n: int) -> None:
+    return None
+
+def items_scenario(path: str) -> Dict[str, Any]:
+    async def run(client: httpx.AsyncClient, n: int, prepared: Any) -> httpx.Response:
+        return await client.get(path, headers={"Authorization": f"Bearer {BENCH_TOKEN}"})
+    return {"prepare": _no_prepare, "run": run}
+
+def check_auth_scenario(integration_type: str) -> Dict[str, Any]:
+    async def run(client: httpx.AsyncClient, n: int, prepared: Any) -> httpx.Response:
+        return await client.get(f"/check-auth/{integration_type}")
+    return {"prepare": _no_prepare, "run": run}
+
+def oauth_callback_scenario(run_id: str) -> Dict[str, Any]:
+    # Every callback gets its own user so states don't collide across concurrent requests
+    async def prepare(client: httpx.AsyncClient, n: int) -> str:
+        user_id = f"bench{run_id}u{n}"
+        response = await client.post(
+            "/integrations/hubspot/authorize", data={"user_id": user_id, "org_id": "bench"}
+        )
+        response.raise_for_status()
+        return f"hubspot-{user_id}-bench"
+
+    async def run(client: httpx.AsyncClient, n: int, state: str) -> httpx.Response:
+        return await client.post("/oauth2callback/hubspot", json={"code": "bench-code", "state": state})
+
+    return {"prepare": prepare, "run": run}
+
+async def connect_demo_user(client: httpx.AsyncClient) -> None:
+    """
+    Run one OAuth flow for the demo user so authenticated endpoints have credentials.
+    """
+    response = await client.get("/authorize/hubspot")
+    response.raise_for_status()
+    response = await client.post("/oauth2callback/hubspot", json={"code": "bench-code", "state": "hubspot-demo_user"})
+    response.raise_for_status()
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    """
+    Return the resident set size of a process in MB (this process if pid is None).
+    """
+    status_path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(status_path) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid is None:
+        # Peak RSS; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return None
+
+async def run_level(
+    client: httpx.AsyncClient,
+    name: str,
+    scenario: Dict[str, Any],
+    concurrency: int,
+    total: int,
+    server_pid: Optional[int]
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    counter = itertools.count()
+
+    async def worker() -> None:
+        while True:
+            n = next(counter)
+            if n >= total:
+                return
+            try:
+                prepared = await scenario["prepare"](client, n)
+                started = time.perf_counter()
+                response = await scenario["run"](client, n, prepared)
+                latencies.append(time.perf_counter() - started)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "statuses": dict(statuses),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rss_mb": rss_mb(server_pid),
+    }
+
+def print_results(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None) -> None:
+    previous = {}
+    if baseline:
+        previous = {(row["scenario"], row["concurrency"]): row for row in baseline["results"]}
+
+    print(f"{'scenario':<16} {'conc':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'rss MB':>8}")
+    for row in results:
+        rss = f"{row['rss_mb']:.1f}" if row["rss_mb"] is not None else "-"
+        print(
+            f"{row['scenario']:<16} {row['concurrency']:>5} {row['rps']:>9.1f} {row['p50_ms']:>9.1f} "
+            f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['errors']:>7} {rss:>8}"
+        )
+        before = previous.get((row["scenario"], row["concurrency"]))
+        if before:
+            deltas = []
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                if before[key]:
+                    deltas.append(f"{key} {100 * (row[key] - before[key]) / before[key]:+.1f}%")
+            print(f"{'':<16} {'':>5} vs baseline: {', '.join(deltas)}")
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(results: List[Dict[str, Any]], args: argparse.Namespace) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"load-{timestamp}.json")
+    with open(path, "w") as output:
+        json.dump(
+            {
+                "timestamp": timestamp,
+                "git_commit": git_commit(),
+                "settings": {key: value for key, value in vars(args).items() if key != "compare"},
+                "results": results,
+            },
+            output,
+            indent=2,
+        )
+    return path
+
+async def run_suite(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    run_id = str(int(time.time()))
+    scenarios = {
+        "items": items_scenario(args.items_path),
+        "check-auth": check_auth_scenario("hubspot"),
+        "oauth-callback": oauth_callback_scenario(run_id),
+    }
+    selected = [name.strip() for name in args.scenarios.split(",")]
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    async with AsyncExitStack() as stack:
+        if args.in_process:
+            os.environ["HUBSPOT_API_BASE_URL"] = args.hubspot_url
+            import main
+
+            await stack.enter_async_context(main.app.router.lifespan_context(main.app))
+            transport = httpx.ASGITransport(app=main.app)
+            client = httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=args.timeout)
+        else:
+            client = httpx.AsyncClient(
+                base_url=args.base_url,
+                timeout=args.timeout,
+                limits=httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels)),
+            )
+        await stack.enter_async_context(client)
+
+        await connect_demo_user(client)
+
+        server_pid = None if args.in_process else args.server_pid
+        results = []
+        for name in selected:
+            for concurrency in levels:
+                result = await run_level(client, name, scenarios[name], concurrency, args.requests, server_pid)
+                results.append(result)
+        return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Backend to benchmark")
+    parser.add_argument("--in-process", action="store_true", help="Run main.app in this process instead")
+    parser.add_argument("--hubspot-url", default="http://127.0.0.1:8100", help="Fake HubSpot URL (in-process mode)")
+    parser.add_argument("--server-pid", type=int, help="Backend process ID, to report its memory")
+    parser.add_argument("--scenarios", default="items,check-auth,oauth-callback")
+    parser.add_argument("--items-path", default="/items/hubspot", help="Path (and query) for the items scenario")
+    parser.add_argument("--concurrency", default="1,10,50", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and level")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--no-save", action="store_true", help="Don't write a results file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_suite(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as previous:
+            baseline = json.load(previous)
+    print_results(results, baseline)
+
+    if not args.no_save:
+        print(f"\nSaved results to {save_results(results, args)}")
+
+if __name__ == "__main__":
+    main()
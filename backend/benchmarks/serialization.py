@@ -0,0 +1,113 @@
+"""
+Compare memory per item and encode throughput of the legacy IntegrationItem path
+against the slotted IntegrationItem and the bulk serializer.
+
+Run from the backend directory:
+    python -m benchmarks.serialization --items 100000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from integration_item import IntegrationItem
+from item_serializer import dump_items
+
+class LegacyIntegrationItem:
+    """
+    The original IntegrationItem: a plain class with a per-instance __dict__.
+    """
+
+    def __init__(self, id, name, icon, description, type, created_at, created_by, updated_at, url, metadata=None):
+        self.id = id
+        self.name = name
+        self.icon = icon
+        self.description = description
+        self.type = type
+        self.created_at = created_at
+        self.created_by = created_by
+        self.updated_at = updated_at
+        self.url = url
+        self.metadata = metadata or {}
+
+def _item_fields(index: int) -> Dict[str, Any]:
+    return {
+        "id": str(index),
+        "name": f"Contact {index}",
+        "icon": "https://cdn2.hubspot.net/hubfs/53/image8-2.jpg",
+        "description": f"Email: contact{index}@example.com",
+        "type": "contact",
+        "created_at": "2023-01-01T12:00:00Z",
+        "created_by": "HubSpot",
+        "updated_at": "2023-01-15T14:30:00Z",
+        "url": f"https://app.hubspot.com/contacts/{index}/contact/{index}",
+        "metadata": {
+            "email": f"contact{index}@example.com",
+            "phone": "+1234567890",
+            "company": "ABC Corp",
+            "website": "https://example.com",
+        },
+    }
+
+def measure_memory(factory: Callable[..., Any], count: int) -> float:
+    """
+    Return the bytes allocated per item when building `count` items with `factory`.
+    """
+    fields = [_item_fields(index) for index in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [factory(**item_fields) for item_fields in fields]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+def measure_encode(encode: Callable[[List[Any]], bytes], items: List[Any], repeat: int) -> float:
+    """
+    Return the best encode throughput in items per second over `repeat` runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(items)
+        best = min(best, time.perf_counter() - started)
+    return len(items) / best
+
+def legacy_encode(items: List[LegacyIntegrationItem]) -> bytes:
+    # What the routes did before: per-item __dict__, FastAPI's jsonable_encoder, stdlib json
+    return json.dumps(jsonable_encoder([item.__dict__ for item in items])).encode("utf-8")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50000, help="Number of items per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Encode runs per path (best is reported)")
+    args = parser.parse_args()
+
+    legacy_items = [LegacyIntegrationItem(**_item_fields(index)) for index in range(args.items)]
+    items = [IntegrationItem(**_item_fields(index)) for index in range(args.items)]
+
+    rows = [
+        (
+            "legacy (__dict__ + jsonable_encoder + json)",
+            measure_memory(LegacyIntegrationItem, args.items),
+            measure_encode(legacy_encode, legacy_items, args.repeat),
+        ),
+        (
+            "slotted IntegrationItem + dump_items",
+            measure_memory(IntegrationItem, args.items),
+            measure_encode(dump_items, items, args.repeat),
+        ),
+    ]
+
+    print(f"{args.items} items")
+    print(f"{'path':<46} {'bytes/item':>12} {'items/s':>14}")
+    for name, bytes_per_item, items_per_second in rows:
+        print(f"{name:<46} {bytes_per_item:>12.0f} {items_per_second:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
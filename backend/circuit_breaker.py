@@ -0,0 +1,137 @@
+
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from metrics import CIRCUIT_BREAKER_EVENTS
+
+# A circuit opens when at least CIRCUIT_BREAKER_FAILURE_RATE of the calls in the last
+# CIRCUIT_BREAKER_WINDOW seconds failed (once there were CIRCUIT_BREAKER_MIN_CALLS of them),
+# and stays open for CIRCUIT_BREAKER_OPEN_SECONDS before one probe call is let through
+CIRCUIT_BREAKER_WINDOW = int(os.environ.get("CIRCUIT_BREAKER_WINDOW_SECONDS", "30"))
+CIRCUIT_BREAKER_MIN_CALLS = int(os.environ.get("CIRCUIT_BREAKER_MIN_CALLS", "10"))
+CIRCUIT_BREAKER_FAILURE_RATE = float(os.environ.get("CIRCUIT_BREAKER_FAILURE_RATE", "0.5"))
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.environ.get("CIRCUIT_BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream endpoint whose circuit is open.
+    """
+
+    def __init__(self, upstream: str, endpoint: str, retry_after: float):
+        super().__init__(f"{upstream} {endpoint} is unavailable; retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one upstream endpoint.
+
+    Outcomes are counted in one-second buckets over a sliding window. While the circuit
+    is open, calls fail immediately instead of tying up a worker on a dead upstream; after
+    the open period a single probe is let through, and its outcome closes or reopens it.
+    """
+
+    def __init__(self, upstream: str, endpoint: str):
+        self.upstream = upstream
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        # [second, calls, failures] per second of the window, oldest first
+        self._buckets: Deque[List[int]] = deque()
+        self._calls = 0
+        self._failures = 0
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_BREAKER_EVENTS.inc(self.upstream, self.endpoint, state)
+
+    def _trim(self, second: int) -> None:
+        while self._buckets and self._buckets[0][0] <= second - CIRCUIT_BREAKER_WINDOW:
+            _, calls, failures = self._buckets.popleft()
+            self._calls -= calls
+            self._failures -= failures
+
+    def _reset(self) -> None:
+        self._buckets.clear()
+        self._calls = self._failures = 0
+
+    def acquire(self) -> bool:
+        """
+        Ask to make a call.
+
+        Returns:
+            bool: Whether the call is the half-open probe, to be passed back to record()
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with its probe still in flight
+        """
+        if self.state == CLOSED:
+            return False
+        retry_after = self.opened_at + CIRCUIT_BREAKER_OPEN_SECONDS - time.monotonic()
+        if self.state == OPEN and retry_after <= 0:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        CIRCUIT_BREAKER_EVENTS.inc(self.upstream, self.endpoint, "rejected")
+        raise CircuitOpenError(self.upstream, self.endpoint, max(retry_after, 1.0))
+
+    def record(self, failed: bool, probe: bool) -> None:
+        """
+        Record the outcome of a call made after acquire().
+        """
+        now = time.monotonic()
+        if probe:
+            self.probing = False
+            if failed:
+                self.opened_at = now
+                self._transition(OPEN)
+            else:
+                self._reset()
+                self._transition(CLOSED)
+            return
+
+        second = int(now)
+        self._trim(second)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        self._buckets[-1][1] += 1
+        self._calls += 1
+        if failed:
+            self._buckets[-1][2] += 1
+            self._failures += 1
+        if (
+            self.state == CLOSED
+            and self._calls >= CIRCUIT_BREAKER_MIN_CALLS
+            and self._failures >= self._calls * CIRCUIT_BREAKER_FAILURE_RATE
+        ):
+            self.opened_at = now
+            self._transition(OPEN)
+
+    def release(self, probe: bool) -> None:
+        """
+        End a call without an outcome (cancelled, or cut short by the caller's deadline).
+        """
+        if probe:
+            self.probing = False
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+def get_circuit_breaker(upstream: str, endpoint: str) -> CircuitBreaker:
+    """
+    Return the circuit breaker of an upstream endpoint, creating it on first use.
+
+    Endpoints should be low-cardinality labels (an object type, not a record URL).
+    """
+    breaker = _breakers.get((upstream, endpoint))
+    if breaker is None:
+        breaker = _breakers[(upstream, endpoint)] = CircuitBreaker(upstream, endpoint)
+    return breaker
@@ -0,0 +1,110 @@
+
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, TypeVar
+
+# How long a request may take, unless the client asks for less (or more, up to the maximum)
+# in milliseconds with the X-Request-Timeout-Ms header
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "30"))
+REQUEST_MAX_DEADLINE = float(os.environ.get("REQUEST_MAX_DEADLINE_SECONDS", "120"))
+REQUEST_TIMEOUT_HEADER = b"x-request-timeout-ms"
+
+T = TypeVar("T")
+
+# When the current request has to be answered, in time.monotonic() seconds (None for background work)
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of making, or waiting on, an outbound call the request no longer has time for.
+    """
+
+def remaining() -> Optional[float]:
+    """
+    Return the seconds left until the current deadline, or None if there is none.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+@contextmanager
+def deadline_after(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Run the block under a deadline, or with none when given None.
+
+    A deadline never extends an enclosing one. Tasks started inside the block inherit it;
+    use extended_deadline() for work that should outlive the request, or deadline_after(None)
+    for background jobs that aren't bound by one at all (exports).
+    """
+    previous = _deadline.get()
+    deadline = None
+    if seconds is not None:
+        deadline = time.monotonic() + seconds
+        if previous is not None:
+            deadline = min(deadline, previous)
+    _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        # Set rather than reset, so the block may also be left from another context (an
+        # async generator closed by the event loop)
+        _deadline.set(previous)
+
+@contextmanager
+def extended_deadline() -> Iterator[None]:
+    """
+    Run the block under the longest deadline a request may have (REQUEST_MAX_DEADLINE from
+    now) instead of the current one.
+
+    For work that outlives the request that starts it, such as loads shared with other
+    callers (each waiting with within_deadline) and streams, but should still stop
+    calling upstreams eventually. Background work without a deadline keeps having none.
+    """
+    previous = _deadline.get()
+    if previous is not None:
+        _deadline.set(time.monotonic() + REQUEST_MAX_DEADLINE)
+    try:
+        yield
+    finally:
+        _deadline.set(previous)
+
+async def within_deadline(future: "asyncio.Future[T]") -> T:
+    """
+    Wait for a future until the current deadline, leaving it running if the deadline passes first.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the future is done
+    """
+    timeout = remaining()
+    if timeout is None:
+        return await asyncio.shield(future)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), max(timeout, 0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("The request deadline passed")
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that gives each request a deadline, which outbound calls made while
+    handling it (in this task or tasks it starts) shorten their timeouts to.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        seconds = REQUEST_DEADLINE
+        for name, value in scope["headers"]:
+            if name == REQUEST_TIMEOUT_HEADER:
+                try:
+                    seconds = min(max(int(value) / 1000, 0), REQUEST_MAX_DEADLINE)
+                except ValueError:
+                    pass
+        with deadline_after(seconds):
+            await self.app(scope, receive, send)
@@ -0,0 +1,311 @@
+
+import os
+import gzip
+import json
+import time
+import uuid
+import asyncio
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from fastapi import HTTPException
+from redis.exceptions import LockError
+
+from deadline import deadline_after
+from hubspot_client import get_hubspot_client
+from hubspot_objects import HUBSPOT_OBJECT_TYPES
+from hubspot_scheduler import background_priority, for_portal
+from item_serializer import dump_items_ndjson
+from redis_store import get_redis
+from registry import import_integration
+
+# Export configuration. Files are written to EXPORT_DIR on local disk, which every
+# worker serving downloads must share (one host, or a shared volume).
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")
+EXPORT_JOB_TTL = int(os.environ.get("EXPORT_JOB_TTL", str(7 * 24 * 3600)))
+EXPORT_CONCURRENCY = int(os.environ.get("EXPORT_CONCURRENCY", "2"))
+EXPORT_COMPRESSION_LEVEL = int(os.environ.get("EXPORT_COMPRESSION_LEVEL", "6"))
+# A running job holds a lease renewed with every checkpoint; once it lapses the job can be resumed
+EXPORT_LEASE_TTL = int(os.environ.get("EXPORT_LEASE_TTL", "120"))
+# How often files whose job record has expired are deleted from EXPORT_DIR
+EXPORT_SWEEP_INTERVAL = int(os.environ.get("EXPORT_SWEEP_INTERVAL", "3600"))
+
+EXPORT_MEDIA_TYPE = "application/gzip"
+
+# Export runs started by this process, keyed by job ID
+_running: Dict[str, asyncio.Task] = {}
+_slots: Optional[asyncio.Semaphore] = None
+_sweeper: Optional[asyncio.Task] = None
+
+EXPORT_FILE_SUFFIX = ".ndjson.gz"
+
+def _job_key(job_id: str) -> str:
+    return f"export_job:{job_id}"
+
+def export_path(job_id: str) -> str:
+    """
+    Return where an export job's file is written.
+    """
+    return os.path.join(EXPORT_DIR, f"{job_id}{EXPORT_FILE_SUFFIX}")
+
+async def get_export(job_id: str) -> Optional[Dict[str, Any]]:
+    job_json = await get_redis().get(_job_key(job_id))
+    return json.loads(job_json) if job_json else None
+
+async def _save(job: Dict[str, Any]) -> None:
+    job["updated_at"] = int(time.time())
+    await get_redis().setex(_job_key(job["id"]), EXPORT_JOB_TTL, json.dumps(job))
+
+def export_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The public view of an export job: its state (queued, running, stalled, completed or
+    failed) and progress, without the paging checkpoint.
+    """
+    state = job["status"]
+    if state == "running" and time.time() - job["updated_at"] > EXPORT_LEASE_TTL:
+        # No checkpoint within the lease: the process running it is gone, so it can be resumed
+        state = "stalled"
+    status = {
+        "id": job["id"],
+        "status": state,
+        "object_types": job["object_types"],
+        "fields": job["fields"],
+        "progress": {
+            "object_type": job["object_types"][job["object_type_index"]]
+            if job["object_type_index"] < len(job["object_types"]) else None,
+            "object_types_done": job["object_type_index"],
+            "items": job["items_written"],
+            "items_by_type": job["items_by_type"],
+            "bytes": job["bytes_written"],
+        },
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "completed_at": job.get("completed_at"),
+        "error": job.get("error"),
+    }
+    if job["status"] == "completed":
+        status["download_url"] = f"/exports/{job['id']}/download"
+    return status
+
+async def create_export(
+    user_id: str,
+    org_id: Optional[str] = None,
+    object_types: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Record a HubSpot export job and start running it in the background.
+
+    Args:
+        user_id: The ID of the user whose stored credentials the export runs with
+        org_id: The ID of the organization (optional)
+        object_types: The CRM object types to export (defaults to every supported type)
+        fields: IntegrationItem fields to write; only their properties are requested (optional)
+
+    Returns:
+        Dict[str, Any]: The new job
+    """
+    object_types = object_types or list(HUBSPOT_OBJECT_TYPES)
+    unsupported = [object_type for object_type in object_types if object_type not in HUBSPOT_OBJECT_TYPES]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported HubSpot object type: {', '.join(unsupported)}")
+
+    now = int(time.time())
+    job = {
+        "id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "org_id": org_id,
+        "status": "queued",
+        "object_types": object_types,
+        "fields": fields,
+        # Checkpoint: the object type being exported, the cursor of its next page and how
+        # much of the file is complete; anything past bytes_written is discarded on resume
+        "object_type_index": 0,
+        "after": None,
+        "bytes_written": 0,
+        "items_written": 0,
+        "items_by_type": {},
+        "created_at": now,
+        "updated_at": now,
+    }
+    await _save(job)
+    _start(job["id"])
+    return job
+
+async def resume_export(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Restart a failed or abandoned export from its last checkpoint.
+
+    Raises:
+        HTTPException: 409 if the job is complete or still running
+    """
+    if job["status"] == "completed":
+        raise HTTPException(status_code=409, detail="Export is already complete")
+    if job["id"] in _running or await get_redis().exists(f"{_job_key(job['id'])}:lease"):
+        raise HTTPException(status_code=409, detail="Export is still running")
+    job["status"] = "queued"
+    job.pop("error", None)
+    await _save(job)
+    _start(job["id"])
+    return job
+
+def _start(job_id: str) -> None:
+    # The export outlives the request that started it, so it doesn't inherit its deadline
+    with deadline_after(None):
+        task = asyncio.ensure_future(_run_export(job_id))
+    _running[job_id] = task
+    task.add_done_callback(lambda _: _running.pop(job_id, None))
+
+def _open_at(path: str, size: int) -> BinaryIO:
+    """
+    Open the export file for appending after its last checkpoint, dropping any partial write.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file = open(path, "r+b" if os.path.exists(path) else "w+b")
+    file.truncate(size)
+    file.seek(size)
+    return file
+
+def _append(file: BinaryIO, chunk: bytes) -> int:
+    file.write(chunk)
+    file.flush()
+    return file.tell()
+
+async def _export_pages(job: Dict[str, Any], file: BinaryIO, lock) -> None:
+    hubspot = import_integration("hubspot")
+    client = get_hubspot_client()
+    while job["object_type_index"] < len(job["object_types"]):
+        object_type = job["object_types"][job["object_type_index"]]
+        # Credentials are looked up per page, so a long export outlives the access token
+        auth = await hubspot.get_hubspot_credentials(job["user_id"], job["org_id"])
+        if not auth.get("authenticated"):
+            raise RuntimeError("HubSpot is no longer connected")
+
+        with for_portal(auth["credentials"].get("hub_id")):
+            items, after = await hubspot.fetch_object_page(
+                client, auth["credentials"]["access_token"], object_type, job["fields"], job["after"]
+            )
+        if items:
+            # Each page is its own gzip member; concatenated members are one valid gzip file
+            chunk = await asyncio.to_thread(
+                gzip.compress, dump_items_ndjson(items, job["fields"]), EXPORT_COMPRESSION_LEVEL
+            )
+            job["bytes_written"] = await asyncio.to_thread(_append, file, chunk)
+            job["items_written"] += len(items)
+            job["items_by_type"][object_type] = job["items_by_type"].get(object_type, 0) + len(items)
+
+        job["after"] = after
+        if not after:
+            job["object_type_index"] += 1
+        await _save(job)
+        await lock.reacquire()
+
+async def _run_export(job_id: str) -> None:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(EXPORT_CONCURRENCY)
+
+    async with _slots:
+        lock = get_redis().lock(f"{_job_key(job_id)}:lease", timeout=EXPORT_LEASE_TTL)
+        if not await lock.acquire(blocking=False):
+            return
+        job = None
+        try:
+            job = await get_export(job_id)
+            if job is None or job["status"] == "completed":
+                return
+
+            path = export_path(job_id)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < job["bytes_written"]:
+                # The file lost data the checkpoint counted (e.g. the host crashed before it
+                # was flushed to disk), so the export starts over
+                job.update(object_type_index=0, after=None, bytes_written=0, items_written=0, items_by_type={})
+            job["status"] = "running"
+            await _save(job)
+
+            file = await asyncio.to_thread(_open_at, path, job["bytes_written"])
+            try:
+                with background_priority():
+                    await _export_pages(job, file, lock)
+            finally:
+                file.close()
+
+            job["status"] = "completed"
+            job["completed_at"] = int(time.time())
+            await _save(job)
+        except asyncio.CancelledError:
+            if job is not None:
+                job["status"] = "failed"
+                job["error"] = "Interrupted"
+                await _save(job)
+            raise
+        except Exception as e:
+            print(f"Error exporting HubSpot items for job {job_id}: {str(e)}")
+            if job is not None:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                await _save(job)
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                pass
+
+def _export_file_job_ids() -> List[str]:
+    if not os.path.isdir(EXPORT_DIR):
+        return []
+    return [name[:-len(EXPORT_FILE_SUFFIX)] for name in os.listdir(EXPORT_DIR) if name.endswith(EXPORT_FILE_SUFFIX)]
+
+async def sweep_export_files() -> int:
+    """
+    Delete the export files whose job record has expired (after EXPORT_JOB_TTL), which
+    can no longer be downloaded or resumed.
+
+    Returns:
+        int: The number of files deleted
+    """
+    removed = 0
+    for job_id in await asyncio.to_thread(_export_file_job_ids):
+        # The job record is saved before its file is created, so a live job is never swept
+        if await get_redis().exists(_job_key(job_id)):
+            continue
+        try:
+            await asyncio.to_thread(os.remove, export_path(job_id))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+async def _run_sweeper() -> None:
+    while True:
+        try:
+            await sweep_export_files()
+        except Exception as e:
+            print(f"Error deleting expired export files: {str(e)}")
+        await asyncio.sleep(EXPORT_SWEEP_INTERVAL)
+
+def start_export_sweeper() -> None:
+    """
+    Start the background task that deletes expired export files every EXPORT_SWEEP_INTERVAL seconds.
+    """
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_run_sweeper())
+
+async def stop_export_jobs() -> None:
+    """
+    Stop the exports running in this process, which are left failed and can be resumed,
+    and the expired file sweep.
+    """
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
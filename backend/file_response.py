@@ -0,0 +1,87 @@
+
+import os
+import re
+import asyncio
+from email.utils import formatdate
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+# Bytes read per chunk
+FILE_CHUNK_SIZE = 256 * 1024
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Resolve a single-range Range header ("bytes=0-99", "bytes=100-", "bytes=-100") against a file size.
+
+    Returns:
+        Optional[Tuple[int, int]]: The first and last byte to send, or None to send the whole
+            file (no header, or one that isn't a single byte range, which HTTP allows ignoring)
+
+    Raises:
+        HTTPException: 416 if the range lies outside the file
+    """
+    match = _RANGE.fullmatch(header.strip()) if header else None
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.group(1), match.group(2)
+    if first == "":
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+class RangedFileResponse(Response):
+    """
+    Serve a file, or the byte range the request asked for, read in chunks off the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        range_header: Optional[str] = None,
+        media_type: str = "application/octet-stream",
+        filename: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        stat_result = os.stat(path)
+        size = stat_result.st_size
+        byte_range = parse_range(range_header, size)
+        self.path = path
+        self.start, self.end = byte_range if byte_range is not None else (0, size - 1)
+        super().__init__(status_code=200 if byte_range is None else 206, media_type=media_type, headers=headers)
+
+        self.headers["content-length"] = str(self.end - self.start + 1)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        if byte_range is not None:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+        if filename:
+            self.headers["content-disposition"] = f'attachment; filename="{filename}"'
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            offset = self.start
+            while True:
+                chunk = await asyncio.to_thread(os.pread, file.fileno(), min(FILE_CHUNK_SIZE, count), offset)
+                count -= len(chunk)
+                offset += len(chunk)
+                more_body = bool(chunk) and count > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not more_body:
+                    return
+        finally:
+            file.close()
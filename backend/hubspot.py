@@ -1,25 +1,88 @@
 
 import os
 import json
-import requests
-from typing import List, Optional, Dict, Any
+import time
+import asyncio
+import hashlib
+import httpx
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException, Request
-import redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import LockError, WatchError
 from urllib.parse import urlencode
 
 from integration_item import IntegrationItem
+from circuit_breaker import CircuitOpenError
+from deadline import DeadlineExceeded, extended_deadline, within_deadline
+from hubspot_associations import attach_associations
+from hubspot_client import HUBSPOT_API_BASE_URL, HubSpotClient, get_hubspot_client
+from hubspot_objects import HUBSPOT_OBJECT_TYPES
+from hubspot_scheduler import for_portal
+import item_store
+from invalidation import invalidation_active, invalidation_generation, publish_invalidation, register_invalidation_handler
+from item_cache import invalidate_items
+from metrics import CREDENTIAL_CACHE_LOOKUPS, span
+from prefetch import queue_prefetch
+from redis_store import get_redis
+from singleflight import singleflight
+from ttl_cache import TTLCache
 
 # HubSpot API configuration
 HUBSPOT_CLIENT_ID = os.environ.get("HUBSPOT_CLIENT_ID", "your-hubspot-client-id")
 HUBSPOT_CLIENT_SECRET = os.environ.get("HUBSPOT_CLIENT_SECRET", "your-hubspot-client-secret")
 HUBSPOT_REDIRECT_URI = os.environ.get("HUBSPOT_REDIRECT_URI", "http://localhost:3000")
 HUBSPOT_AUTH_URL = "https://app.hubspot.com/oauth/authorize"
-HUBSPOT_TOKEN_URL = "https://api.hubapi.com/oauth/v1/token"
+HUBSPOT_TOKEN_URL = f"{HUBSPOT_API_BASE_URL}/oauth/v1/token"
+HUBSPOT_SCOPES = (
+    "contacts content crm.objects.contacts.read crm.objects.deals.read "
+    "crm.objects.companies.read tickets"
+)
 
-# Redis client for storing credentials
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+# CRM object types loaded by get_items_hubspot and how many are fetched at once
+HUBSPOT_DEFAULT_OBJECT_TYPES = [
+    object_type.strip()
+    for object_type in os.environ.get("HUBSPOT_OBJECT_TYPES", "contacts,deals,companies,tickets").split(",")
+    if object_type.strip()
+]
+HUBSPOT_FETCH_CONCURRENCY = int(os.environ.get("HUBSPOT_FETCH_CONCURRENCY", "4"))
 
-def authorize_hubspot(user_id: str, org_id: str = None) -> Dict[str, Any]:
+# Records requested per page (HubSpot allows up to 100) and pages buffered while streaming
+HUBSPOT_PAGE_SIZE = int(os.environ.get("HUBSPOT_PAGE_SIZE", "100"))
+HUBSPOT_STREAM_BUFFER_PAGES = int(os.environ.get("HUBSPOT_STREAM_BUFFER_PAGES", "4"))
+
+# Batch reads: records per upstream call (the HubSpot maximum) and IDs accepted per request
+HUBSPOT_BATCH_READ_SIZE = 100
+HUBSPOT_BATCH_READ_MAX_IDS = int(os.environ.get("HUBSPOT_BATCH_READ_MAX_IDS", "10000"))
+
+# Incremental sync: overlap subtracted from the watermark to absorb HubSpot search
+# indexing lag, and how often a full resync runs to drop records deleted in HubSpot
+HUBSPOT_SYNC_OVERLAP_MS = int(os.environ.get("HUBSPOT_SYNC_OVERLAP_SECONDS", "60")) * 1000
+HUBSPOT_FULL_SYNC_INTERVAL_MS = int(os.environ.get("HUBSPOT_FULL_SYNC_INTERVAL_SECONDS", str(24 * 3600))) * 1000
+# An object type synced more recently than this is served from the store without asking
+# HubSpot; the prefetch workers sync active users more often, so their loads stay warm
+HUBSPOT_SYNC_MIN_INTERVAL_MS = int(os.environ.get("HUBSPOT_SYNC_MIN_INTERVAL_SECONDS", "60")) * 1000
+# The CRM search endpoint can't page past this many results
+HUBSPOT_SEARCH_MAX_RESULTS = 10000
+
+# Credential storage: how long the Redis key is kept (it holds the refresh token),
+# how long before expiry an access token is refreshed, and the refresh lease settings
+HUBSPOT_CREDENTIALS_TTL = int(os.environ.get("HUBSPOT_CREDENTIALS_TTL", str(30 * 24 * 3600)))
+HUBSPOT_REFRESH_WINDOW = int(os.environ.get("HUBSPOT_REFRESH_WINDOW", "300"))
+HUBSPOT_REFRESH_LOCK_TTL = int(os.environ.get("HUBSPOT_REFRESH_LOCK_TTL", "30"))
+HUBSPOT_REFRESH_POLL_INTERVAL = 0.1
+
+# In-process cache of decoded credentials (and of users without any), kept consistent
+# across processes by an invalidation published with every credential write
+HUBSPOT_CREDENTIALS_CACHE_TTL = float(os.environ.get("HUBSPOT_CREDENTIALS_CACHE_TTL", "30"))
+HUBSPOT_CREDENTIALS_CACHE_MAX_ENTRIES = int(os.environ.get("HUBSPOT_CREDENTIALS_CACHE_MAX_ENTRIES", "10000"))
+CREDENTIALS_CACHE = "hubspot_credentials"
+_NOT_CONNECTED = object()
+_credentials_cache = TTLCache(HUBSPOT_CREDENTIALS_CACHE_MAX_ENTRIES, HUBSPOT_CREDENTIALS_CACHE_TTL)
+
+# Token refreshes in flight in this process, keyed by credentials key
+_refresh_tasks: Dict[str, asyncio.Future] = {}
+
+async def authorize_hubspot(user_id: str, org_id: str = None) -> Dict[str, Any]:
     """
     Generate the authorization URL for HubSpot OAuth flow.
     
@@ -36,13 +99,13 @@ def authorize_hubspot(user_id: str, org_id: str = None) -> Dict[str, Any]:
         state = f"{state}-{org_id}"
     
     # Store the state in Redis with an expiry time (e.g., 1 hour)
-    redis_client.setex(f"state:{state}", 3600, user_id)
+    await get_redis().setex(f"state:{state}", 3600, user_id)
     
     # Define the authorization parameters
     params = {
         "client_id": HUBSPOT_CLIENT_ID,
         "redirect_uri": HUBSPOT_REDIRECT_URI,
-        "scope": "contacts content crm.objects.contacts.read crm.objects.deals.read",
+        "scope": HUBSPOT_SCOPES,
         "state": state
     }
     
@@ -68,8 +131,11 @@ async def oauth2callback_hubspot(request: Request) -> Dict[str, Any]:
     if not code or not state:
         raise HTTPException(status_code=400, detail="Missing code or state parameter")
     
-    # Validate the state parameter
-    stored_user_id = redis_client.get(f"state:{state}")
+    # Validate and consume the state parameter atomically in one round-trip,
+    # so a state can't be replayed by a concurrent callback
+    with span("oauth2callback_hubspot", "consume_state"):
+        async with get_redis().pipeline(transaction=True) as pipe:
+            stored_user_id, _ = await pipe.get(f"state:{state}").delete(f"state:{state}").execute()
     if not stored_user_id:
         raise HTTPException(status_code=400, detail="Invalid state parameter")
     
@@ -92,30 +158,56 @@ async def oauth2callback_hubspot(request: Request) -> Dict[str, Any]:
     }
     
     try:
-        response = requests.post(HUBSPOT_TOKEN_URL, data=token_data)
-        response.raise_for_status()
-        credentials = response.json()
+        client = get_hubspot_client()
+        with span("oauth2callback_hubspot", "token_exchange"):
+            credentials = await client.post_form(HUBSPOT_TOKEN_URL, token_data)
         
-        # Construct a key for Redis that includes org_id if available
-        creds_key = f"hubspot_credentials:{user_id}"
-        if org_id:
-            creds_key = f"hubspot_credentials:{user_id}:{org_id}"
+        # Look up the portal so webhook events can be routed to this user/org. The code is
+        # already spent, so if the lookup fails the credentials are stored without it.
+        try:
+            with span("oauth2callback_hubspot", "portal_lookup"):
+                token_info = await client.get_json(f"/oauth/v1/access-tokens/{credentials['access_token']}", None)
+            credentials["hub_id"] = token_info.get("hub_id")
+        except (httpx.HTTPError, CircuitOpenError, DeadlineExceeded) as e:
+            # The error text carries the lookup URL, which contains the access token
+            print(f"Error looking up HubSpot portal: {str(e).replace(credentials['access_token'], '<access token>')}")
         
-        # Store the credentials in Redis
-        redis_client.setex(
-            creds_key,
-            credentials.get('expires_in', 3600),
-            json.dumps(credentials)
-        )
+        # Store the credentials with their absolute expiry, move the user from the previous
+        # connection's portal index to the new one's, drop items stored for the previous
+        # connection and queue a prefetch of the new one's items, in one transaction
+        creds_key = _credentials_key(user_id, org_id)
+        member = json.dumps([user_id, org_id])
+        generation = invalidation_generation()
+        with span("oauth2callback_hubspot", "store_credentials"):
+            async with get_redis().pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        # Watch the stored credentials, so the previous portal read here is the one replaced
+                        await pipe.watch(creds_key)
+                        previous_json = await pipe.get(creds_key)
+                        previous_hub_id = json.loads(previous_json).get("hub_id") if previous_json else None
+                        pipe.multi()
+                        _store_credentials(creds_key, credentials, pipe)
+                        if previous_hub_id and previous_hub_id != credentials.get("hub_id"):
+                            pipe.srem(portal_key(previous_hub_id), member)
+                        if credentials.get("hub_id"):
+                            pipe.sadd(portal_key(credentials["hub_id"]), member)
+                        item_store.clear_items("hubspot", user_id, org_id, list(HUBSPOT_OBJECT_TYPES), pipe)
+                        queue_prefetch("hubspot", user_id, org_id, pipe)
+                        await pipe.execute()
+                        break
+                    except WatchError:
+                        # The credentials changed since they were read (a concurrent refresh); read them again
+                        continue
         
-        # Delete the state key
-        redis_client.delete(f"state:{state}")
+        _cache_credentials(creds_key, credentials, generation)
+        await invalidate_items("hubspot", user_id, org_id)
         
         return {"success": True, "credentials": credentials}
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Error exchanging code for token: {str(e)}")
 
-def refresh_hubspot_token(refresh_token: str) -> Dict[str, Any]:
+async def refresh_hubspot_token(refresh_token: str) -> Dict[str, Any]:
     """
     Refresh the HubSpot access token using the refresh token.
     
@@ -124,6 +216,10 @@ def refresh_hubspot_token(refresh_token: str) -> Dict[str, Any]:
         
     Returns:
         Dict[str, Any]: The refreshed credentials
+        
+    Raises:
+        HTTPException: 401 if HubSpot rejects the refresh token (invalid_grant), 502 if
+            the token endpoint fails or can't be reached, which says nothing about the token
     """
     token_data = {
         "grant_type": "refresh_token",
@@ -133,191 +229,737 @@ def refresh_hubspot_token(refresh_token: str) -> Dict[str, Any]:
     }
     
     try:
-        response = requests.post(HUBSPOT_TOKEN_URL, data=token_data)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Error refreshing token: {str(e)}")
+        return await get_hubspot_client().post_form(HUBSPOT_TOKEN_URL, token_data)
+    except httpx.HTTPStatusError as e:
+        if _is_invalid_grant(e.response):
+            raise HTTPException(status_code=401, detail="HubSpot rejected the refresh token; reconnect HubSpot")
+        raise HTTPException(status_code=502, detail=f"Error refreshing token: {str(e)}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error refreshing token: {str(e)}")
+
+def _is_invalid_grant(response: httpx.Response) -> bool:
+    # HubSpot answers a revoked or unknown refresh token with 400 and error "invalid_grant"
+    # (status "BAD_REFRESH_TOKEN" in its older error format)
+    if response.status_code not in (400, 401):
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and (
+        body.get("error") == "invalid_grant" or body.get("status") == "BAD_REFRESH_TOKEN"
+    )
+
+def _credentials_key(user_id: str, org_id: str = None) -> str:
+    # Construct key based on whether org_id is provided
+    if org_id:
+        return f"hubspot_credentials:{user_id}:{org_id}"
+    return f"hubspot_credentials:{user_id}"
+
+def portal_key(hub_id: Any) -> str:
+    # Set of [user_id, org_id] pairs connected to a HubSpot portal
+    return f"hubspot_portal:{hub_id}"
+
+def _store_credentials(creds_key: str, credentials: Dict[str, Any], pipe: Pipeline) -> Dict[str, Any]:
+    """
+    Stamp the credentials with an absolute expiry and queue their write on a Redis pipeline,
+    along with the invalidation of other processes' cached copies.
+    
+    The Redis key outlives the access token so the refresh token stays available.
+    """
+    credentials["expires_at"] = int(time.time()) + int(credentials.get('expires_in', 3600))
+    pipe.setex(creds_key, HUBSPOT_CREDENTIALS_TTL, json.dumps(credentials))
+    publish_invalidation(CREDENTIALS_CACHE, creds_key, pipe)
+    return credentials
+
+def _cache_credentials(creds_key: str, credentials: Optional[Dict[str, Any]], generation: int) -> None:
+    """
+    Keep decoded credentials (or their absence) in the in-process cache.
+    
+    Nothing is cached unless invalidations are being received and none arrived since
+    generation was read. Tokens are only cached until they enter the refresh window,
+    so a cache hit never needs a refresh.
+    """
+    if not invalidation_active() or invalidation_generation() != generation:
+        return
+    if credentials is None:
+        _credentials_cache.set(creds_key, _NOT_CONNECTED)
+        return
+    ttl = HUBSPOT_CREDENTIALS_CACHE_TTL
+    if 'refresh_token' in credentials:
+        if credentials.get('expires_at') is None:
+            return
+        ttl = min(ttl, credentials['expires_at'] - HUBSPOT_REFRESH_WINDOW - time.time())
+    if ttl > 0:
+        _credentials_cache.set(creds_key, credentials, ttl)
+
+def _invalidate_cached_credentials(creds_key: Optional[str]) -> None:
+    if creds_key is None:
+        _credentials_cache.clear()
+    else:
+        _credentials_cache.delete(creds_key)
+
+register_invalidation_handler(CREDENTIALS_CACHE, _invalidate_cached_credentials)
+
+async def _load_credentials(creds_key: str) -> Optional[Dict[str, Any]]:
+    credentials_json = await get_redis().get(creds_key)
+    if not credentials_json:
+        return None
+    return json.loads(credentials_json)
 
-async def get_hubspot_credentials(user_id: str, org_id: str = None) -> Optional[Dict[str, Any]]:
+def _needs_refresh(credentials: Dict[str, Any], window: int = HUBSPOT_REFRESH_WINDOW) -> bool:
+    """
+    Check whether the access token is inside the refresh window (seconds) before its expiry.
+    
+    Credentials stored without an expiry (before expiry tracking existed) are refreshed once.
+    """
+    if 'refresh_token' not in credentials:
+        return False
+    expires_at = credentials.get('expires_at')
+    if expires_at is None:
+        return True
+    return expires_at - time.time() <= window
+
+async def _refresh_credentials(creds_key: str, window: int = HUBSPOT_REFRESH_WINDOW) -> Dict[str, Any]:
+    """
+    Refresh the stored credentials while holding a Redis lease, so only one worker
+    calls HubSpot per user/org. Workers that lose the race wait for the winner's result.
+    
+    Runs under the longest request deadline rather than its first caller's;
+    get_hubspot_credentials bounds each caller's wait by its own.
+    """
+    lock = get_redis().lock(f"{creds_key}:refresh_lock", timeout=HUBSPOT_REFRESH_LOCK_TTL)
+    
+    while True:
+        credentials = await _load_credentials(creds_key)
+        if credentials is None:
+            return {"authenticated": False}
+        if not _needs_refresh(credentials, window):
+            # Another worker refreshed while we waited for the lease
+            return {"authenticated": True, "credentials": credentials}
+        
+        if await lock.acquire(blocking=False):
+            break
+        await asyncio.sleep(HUBSPOT_REFRESH_POLL_INTERVAL)
+    
+    try:
+        generation = invalidation_generation()
+        try:
+            new_credentials = await refresh_hubspot_token(credentials['refresh_token'])
+        except (CircuitOpenError, DeadlineExceeded):
+            # HubSpot couldn't be asked, which says nothing about the refresh token: keep it
+            if credentials.get('expires_at', 0) > time.time():
+                return {"authenticated": True, "credentials": credentials}
+            raise
+        except HTTPException as e:
+            # Keep serving a token that is still valid
+            if credentials.get('expires_at', 0) > time.time():
+                return {"authenticated": True, "credentials": credentials}
+            if e.status_code != 401:
+                # HubSpot failed or couldn't be reached; the refresh token may still work next time
+                raise
+            # The refresh token was rejected, so the credentials can no longer be used
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.delete(creds_key)
+                publish_invalidation(CREDENTIALS_CACHE, creds_key, pipe)
+                await pipe.execute()
+            _cache_credentials(creds_key, None, generation)
+            return {"authenticated": False}
+        
+        new_credentials.setdefault('refresh_token', credentials['refresh_token'])
+        if credentials.get('hub_id'):
+            new_credentials.setdefault('hub_id', credentials['hub_id'])
+        async with get_redis().pipeline(transaction=False) as pipe:
+            _store_credentials(creds_key, new_credentials, pipe)
+            await pipe.execute()
+        _cache_credentials(creds_key, new_credentials, generation)
+        return {"authenticated": True, "credentials": new_credentials}
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            # The lease expired while refreshing; another worker may already hold it
+            pass
+
+async def get_hubspot_credentials(
+    user_id: str,
+    org_id: str = None,
+    refresh_window: int = HUBSPOT_REFRESH_WINDOW
+) -> Optional[Dict[str, Any]]:
     """
     Retrieve the stored HubSpot credentials for the current user.
     
+    The cached access token is returned while it is valid. It is refreshed only once
+    it enters the refresh window before expiry, and concurrent callers for the same
+    user/org share a single refresh. Repeat lookups are answered from the in-process
+    credentials cache without a Redis round-trip.
+    
     Args:
         user_id: The ID of the current user
         org_id: The ID of the organization (optional)
+        refresh_window: Refresh the token if it expires within this many seconds; the
+            prefetch workers pass a wider window so requests rarely wait on a refresh
         
     Returns:
         Optional[Dict[str, Any]]: The stored credentials, or None if not found
+        
+    Raises:
+        DeadlineExceeded: If an expired token's refresh outlasts the request's deadline
     """
-    # Construct key based on whether org_id is provided
-    creds_key = f"hubspot_credentials:{user_id}"
-    if org_id:
-        creds_key = f"hubspot_credentials:{user_id}:{org_id}"
-    
-    credentials_json = redis_client.get(creds_key)
+    creds_key = _credentials_key(user_id, org_id)
     
-    if not credentials_json:
+    credentials = _credentials_cache.get(creds_key) if invalidation_active() else None
+    if credentials is not None:
+        CREDENTIAL_CACHE_LOOKUPS.inc("hubspot", "hit")
+    else:
+        CREDENTIAL_CACHE_LOOKUPS.inc("hubspot", "miss")
+        generation = invalidation_generation()
+        with span("get_hubspot_credentials", "load"):
+            credentials = await _load_credentials(creds_key)
+        _cache_credentials(creds_key, credentials, generation)
+    if credentials is None or credentials is _NOT_CONNECTED:
         return {"authenticated": False}
     
-    credentials = json.loads(credentials_json)
+    if not _needs_refresh(credentials, refresh_window):
+        return {"authenticated": True, "credentials": credentials}
     
-    # Check if the access token has expired and needs to be refreshed
-    if 'refresh_token' in credentials:
+    # Join an in-flight refresh for this key in this process, or start one
+    refresh = _refresh_tasks.get(creds_key)
+    if refresh is None:
+        # Shared by callers with different deadlines, so it gets the longest one a request
+        # may have rather than its first caller's
+        with extended_deadline():
+            refresh = asyncio.ensure_future(_refresh_credentials(creds_key, refresh_window))
+        _refresh_tasks[creds_key] = refresh
+        refresh.add_done_callback(lambda _: _refresh_tasks.pop(creds_key, None))
+    
+    # Each caller waits until its own deadline; the shared refresh is shielded, so one
+    # cancelled or timed out caller doesn't cancel it for the others
+    with span("get_hubspot_credentials", "refresh"):
         try:
-            new_credentials = refresh_hubspot_token(credentials['refresh_token'])
-            
-            # Update the stored credentials
-            redis_client.setex(
-                creds_key,
-                new_credentials.get('expires_in', 3600),
-                json.dumps(new_credentials)
-            )
-            
-            return {"authenticated": True, "credentials": new_credentials}
-        except HTTPException:
-            # If the refresh token is invalid, return None to trigger a new authorization
-            redis_client.delete(creds_key)
-            return {"authenticated": False}
+            return await within_deadline(refresh)
+        except DeadlineExceeded:
+            # The refresh goes on in the background; a token that hasn't expired yet still works
+            if credentials.get('expires_at', 0) > time.time():
+                return {"authenticated": True, "credentials": credentials}
+            raise
+
+def parse_access_token(credentials_str: str) -> str:
+    """
+    Extract the HubSpot access token from a credentials JSON string or a bare token.
     
-    return {"authenticated": True, "credentials": credentials}
+    Args:
+        credentials_str: JSON string containing the credentials or token
+        
+    Returns:
+        str: The access token
+    """
+    # First, try to parse as JSON
+    try:
+        credentials = json.loads(credentials_str)
+        access_token = credentials.get('access_token')
+    except json.JSONDecodeError:
+        # If it's not JSON, treat it as a direct token
+        access_token = credentials_str
+    
+    if not access_token:
+        raise HTTPException(status_code=401, detail="HubSpot authentication required")
+    
+    return access_token
 
-async def get_items_hubspot(credentials_str: str) -> List[Dict]:
+async def hubspot_portal(credentials_str: str, user_id: Optional[str] = None, org_id: Optional[str] = None) -> Optional[Any]:
     """
-    Retrieve a list of items from HubSpot using the provided credentials.
+    Find the portal a connection belongs to, so its calls share the portal's rate limits (see for_portal).
+    
+    Credentials JSON carries the portal ID. For a bare access token, it is taken from the
+    user's stored credentials if they hold that token.
     
     Args:
         credentials_str: JSON string containing the credentials or token
+        user_id: The ID of the user the token may belong to (optional)
+        org_id: The ID of the organization (optional)
         
     Returns:
-        List[Dict]: A list of integration items as dictionaries
+        Optional[Any]: The portal ID, or None if it isn't known
     """
     try:
-        # First, try to parse as JSON
-        try:
-            credentials = json.loads(credentials_str)
-            access_token = credentials.get('access_token')
-        except json.JSONDecodeError:
-            # If it's not JSON, treat it as a direct token
-            access_token = credentials_str
+        credentials = json.loads(credentials_str)
+    except json.JSONDecodeError:
+        credentials = None
+    if isinstance(credentials, dict):
+        return credentials.get("hub_id")
+    if user_id is None:
+        return None
+    
+    creds_key = _credentials_key(user_id, org_id)
+    stored = _credentials_cache.get(creds_key) if invalidation_active() else None
+    if stored is None:
+        stored = await _load_credentials(creds_key)
+    if isinstance(stored, dict) and stored.get("access_token") == credentials_str:
+        return stored.get("hub_id")
+    return None
+
+async def fetch_object_page(
+    client: HubSpotClient,
+    access_token: str,
+    object_type: str,
+    fields: Optional[List[str]] = None,
+    after: Optional[str] = None
+) -> Tuple[List[IntegrationItem], Optional[str]]:
+    """
+    Fetch one page of a CRM object type.
+    
+    Args:
+        client: The HubSpot client
+        access_token: The HubSpot access token
+        object_type: The CRM object type to load
+        fields: IntegrationItem fields the caller needs; only their properties are requested (optional)
+        after: The paging cursor returned with the previous page (None for the first page)
         
-        if not access_token:
-            raise HTTPException(status_code=401, detail="HubSpot authentication required")
+    Returns:
+        Tuple[List[IntegrationItem], Optional[str]]: The mapped items and the cursor of the next page, if any
+    """
+    spec = HUBSPOT_OBJECT_TYPES.get(object_type)
+    if spec is None:
+        raise ValueError(f"Unsupported HubSpot object type: {object_type}")
+    
+    params = {"limit": HUBSPOT_PAGE_SIZE, "properties": ",".join(spec.properties_for(fields))}
+    if after:
+        params["after"] = after
+    data = await client.get_json(f"/crm/v3/objects/{object_type}", access_token, params=params)
+    
+    with span("hubspot_items", "map"):
+        items = [spec.mapper(record) for record in data.get('results', [])]
+    return items, data.get('paging', {}).get('next', {}).get('after')
+
+async def iter_object_pages(
+    client: HubSpotClient,
+    access_token: str,
+    object_type: str,
+    semaphore: asyncio.Semaphore,
+    fields: Optional[List[str]] = None,
+    include_associations: bool = False
+) -> AsyncIterator[List[IntegrationItem]]:
+    """
+    Walk every page of one CRM object type, following the paging.next.after cursor.
+    
+    Args:
+        client: The HubSpot client
+        access_token: The HubSpot access token
+        object_type: The CRM object type to load
+        semaphore: Bounds how many page requests are in flight at once
+        fields: IntegrationItem fields the caller needs; only their properties are requested (optional)
+        include_associations: Link each item to its associated records, a few batch calls per page
         
-        # Initialize the list of integration items
-        integration_items = []
+    Yields:
+        List[IntegrationItem]: The mapped items of each page
+    """
+    after = None
+    while True:
+        async with semaphore:
+            items, after = await fetch_object_page(client, access_token, object_type, fields, after)
+        if include_associations and items:
+            await attach_associations(access_token, items)
+        yield items
+        if not after:
+            return
+
+async def iter_items_hubspot(
+    access_token: str,
+    object_types: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None,
+    include_associations: bool = False,
+    failed: Optional[List[str]] = None
+) -> AsyncIterator[List[IntegrationItem]]:
+    """
+    Stream items of every requested object type, page by page, as pages arrive.
+    
+    Object types are paged concurrently and their pages are interleaved. Only a few
+    pages are buffered at a time, so memory stays flat regardless of portal size.
+    A failing object type (including an open circuit or the deadline passing) is logged
+    and added to failed as soon as it fails, and the other object types carry on.
+    
+    Args:
+        access_token: The HubSpot access token
+        object_types: The CRM object types to load (defaults to HUBSPOT_OBJECT_TYPES from the environment)
+        fields: IntegrationItem fields the caller needs, to request only their properties (optional)
+        include_associations: Link each item to its associated records in metadata["associations"]
+        failed: Collects the object types that failed; their items are missing or incomplete (optional)
         
-        # Define the headers for API requests
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
+    Yields:
+        List[IntegrationItem]: One page of mapped items
         
-        # Get contacts from HubSpot
+    Raises:
+        Exception: The first object type failure, if every object type failed
+    """
+    object_types = object_types or HUBSPOT_DEFAULT_OBJECT_TYPES
+    client = get_hubspot_client()
+    semaphore = asyncio.Semaphore(HUBSPOT_FETCH_CONCURRENCY)
+    pages: asyncio.Queue = asyncio.Queue(maxsize=HUBSPOT_STREAM_BUFFER_PAGES)
+    errors: List[Exception] = []
+    
+    async def produce(object_type: str) -> None:
         try:
-            contacts_url = "https://api.hubapi.com/crm/v3/objects/contacts"
-            contacts_response = requests.get(contacts_url, headers=headers, params={"limit": 10})
-            contacts_response.raise_for_status()
-            contacts_data = contacts_response.json()
-            
-            # Extract contacts and convert them to IntegrationItem objects
-            for contact in contacts_data.get('results', []):
-                contact_properties = contact.get('properties', {})
-                item = IntegrationItem(
-                    id=contact.get('id', ''),
-                    name=f"{contact_properties.get('firstname', '')} {contact_properties.get('lastname', '')}".strip() or "Unnamed Contact",
-                    icon="https://cdn2.hubspot.net/hubfs/53/image8-2.jpg",
-                    description=f"Email: {contact_properties.get('email', 'No email')}",
-                    type="contact",
-                    created_at=contact_properties.get('createdate', ''),
-                    created_by=contact_properties.get('hs_created_by_user_id', 'HubSpot'),
-                    updated_at=contact_properties.get('lastmodifieddate', ''),
-                    url=f"https://app.hubspot.com/contacts/{contact.get('id', '')}/contact/{contact.get('id', '')}",
-                    metadata={
-                        "email": contact_properties.get('email', ''),
-                        "phone": contact_properties.get('phone', ''),
-                        "company": contact_properties.get('company', ''),
-                        "website": contact_properties.get('website', '')
-                    }
-                )
-                integration_items.append(item.__dict__)
-        except requests.RequestException as e:
-            print(f"Error fetching HubSpot contacts: {str(e)}")
+            async for page in iter_object_pages(
+                client, access_token, object_type, semaphore, fields, include_associations
+            ):
+                await pages.put(page)
+        except Exception as e:
+            print(f"Error fetching HubSpot {object_type}: {str(e)}")
+            errors.append(e)
+            if failed is not None:
+                failed.append(object_type)
+    
+    async def finish(producers: List[asyncio.Task]) -> None:
+        await asyncio.gather(*producers, return_exceptions=True)
+        await pages.put(None)
+    
+    producers = [asyncio.create_task(produce(object_type)) for object_type in object_types]
+    finisher = asyncio.create_task(finish(producers))
+    try:
+        while True:
+            page = await pages.get()
+            if page is None:
+                break
+            yield page
+        # With nothing loaded there is no partial list to serve
+        if len(errors) == len(object_types):
+            raise errors[0]
+    finally:
+        # Stop paging if the consumer goes away early (e.g. the client disconnected)
+        for task in producers + [finisher]:
+            task.cancel()
+
+async def _search_modified_items(
+    client: HubSpotClient,
+    access_token: str,
+    object_type: str,
+    since_ms: int,
+    semaphore: asyncio.Semaphore
+) -> Optional[List[IntegrationItem]]:
+    """
+    Fetch the records of one object type modified since a point in time via the CRM search endpoint.
+    
+    Returns:
+        Optional[List[IntegrationItem]]: The modified items, or None if there are too
+        many changes for the search endpoint to page through
+    """
+    spec = HUBSPOT_OBJECT_TYPES[object_type]
+    body = {
+        "filterGroups": [{
+            "filters": [{"propertyName": spec.modified_property, "operator": "GTE", "value": str(since_ms)}]
+        }],
+        "sorts": [{"propertyName": spec.modified_property, "direction": "ASCENDING"}],
+        "properties": spec.properties,
+        "limit": HUBSPOT_PAGE_SIZE,
+    }
+    
+    items = []
+    while True:
+        async with semaphore:
+            data = await client.post_json(f"/crm/v3/objects/{object_type}/search", access_token, body)
         
-        # Get deals from HubSpot
-        try:
-            deals_url = "https://api.hubapi.com/crm/v3/objects/deals"
-            deals_response = requests.get(deals_url, headers=headers, params={"limit": 10})
-            deals_response.raise_for_status()
-            deals_data = deals_response.json()
-            
-            # Extract deals and convert them to IntegrationItem objects
-            for deal in deals_data.get('results', []):
-                deal_properties = deal.get('properties', {})
-                item = IntegrationItem(
-                    id=deal.get('id', ''),
-                    name=deal_properties.get('dealname', 'Unnamed Deal'),
-                    icon="https://cdn2.hubspot.net/hubfs/53/image8-2.jpg",
-                    description=f"Amount: ${deal_properties.get('amount', '0')} - Stage: {deal_properties.get('dealstage', 'Unknown')}",
-                    type="deal",
-                    created_at=deal_properties.get('createdate', ''),
-                    created_by=deal_properties.get('hs_created_by_user_id', 'HubSpot'),
-                    updated_at=deal_properties.get('hs_lastmodifieddate', ''),
-                    url=f"https://app.hubspot.com/contacts/{deal.get('id', '')}/deal/{deal.get('id', '')}",
-                    metadata={
-                        "amount": deal_properties.get('amount', ''),
-                        "stage": deal_properties.get('dealstage', ''),
-                        "close_date": deal_properties.get('closedate', ''),
-                        "pipeline": deal_properties.get('pipeline', '')
-                    }
-                )
-                integration_items.append(item.__dict__)
-        except requests.RequestException as e:
-            print(f"Error fetching HubSpot deals: {str(e)}")
+        if data.get('total', 0) > HUBSPOT_SEARCH_MAX_RESULTS:
+            return None
+        with span("hubspot_items", "map"):
+            items.extend(spec.mapper(record) for record in data.get('results', []))
+        
+        after = data.get('paging', {}).get('next', {}).get('after')
+        if not after:
+            return items
+        body = {**body, "after": after}
+
+async def _sync_object_type(
+    client: HubSpotClient,
+    access_token: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_type: str,
+    semaphore: asyncio.Semaphore,
+    full: bool
+) -> int:
+    """
+    Bring the stored items of one object type up to date and return how many were written.
+    
+    Only records modified since the watermark are fetched, unless there is no watermark
+    yet, the last full sync is older than HUBSPOT_FULL_SYNC_INTERVAL_MS, or a full sync
+    was requested. Nothing is fetched if the last sync is within HUBSPOT_SYNC_MIN_INTERVAL_MS.
+    """
+    if object_type not in HUBSPOT_OBJECT_TYPES:
+        raise ValueError(f"Unsupported HubSpot object type: {object_type}")
+    
+    started_ms = int(time.time() * 1000)
+    state = await item_store.get_sync_state("hubspot", user_id, org_id, object_type)
+    full = (
+        full
+        or state["watermark"] is None
+        or state["full_sync_at"] is None
+        or started_ms - state["full_sync_at"] > HUBSPOT_FULL_SYNC_INTERVAL_MS
+    )
+    
+    if not full and started_ms - state["watermark"] < HUBSPOT_SYNC_MIN_INTERVAL_MS:
+        return 0
+    
+    if not full:
+        changed = await _search_modified_items(
+            client, access_token, object_type, state["watermark"] - HUBSPOT_SYNC_OVERLAP_MS, semaphore
+        )
+        if changed is not None:
+            await item_store.merge_items(
+                "hubspot", user_id, org_id, object_type, changed, started_ms
+            )
+            return len(changed)
+    
+    # Full sync: stage every page, then swap the staged items in atomically
+    await item_store.discard_full_sync("hubspot", user_id, org_id, object_type)
+    written = 0
+    try:
+        async for page in iter_object_pages(client, access_token, object_type, semaphore):
+            await item_store.write_full_sync_page("hubspot", user_id, org_id, object_type, page)
+            written += len(page)
+        await item_store.commit_full_sync("hubspot", user_id, org_id, object_type, started_ms)
+    except Exception:
+        await item_store.discard_full_sync("hubspot", user_id, org_id, object_type)
+        raise
+    return written
+
+async def sync_hubspot_store(
+    credentials_str: str,
+    user_id: str,
+    org_id: Optional[str] = None,
+    object_types: Optional[List[str]] = None,
+    full: bool = False
+) -> Tuple[int, List[str]]:
+    """
+    Bring the local item store up to date with HubSpot without loading the items.
+    
+    Concurrent syncs of the same store share one run, within this process and, through
+    a Redis lease, across workers. A worker that waited on another's full sync only
+    checks for changes afterwards instead of reloading everything again.
+    
+    Args:
+        credentials_str: JSON string containing the credentials or token
+        user_id: The ID of the user the items belong to
+        org_id: The ID of the organization (optional)
+        object_types: The CRM object types to sync (defaults to HUBSPOT_OBJECT_TYPES from the environment)
+        full: Reload every record instead of only the ones modified since the last sync
+        
+    Returns:
+        Tuple[int, List[str]]: The number of items written to the store, and the object
+        types that failed to sync (their stored items are left as they were)
+    """
+    access_token = parse_access_token(credentials_str)
+    object_types = object_types or HUBSPOT_DEFAULT_OBJECT_TYPES
+    key = f"hubspot_sync:{user_id}:{org_id or ''}:{','.join(object_types)}:{'full' if full else 'incremental'}"
+    with for_portal(await hubspot_portal(credentials_str, user_id, org_id)):
+        return await singleflight(
+            key,
+            lambda: _sync_store(access_token, user_id, org_id, object_types, full),
+            lease=True,
+            after_wait=lambda: _sync_store(access_token, user_id, org_id, object_types, False),
+        )
+
+async def _sync_store(
+    access_token: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_types: List[str],
+    full: bool
+) -> Tuple[int, List[str]]:
+    client = get_hubspot_client()
+    semaphore = asyncio.Semaphore(HUBSPOT_FETCH_CONCURRENCY)
+    
+    with span("sync_items_hubspot", "sync"):
+        results = await asyncio.gather(
+            *(
+                _sync_object_type(client, access_token, user_id, org_id, object_type, semaphore, full)
+                for object_type in object_types
+            ),
+            return_exceptions=True
+        )
+    
+    # A failed object type keeps serving what was stored by its last successful sync
+    written = 0
+    failed = []
+    for object_type, result in zip(object_types, results):
+        if isinstance(result, BaseException):
+            print(f"Error syncing HubSpot {object_type}: {str(result)}")
+            failed.append(object_type)
+        else:
+            written += result
+    return written, failed
+
+async def sync_items_hubspot(
+    credentials_str: str,
+    user_id: str,
+    org_id: Optional[str] = None,
+    object_types: Optional[List[str]] = None,
+    full: bool = False
+) -> Tuple[List[IntegrationItem], List[str]]:
+    """
+    Incrementally sync HubSpot items into the local item store and return the stored items.
+    
+    The sync is only bound by the longest deadline a request may have (extended_deadline).
+    If the request's own deadline passes first, or an object type fails to sync (HubSpot
+    is down or its circuit is open), what the store holds is returned and reported as
+    stale, and the sync goes on to update the store.
+    
+    Args:
+        credentials_str: JSON string containing the credentials or token
+        user_id: The ID of the user the items belong to
+        org_id: The ID of the organization (optional)
+        object_types: The CRM object types to sync (defaults to HUBSPOT_OBJECT_TYPES from the environment)
+        full: Reload every record instead of only the ones modified since the last sync
+        
+    Returns:
+        Tuple[List[IntegrationItem], List[str]]: The stored integration items, and the object
+        types served as they were before this sync
+        
+    Raises:
+        HTTPException: 503 if no object type could be synced and nothing was stored before
+    """
+    object_types = object_types or HUBSPOT_DEFAULT_OBJECT_TYPES
+    with extended_deadline():
+        sync = asyncio.ensure_future(sync_hubspot_store(credentials_str, user_id, org_id, object_types, full))
+    # The sync may finish after this request stopped waiting; don't leave its exception unretrieved
+    sync.add_done_callback(lambda done: done.cancelled() or done.exception())
+    try:
+        _, stale = await within_deadline(sync)
+    except DeadlineExceeded:
+        stale = list(object_types)
+    
+    if len(stale) == len(object_types):
+        states = await asyncio.gather(
+            *(item_store.get_sync_state("hubspot", user_id, org_id, object_type) for object_type in stale)
+        )
+        if all(state["watermark"] is None for state in states):
+            raise HTTPException(status_code=503, detail="HubSpot is unavailable and no items have been synced yet")
+    
+    with span("sync_items_hubspot", "load_items"):
+        return await item_store.load_items("hubspot", user_id, org_id, object_types), stale
+
+async def _fetch_items(
+    access_token: str,
+    object_types: Optional[List[str]],
+    fields: Optional[List[str]],
+    include_associations: bool
+) -> Tuple[List[IntegrationItem], List[str]]:
+    integration_items = []
+    failed: List[str] = []
+    with span("get_items_hubspot", "fetch"):
+        async for page in iter_items_hubspot(access_token, object_types, fields, include_associations, failed):
+            integration_items.extend(page)
+    return integration_items, failed
+
+async def get_items_hubspot(
+    credentials_str: str,
+    object_types: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None,
+    include_associations: bool = False,
+    failed: Optional[List[str]] = None
+) -> List[IntegrationItem]:
+    """
+    Retrieve a list of items from HubSpot using the provided credentials.
+    
+    Identical concurrent loads (same token, object types, fields and includes) share one fetch.
+    An object type that fails is left out and added to failed, so the others are still returned.
+    
+    Args:
+        credentials_str: JSON string containing the credentials or token
+        object_types: The CRM object types to load (defaults to HUBSPOT_OBJECT_TYPES from the environment)
+        fields: IntegrationItem fields the caller needs, to request only their properties (optional)
+        include_associations: Link each item to its associated records in metadata["associations"]
+        failed: Collects the object types that failed; their items are missing or incomplete (optional)
         
-        return integration_items
-    except Exception as e:
-        print(f"Error in get_items_hubspot: {str(e)}")
-        # For demo/development purposes, return mock data if the real API fails
-        return [
-            {
-                "id": "mock-1",
-                "name": "John Doe (Mock)",
-                "description": "Email: john@example.com",
-                "type": "contact",
-                "icon": "https://cdn2.hubspot.net/hubfs/53/image8-2.jpg",
-                "created_at": "2023-01-01T12:00:00Z",
-                "created_by": "System",
-                "updated_at": "2023-01-15T14:30:00Z",
-                "url": "https://app.hubspot.com/contacts/1/contact/1",
-                "metadata": {
-                    "email": "john@example.com",
-                    "phone": "+1234567890",
-                    "company": "ABC Corp",
-                    "website": "https://example.com"
-                }
-            },
-            {
-                "id": "mock-2",
-                "name": "New Business Deal (Mock)",
-                "description": "Amount: $5000 - Stage: Proposal",
-                "type": "deal",
-                "icon": "https://cdn2.hubspot.net/hubfs/53/image8-2.jpg",
-                "created_at": "2023-02-01T10:00:00Z",
-                "created_by": "System",
-                "updated_at": "2023-02-10T16:45:00Z",
-                "url": "https://app.hubspot.com/contacts/2/deal/2",
-                "metadata": {
-                    "amount": "5000",
-                    "stage": "proposal",
-                    "close_date": "2023-03-15",
-                    "pipeline": "default"
-                }
-            }
-        ]
+    Returns:
+        List[IntegrationItem]: A list of integration items
+        
+    Raises:
+        HTTPException: 502 if every object type failed, the first with a HubSpot error
+        CircuitOpenError: If every object type failed, the first because its circuit is open
+        DeadlineExceeded: If the request's deadline passes first
+    """
+    access_token = parse_access_token(credentials_str)
+    
+    token_hash = hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:32]
+    key = (
+        f"hubspot_items:{token_hash}:{','.join(object_types or [])}"
+        f":{','.join(fields) if fields is not None else '*'}:{int(include_associations)}"
+    )
+    try:
+        with for_portal(await hubspot_portal(credentials_str)):
+            items, failed_types = await singleflight(
+                key, lambda: _fetch_items(access_token, object_types, fields, include_associations)
+            )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error loading HubSpot items: {str(e)}")
+    if failed is not None:
+        failed.extend(failed_types)
+    # Each caller gets its own list; the items themselves are shared
+    return list(items)
+
+async def _batch_read_chunk(
+    client: HubSpotClient,
+    access_token: str,
+    object_type: str,
+    ids: List[str],
+    semaphore: asyncio.Semaphore,
+    fields: Optional[List[str]] = None
+) -> List[IntegrationItem]:
+    spec = HUBSPOT_OBJECT_TYPES[object_type]
+    body = {"properties": spec.properties_for(fields), "inputs": [{"id": item_id} for item_id in ids]}
+    async with semaphore:
+        data = await client.post_json(f"/crm/v3/objects/{object_type}/batch/read", access_token, body)
+    with span("hubspot_items", "map"):
+        return [spec.mapper(record) for record in data.get('results', [])]
+
+async def batch_read_hubspot(
+    credentials_str: str,
+    object_type: str,
+    ids: List[str],
+    fields: Optional[List[str]] = None
+) -> List[IntegrationItem]:
+    """
+    Fetch specific HubSpot records by ID through the CRM batch read endpoint.
+    
+    IDs are split into chunks of HUBSPOT_BATCH_READ_SIZE that are read concurrently,
+    so N lookups cost about N / 100 upstream calls. IDs HubSpot doesn't know are left out.
+    
+    Args:
+        credentials_str: JSON string containing the credentials or token
+        object_type: The CRM object type of the records
+        ids: The record IDs to fetch
+        fields: IntegrationItem fields the caller needs, to request only their properties (optional)
+        
+    Returns:
+        List[IntegrationItem]: The found records, in the order their IDs were requested
+    """
+    if object_type not in HUBSPOT_OBJECT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported HubSpot object type: {object_type}")
+    
+    # Drop duplicate IDs, keeping the requested order
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > HUBSPOT_BATCH_READ_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {HUBSPOT_BATCH_READ_MAX_IDS} IDs can be read at once")
+    
+    access_token = parse_access_token(credentials_str)
+    client = get_hubspot_client()
+    semaphore = asyncio.Semaphore(HUBSPOT_FETCH_CONCURRENCY)
+    chunks = [ids[start:start + HUBSPOT_BATCH_READ_SIZE] for start in range(0, len(ids), HUBSPOT_BATCH_READ_SIZE)]
+    
+    try:
+        with for_portal(await hubspot_portal(credentials_str)):
+            results = await asyncio.gather(
+                *(_batch_read_chunk(client, access_token, object_type, chunk, semaphore, fields) for chunk in chunks)
+            )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error reading HubSpot {object_type}: {str(e)}")
+    
+    found = {item.id: item for chunk_items in results for item in chunk_items}
+    return [found[item_id] for item_id in ids if item_id in found]
 
 # Helper function to check if HubSpot credentials exist for a user
-def has_hubspot_credentials(current_user_id: str) -> bool:
+async def has_hubspot_credentials(current_user_id: str) -> bool:
     """
     Check if HubSpot credentials exist for the current user.
     
@@ -327,5 +969,5 @@ def has_hubspot_credentials(current_user_id: str) -> bool:
     Returns:
         bool: True if credentials exist, False otherwise
     """
-    credentials = get_hubspot_credentials(current_user_id)
+    credentials = await get_hubspot_credentials(current_user_id)
     return credentials.get("authenticated", False)
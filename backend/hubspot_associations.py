@@ -0,0 +1,137 @@
+
+import os
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Set
+
+from hubspot_client import get_hubspot_client, HubSpotClient
+from hubspot_objects import HUBSPOT_ITEM_TYPES, HUBSPOT_OBJECT_TYPES
+from integration_item import IntegrationItem
+from metrics import span
+from ttl_cache import TTLCache
+
+# Inputs per v4 batch association read and per v3 batch read (the HubSpot maximums)
+HUBSPOT_ASSOCIATION_BATCH_SIZE = 1000
+HUBSPOT_NAME_BATCH_SIZE = 100
+HUBSPOT_ASSOCIATION_CONCURRENCY = int(os.environ.get("HUBSPOT_ASSOCIATION_CONCURRENCY", "4"))
+
+# Relationship edges and the names of linked records, cached per token
+HUBSPOT_ASSOCIATION_CACHE_TTL = float(os.environ.get("HUBSPOT_ASSOCIATION_CACHE_TTL", "300"))
+HUBSPOT_ASSOCIATION_CACHE_MAX_ENTRIES = int(os.environ.get("HUBSPOT_ASSOCIATION_CACHE_MAX_ENTRIES", "100000"))
+
+# (token, from type, to type, from ID) -> linked IDs
+_edges = TTLCache(HUBSPOT_ASSOCIATION_CACHE_MAX_ENTRIES, HUBSPOT_ASSOCIATION_CACHE_TTL)
+# (token, object type, ID) -> record name
+_names = TTLCache(HUBSPOT_ASSOCIATION_CACHE_MAX_ENTRIES, HUBSPOT_ASSOCIATION_CACHE_TTL)
+
+def _token_scope(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+
+def _chunks(ids: List[str], size: int) -> List[List[str]]:
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+async def _read_edges(
+    client: HubSpotClient,
+    access_token: str,
+    from_type: str,
+    to_type: str,
+    ids: List[str],
+    semaphore: asyncio.Semaphore
+) -> Dict[str, List[str]]:
+    """
+    Return the IDs of the to_type records associated with each record, reading uncached ones in batches.
+    """
+    scope = _token_scope(access_token)
+    missing = [item_id for item_id in ids if _edges.get((scope, from_type, to_type, item_id)) is None]
+
+    async def read(chunk: List[str]) -> None:
+        body = {"inputs": [{"id": item_id} for item_id in chunk]}
+        async with semaphore:
+            data = await client.post_json(f"/crm/v4/associations/{from_type}/{to_type}/batch/read", access_token, body)
+        linked = {
+            str(result["from"]["id"]): [str(target["toObjectId"]) for target in result.get("to", [])]
+            for result in data.get("results", [])
+        }
+        # Records without associations are left out of the results; cache them as unlinked
+        for item_id in chunk:
+            _edges.set((scope, from_type, to_type, item_id), linked.get(item_id, []))
+
+    await asyncio.gather(*(read(chunk) for chunk in _chunks(missing, HUBSPOT_ASSOCIATION_BATCH_SIZE)))
+    return {item_id: _edges.get((scope, from_type, to_type, item_id), []) for item_id in ids}
+
+async def _read_names(
+    client: HubSpotClient,
+    access_token: str,
+    object_type: str,
+    ids: Set[str],
+    semaphore: asyncio.Semaphore
+) -> Dict[str, Optional[str]]:
+    """
+    Return the name of each record, batch reading only the name properties of uncached ones.
+    """
+    scope = _token_scope(access_token)
+    spec = HUBSPOT_OBJECT_TYPES[object_type]
+    missing = sorted(item_id for item_id in ids if _names.get((scope, object_type, item_id)) is None)
+
+    async def read(chunk: List[str]) -> None:
+        body = {"properties": spec.properties_for(["name"]), "inputs": [{"id": item_id} for item_id in chunk]}
+        async with semaphore:
+            data = await client.post_json(f"/crm/v3/objects/{object_type}/batch/read", access_token, body)
+        for record in data.get("results", []):
+            _names.set((scope, object_type, str(record["id"])), spec.mapper(record).name)
+
+    await asyncio.gather(*(read(chunk) for chunk in _chunks(missing, HUBSPOT_NAME_BATCH_SIZE)))
+    return {item_id: _names.get((scope, object_type, item_id)) for item_id in ids}
+
+async def attach_associations(access_token: str, items: List[IntegrationItem]) -> None:
+    """
+    Link items to their associated HubSpot records, in a fixed number of calls per batch of items.
+
+    Edges are read through the v4 batch associations API for each pair of object types,
+    then the linked records' names through batch reads; both are cached. Each item gets
+    metadata["associations"] = {"companies": [{"id": ..., "name": ...}], ...}.
+
+    Args:
+        access_token: The HubSpot access token
+        items: HubSpot items of any supported types; updated in place
+    """
+    client = get_hubspot_client()
+    semaphore = asyncio.Semaphore(HUBSPOT_ASSOCIATION_CONCURRENCY)
+
+    by_type: Dict[str, List[IntegrationItem]] = {}
+    for item in items:
+        object_type = HUBSPOT_ITEM_TYPES.get(item.type)
+        if object_type is not None:
+            by_type.setdefault(object_type, []).append(item)
+
+    pairs = [
+        (from_type, to_type)
+        for from_type in by_type
+        for to_type in HUBSPOT_OBJECT_TYPES[from_type].associations
+    ]
+    with span("hubspot_associations", "edges"):
+        edge_maps = await asyncio.gather(*(
+            _read_edges(client, access_token, from_type, to_type, [item.id for item in by_type[from_type]], semaphore)
+            for from_type, to_type in pairs
+        ))
+    edges = dict(zip(pairs, edge_maps))
+
+    linked: Dict[str, Set[str]] = {}
+    for (_, to_type), edge_map in edges.items():
+        linked.setdefault(to_type, set()).update(item_id for ids in edge_map.values() for item_id in ids)
+    with span("hubspot_associations", "names"):
+        name_maps = await asyncio.gather(*(
+            _read_names(client, access_token, to_type, ids, semaphore) for to_type, ids in linked.items()
+        ))
+    names = dict(zip(linked, name_maps))
+
+    for from_type, type_items in by_type.items():
+        for item in type_items:
+            associations: Dict[str, List[Dict[str, Any]]] = {
+                to_type: [
+                    {"id": linked_id, "name": names[to_type].get(linked_id)}
+                    for linked_id in edges[(from_type, to_type)][item.id]
+                ]
+                for to_type in HUBSPOT_OBJECT_TYPES[from_type].associations
+            }
+            item.metadata = {**(item.metadata or {}), "associations": associations}
@@ -0,0 +1,192 @@
+
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from circuit_breaker import get_circuit_breaker
+from deadline import DeadlineExceeded, remaining
+from hubspot_scheduler import get_hubspot_scheduler, portal_key
+from metrics import REQUEST_DEADLINES_EXCEEDED, observe_upstream, upstream_object_type
+
+# HubSpot HTTP client configuration
+HUBSPOT_API_BASE_URL = os.environ.get("HUBSPOT_API_BASE_URL", "https://api.hubapi.com")
+HUBSPOT_MAX_CONNECTIONS = int(os.environ.get("HUBSPOT_MAX_CONNECTIONS", "20"))
+HUBSPOT_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HUBSPOT_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HUBSPOT_KEEPALIVE_EXPIRY = float(os.environ.get("HUBSPOT_KEEPALIVE_EXPIRY", "30"))
+HUBSPOT_CONNECT_TIMEOUT = float(os.environ.get("HUBSPOT_CONNECT_TIMEOUT", "5"))
+HUBSPOT_REQUEST_TIMEOUT = float(os.environ.get("HUBSPOT_REQUEST_TIMEOUT", "15"))
+
+class HubSpotClient:
+    """
+    Non-blocking client for the HubSpot API.
+
+    All calls share one connection pool, so TLS connections to HubSpot are kept
+    alive and reused across requests instead of being opened for every call.
+    """
+
+    def __init__(self, base_url: str = HUBSPOT_API_BASE_URL):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(
+                max_connections=HUBSPOT_MAX_CONNECTIONS,
+                max_keepalive_connections=HUBSPOT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HUBSPOT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HUBSPOT_REQUEST_TIMEOUT, connect=HUBSPOT_CONNECT_TIMEOUT),
+            headers={"Accept": "application/json"},
+        )
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        access_token: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> httpx.Response:
+        """
+        Send a request to HubSpot through the per-portal rate-limit scheduler.
+
+        Requests wait for the portal's token bucket, and 429/5xx responses are
+        retried with jittered exponential backoff. Each attempt's timeout is cut to what
+        is left of the request's deadline, and goes through the circuit breaker of its
+        endpoint (the object type, or the OAuth endpoints), which fails it immediately
+        while HubSpot keeps failing there.
+
+        Args:
+            method: The HTTP method
+            url: A path relative to the API base URL, or an absolute URL
+            access_token: The OAuth access token to send as a bearer token (optional)
+            timeout: Per-call timeout in seconds, overriding the client default (optional)
+
+        Returns:
+            httpx.Response: The raw response
+
+        Raises:
+            CircuitOpenError: If the endpoint's circuit is open
+            DeadlineExceeded: If the request's deadline passes before HubSpot answers
+        """
+        headers = kwargs.pop("headers", None) or {}
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+
+        timeout = HUBSPOT_REQUEST_TIMEOUT if timeout is None else timeout
+        breaker = get_circuit_breaker("hubspot", upstream_object_type(url))
+
+        async def send() -> httpx.Response:
+            left = remaining()
+            if left is not None and left <= 0:
+                REQUEST_DEADLINES_EXCEEDED.inc("hubspot")
+                raise DeadlineExceeded(f"The request deadline passed before calling HubSpot {url}")
+            attempt_timeout = timeout if left is None else min(timeout, left)
+            probe = breaker.acquire()
+
+            # Each attempt is recorded, so retried 429s and 5xx show up in the latency metrics
+            started = time.perf_counter()
+            status = None
+            failed = None
+            try:
+                response = await self._client.request(
+                    method,
+                    url,
+                    headers=headers,
+                    timeout=httpx.Timeout(attempt_timeout, connect=min(attempt_timeout, HUBSPOT_CONNECT_TIMEOUT)),
+                    **kwargs,
+                )
+                status = response.status_code
+                failed = status >= 500
+                return response
+            except httpx.TimeoutException as e:
+                if attempt_timeout < timeout:
+                    # Cut short by the deadline, which says nothing about HubSpot's health
+                    REQUEST_DEADLINES_EXCEEDED.inc("hubspot")
+                    raise DeadlineExceeded(f"The request deadline passed while calling HubSpot {url}") from e
+                failed = True
+                raise
+            except httpx.TransportError:
+                failed = True
+                raise
+            finally:
+                observe_upstream("hubspot", url, status, time.perf_counter() - started)
+                if failed is None:
+                    breaker.release(probe)
+                else:
+                    breaker.record(failed, probe)
+
+        return await get_hubspot_scheduler().send(portal_key(access_token), send)
+
+    async def get_json(
+        self,
+        url: str,
+        access_token: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Send an authenticated GET request and decode the JSON response.
+
+        Raises:
+            httpx.HTTPError: If the request fails or HubSpot returns an error status
+        """
+        response = await self.request("GET", url, access_token=access_token, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def post_json(
+        self,
+        url: str,
+        access_token: str,
+        body: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Send an authenticated JSON POST request and decode the JSON response.
+
+        Raises:
+            httpx.HTTPError: If the request fails or HubSpot returns an error status
+        """
+        response = await self.request("POST", url, access_token=access_token, json=body, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def post_form(
+        self,
+        url: str,
+        data: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Send a form-encoded POST request (used by the OAuth token endpoint).
+
+        Raises:
+            httpx.HTTPError: If the request fails or HubSpot returns an error status
+        """
+        response = await self.request("POST", url, data=data, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+# Shared client instance, created on first use so it binds to the running event loop
+_client: Optional[HubSpotClient] = None
+
+def get_hubspot_client() -> HubSpotClient:
+    """
+    Return the shared HubSpot client, creating it if needed.
+    """
+    global _client
+    if _client is None:
+        _client = HubSpotClient()
+    return _client
+
+async def close_hubspot_client() -> None:
+    """
+    Close the shared HubSpot client and release its pooled connections.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
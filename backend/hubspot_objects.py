@@ -0,0 +1,186 @@
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from integration_item import IntegrationItem
+
+HUBSPOT_ICON_URL = "https://cdn2.hubspot.net/hubfs/53/image8-2.jpg"
+
+# Requested when no property is needed, so HubSpot doesn't fall back to its default set
+HUBSPOT_MINIMAL_PROPERTY = "hs_object_id"
+
+class HubSpotObjectType(NamedTuple):
+    """
+    Describes how a HubSpot CRM object type is fetched and mapped to IntegrationItem.
+    """
+    name: str
+    # The IntegrationItem type its records are mapped to
+    item_type: str
+    properties: List[str]
+    mapper: Callable[[Dict[str, Any]], IntegrationItem]
+    # The properties each IntegrationItem field is built from; fields not listed need none
+    field_properties: Dict[str, List[str]]
+    # Property holding the last modification time, used for incremental sync
+    modified_property: str = "hs_lastmodifieddate"
+    # Object types whose associated records are linked with include=associations
+    associations: Tuple[str, ...] = ()
+
+    def properties_for(self, fields: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Return the properties to request for a selection of IntegrationItem fields (all if None).
+        """
+        if fields is None:
+            return self.properties
+        selected = {prop for field in fields for prop in self.field_properties.get(field, [])}
+        return [prop for prop in self.properties if prop in selected] or [HUBSPOT_MINIMAL_PROPERTY]
+
+def map_contact(contact: Dict[str, Any]) -> IntegrationItem:
+    contact_properties = contact.get('properties', {})
+    return IntegrationItem(
+        id=contact.get('id', ''),
+        name=f"{contact_properties.get('firstname', '')} {contact_properties.get('lastname', '')}".strip() or "Unnamed Contact",
+        icon=HUBSPOT_ICON_URL,
+        description=f"Email: {contact_properties.get('email', 'No email')}",
+        type="contact",
+        created_at=contact_properties.get('createdate', ''),
+        created_by=contact_properties.get('hs_created_by_user_id', 'HubSpot'),
+        updated_at=contact_properties.get('lastmodifieddate', ''),
+        url=f"https://app.hubspot.com/contacts/{contact.get('id', '')}/contact/{contact.get('id', '')}",
+        metadata={
+            "email": contact_properties.get('email', ''),
+            "phone": contact_properties.get('phone', ''),
+            "company": contact_properties.get('company', ''),
+            "website": contact_properties.get('website', '')
+        }
+    )
+
+def map_deal(deal: Dict[str, Any]) -> IntegrationItem:
+    deal_properties = deal.get('properties', {})
+    return IntegrationItem(
+        id=deal.get('id', ''),
+        name=deal_properties.get('dealname', 'Unnamed Deal'),
+        icon=HUBSPOT_ICON_URL,
+        description=f"Amount: ${deal_properties.get('amount', '0')} - Stage: {deal_properties.get('dealstage', 'Unknown')}",
+        type="deal",
+        created_at=deal_properties.get('createdate', ''),
+        created_by=deal_properties.get('hs_created_by_user_id', 'HubSpot'),
+        updated_at=deal_properties.get('hs_lastmodifieddate', ''),
+        url=f"https://app.hubspot.com/contacts/{deal.get('id', '')}/deal/{deal.get('id', '')}",
+        metadata={
+            "amount": deal_properties.get('amount', ''),
+            "stage": deal_properties.get('dealstage', ''),
+            "close_date": deal_properties.get('closedate', ''),
+            "pipeline": deal_properties.get('pipeline', '')
+        }
+    )
+
+def map_company(company: Dict[str, Any]) -> IntegrationItem:
+    company_properties = company.get('properties', {})
+    return IntegrationItem(
+        id=company.get('id', ''),
+        name=company_properties.get('name') or "Unnamed Company",
+        icon=HUBSPOT_ICON_URL,
+        description=f"Domain: {company_properties.get('domain') or 'No domain'}",
+        type="company",
+        created_at=company_properties.get('createdate', ''),
+        created_by=company_properties.get('hs_created_by_user_id', 'HubSpot'),
+        updated_at=company_properties.get('hs_lastmodifieddate', ''),
+        url=f"https://app.hubspot.com/contacts/{company.get('id', '')}/company/{company.get('id', '')}",
+        metadata={
+            "domain": company_properties.get('domain', ''),
+            "industry": company_properties.get('industry', ''),
+            "phone": company_properties.get('phone', ''),
+            "city": company_properties.get('city', '')
+        }
+    )
+
+def map_ticket(ticket: Dict[str, Any]) -> IntegrationItem:
+    ticket_properties = ticket.get('properties', {})
+    return IntegrationItem(
+        id=ticket.get('id', ''),
+        name=ticket_properties.get('subject') or "Untitled Ticket",
+        icon=HUBSPOT_ICON_URL,
+        description=f"Priority: {ticket_properties.get('hs_ticket_priority') or 'None'} - Stage: {ticket_properties.get('hs_pipeline_stage') or 'Unknown'}",
+        type="ticket",
+        created_at=ticket_properties.get('createdate', ''),
+        created_by=ticket_properties.get('hs_created_by_user_id', 'HubSpot'),
+        updated_at=ticket_properties.get('hs_lastmodifieddate', ''),
+        url=f"https://app.hubspot.com/contacts/{ticket.get('id', '')}/ticket/{ticket.get('id', '')}",
+        metadata={
+            "priority": ticket_properties.get('hs_ticket_priority', ''),
+            "stage": ticket_properties.get('hs_pipeline_stage', ''),
+            "pipeline": ticket_properties.get('hs_pipeline', ''),
+            "content": ticket_properties.get('content', '')
+        }
+    )
+
+# Supported CRM object types, keyed by their HubSpot API name
+HUBSPOT_OBJECT_TYPES: Dict[str, HubSpotObjectType] = {
+    "contacts": HubSpotObjectType(
+        name="contacts",
+        item_type="contact",
+        properties=["firstname", "lastname", "email", "phone", "company", "website",
+                    "createdate", "lastmodifieddate", "hs_created_by_user_id"],
+        mapper=map_contact,
+        field_properties={
+            "name": ["firstname", "lastname"],
+            "description": ["email"],
+            "created_at": ["createdate"],
+            "created_by": ["hs_created_by_user_id"],
+            "updated_at": ["lastmodifieddate"],
+            "metadata": ["email", "phone", "company", "website"],
+        },
+        modified_property="lastmodifieddate",
+        associations=("companies", "deals"),
+    ),
+    "deals": HubSpotObjectType(
+        name="deals",
+        item_type="deal",
+        properties=["dealname", "amount", "dealstage", "closedate", "pipeline",
+                    "createdate", "hs_lastmodifieddate", "hs_created_by_user_id"],
+        mapper=map_deal,
+        field_properties={
+            "name": ["dealname"],
+            "description": ["amount", "dealstage"],
+            "created_at": ["createdate"],
+            "created_by": ["hs_created_by_user_id"],
+            "updated_at": ["hs_lastmodifieddate"],
+            "metadata": ["amount", "dealstage", "closedate", "pipeline"],
+        },
+        associations=("contacts", "companies"),
+    ),
+    "companies": HubSpotObjectType(
+        name="companies",
+        item_type="company",
+        properties=["name", "domain", "industry", "phone", "city",
+                    "createdate", "hs_lastmodifieddate", "hs_created_by_user_id"],
+        mapper=map_company,
+        field_properties={
+            "name": ["name"],
+            "description": ["domain"],
+            "created_at": ["createdate"],
+            "created_by": ["hs_created_by_user_id"],
+            "updated_at": ["hs_lastmodifieddate"],
+            "metadata": ["domain", "industry", "phone", "city"],
+        },
+        associations=("contacts", "deals"),
+    ),
+    "tickets": HubSpotObjectType(
+        name="tickets",
+        item_type="ticket",
+        properties=["subject", "content", "hs_ticket_priority", "hs_pipeline_stage", "hs_pipeline",
+                    "createdate", "hs_lastmodifieddate", "hs_created_by_user_id"],
+        mapper=map_ticket,
+        field_properties={
+            "name": ["subject"],
+            "description": ["hs_ticket_priority", "hs_pipeline_stage"],
+            "created_at": ["createdate"],
+            "created_by": ["hs_created_by_user_id"],
+            "updated_at": ["hs_lastmodifieddate"],
+            "metadata": ["hs_ticket_priority", "hs_pipeline_stage", "hs_pipeline", "content"],
+        },
+        associations=("contacts", "companies"),
+    ),
+}
+
+# CRM object type of each IntegrationItem type
+HUBSPOT_ITEM_TYPES: Dict[str, str] = {spec.item_type: name for name, spec in HUBSPOT_OBJECT_TYPES.items()}
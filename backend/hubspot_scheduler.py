@@ -0,0 +1,222 @@
+
+import os
+import time
+import random
+import asyncio
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import httpx
+
+from deadline import DeadlineExceeded, remaining
+from ttl_cache import TTLCache
+
+# Default per-portal burst limit; adjusted from the X-HubSpot-RateLimit-* response headers
+HUBSPOT_RATE_LIMIT_MAX = int(os.environ.get("HUBSPOT_RATE_LIMIT_MAX", "100"))
+HUBSPOT_RATE_LIMIT_INTERVAL = float(os.environ.get("HUBSPOT_RATE_LIMIT_INTERVAL_SECONDS", "10"))
+# Daily calls kept in reserve for interactive requests; background requests stop below it
+HUBSPOT_DAILY_RESERVE = int(os.environ.get("HUBSPOT_DAILY_RESERVE", "1000"))
+
+# Retries for 429 and 5xx responses and transport errors, with jittered exponential backoff
+HUBSPOT_RETRY_ATTEMPTS = int(os.environ.get("HUBSPOT_RETRY_ATTEMPTS", "4"))
+HUBSPOT_RETRY_BASE_DELAY = float(os.environ.get("HUBSPOT_RETRY_BASE_DELAY", "0.5"))
+HUBSPOT_RETRY_MAX_DELAY = float(os.environ.get("HUBSPOT_RETRY_MAX_DELAY", "30"))
+
+# Request priorities: interactive requests always go ahead of background ones
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority: ContextVar[int] = ContextVar("hubspot_request_priority", default=INTERACTIVE)
+# The portal (hub_id) calls are made for, when the caller knows it from the stored credentials
+_portal: ContextVar[Optional[str]] = ContextVar("hubspot_portal", default=None)
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """
+    Run the HubSpot calls made inside this block at background priority.
+    """
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+@contextmanager
+def for_portal(hub_id: Any) -> Iterator[None]:
+    """
+    Make the HubSpot calls inside this block for a portal, so every user's token for it
+    draws from the same bucket. A None portal keeps the one set by an enclosing block, if any.
+    """
+    token = _portal.set(str(hub_id) if hub_id else _portal.get())
+    try:
+        yield
+    finally:
+        _portal.reset(token)
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a background request would eat into the daily call reserve.
+    """
+
+class TokenBucket:
+    """
+    Token bucket for one HubSpot portal.
+
+    Its capacity and refill rate follow the limits HubSpot reports in response
+    headers, and it stops handing out tokens while the portal is rate limited.
+    """
+
+    def __init__(self, capacity: int = HUBSPOT_RATE_LIMIT_MAX, interval: float = HUBSPOT_RATE_LIMIT_INTERVAL):
+        self.capacity = capacity
+        self.rate = capacity / interval
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.daily_remaining: Optional[int] = None
+        self.waiting = [0, 0]
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        """
+        Wait for a token. Callers yield to any waiting caller of higher priority.
+        """
+        if priority == BACKGROUND and self.daily_remaining is not None and self.daily_remaining <= HUBSPOT_DAILY_RESERVE:
+            raise RateLimitExceeded("HubSpot daily limit reserve reached; deferring background request")
+
+        self.waiting[priority] += 1
+        try:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                higher_waiting = any(self.waiting[:priority])
+                if now >= self.blocked_until and self.tokens >= 1 and not higher_waiting:
+                    self.tokens -= 1
+                    return
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.01)
+                if not _can_wait(delay):
+                    raise DeadlineExceeded("The request deadline passes before HubSpot's rate limit allows another call")
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting[priority] -= 1
+
+    def update_from_headers(self, headers: httpx.Headers) -> None:
+        """
+        Adjust the bucket to the limits and remaining calls HubSpot reports.
+        """
+        limit = headers.get("X-HubSpot-RateLimit-Max")
+        interval_ms = headers.get("X-HubSpot-RateLimit-Interval-Milliseconds")
+        if limit and interval_ms:
+            self.capacity = int(limit)
+            self.rate = int(limit) / (int(interval_ms) / 1000)
+
+        remaining = headers.get("X-HubSpot-RateLimit-Remaining")
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+
+        daily_remaining = headers.get("X-HubSpot-RateLimit-Daily-Remaining")
+        if daily_remaining is not None:
+            self.daily_remaining = int(daily_remaining)
+
+    def block_for(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+def _backoff_delay(attempt: int) -> float:
+    # Full jitter: a random delay up to the exponential cap
+    return random.uniform(0, min(HUBSPOT_RETRY_MAX_DELAY, HUBSPOT_RETRY_BASE_DELAY * 2 ** attempt))
+
+def _can_wait(delay: float) -> bool:
+    # Whether the current request's deadline leaves time to wait this long and still make a call
+    left = remaining()
+    return left is None or delay < left
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return min(float(value), HUBSPOT_RETRY_MAX_DELAY) if value else None
+    except ValueError:
+        return None
+
+def portal_key(access_token: Optional[str]) -> str:
+    """
+    Identify the portal a request is made for.
+
+    HubSpot's limits apply per portal, so calls made under for_portal() use the portal
+    ID. Only when it isn't known does each token get its own bucket. Unauthenticated
+    calls (the OAuth token endpoint) share one bucket.
+    """
+    if not access_token:
+        return "oauth"
+    hub_id = _portal.get()
+    if hub_id is not None:
+        return f"portal:{hub_id}"
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+
+class HubSpotScheduler:
+    """
+    Schedules outbound HubSpot calls per portal, retrying 429 and 5xx responses.
+    """
+
+    def __init__(self):
+        self._buckets = TTLCache(max_entries=10000, ttl=3600)
+
+    def bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket()
+        # Re-set on every use so active portals don't expire
+        self._buckets.set(key, bucket)
+        return bucket
+
+    async def send(self, key: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        Send a request through the portal's token bucket.
+
+        Retries stop early once waiting for the next attempt would pass the request's deadline.
+
+        Args:
+            key: The portal key (see portal_key)
+            send: Sends the request once and returns the response
+
+        Returns:
+            httpx.Response: The first successful response, or the last failed one once retries run out
+        """
+        bucket = self.bucket(key)
+        priority = _priority.get()
+
+        for attempt in range(HUBSPOT_RETRY_ATTEMPTS + 1):
+            last_attempt = attempt == HUBSPOT_RETRY_ATTEMPTS
+            await bucket.acquire(priority)
+
+            try:
+                response = await send()
+            except httpx.TransportError:
+                delay = _backoff_delay(attempt)
+                if last_attempt or not _can_wait(delay):
+                    raise
+                await asyncio.sleep(delay)
+                continue
+
+            bucket.update_from_headers(response.headers)
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+
+            delay = _retry_after(response) or _backoff_delay(attempt)
+            if last_attempt or not _can_wait(delay):
+                return response
+            if response.status_code == 429:
+                # Hold back every caller for this portal, not just this one
+                bucket.block_for(delay)
+            await asyncio.sleep(delay)
+
+        return response
+
+_scheduler = HubSpotScheduler()
+
+def get_hubspot_scheduler() -> HubSpotScheduler:
+    return _scheduler
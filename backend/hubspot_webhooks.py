@@ -0,0 +1,193 @@
+
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request
+
+import item_store
+from hubspot_scheduler import background_priority
+from item_cache import invalidate_items
+from redis_store import get_redis
+from registry import import_integration
+
+# Webhook configuration
+HUBSPOT_WEBHOOK_URL = os.environ.get("HUBSPOT_WEBHOOK_URL")  # Public URL HubSpot signs, if behind a proxy
+HUBSPOT_WEBHOOK_MAX_AGE_MS = 5 * 60 * 1000
+HUBSPOT_WEBHOOK_QUEUE_SIZE = int(os.environ.get("HUBSPOT_WEBHOOK_QUEUE_SIZE", "10000"))
+# Events arriving within this window are applied together, coalescing repeat changes
+HUBSPOT_WEBHOOK_BATCH_WINDOW = float(os.environ.get("HUBSPOT_WEBHOOK_BATCH_WINDOW", "0.5"))
+HUBSPOT_WEBHOOK_BATCH_SIZE = 500
+
+# Event subscription prefixes and v3 object type IDs mapped to CRM object types
+SUBSCRIPTION_OBJECT_TYPES = {
+    "contact": "contacts",
+    "company": "companies",
+    "deal": "deals",
+    "ticket": "tickets",
+}
+OBJECT_TYPE_IDS = {
+    "0-1": "contacts",
+    "0-2": "companies",
+    "0-3": "deals",
+    "0-5": "tickets",
+}
+
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+
+def verify_signature(request: Request, body: bytes) -> None:
+    """
+    Verify a HubSpot v3 webhook signature.
+
+    The signature is a base64 HMAC-SHA256, keyed with the app's client secret, of the
+    method, URL, body and timestamp. Requests timestamped more than five minutes in the
+    past or the future are rejected, so a signed request can't be replayed later.
+    """
+    signature = request.headers.get("X-HubSpot-Signature-v3")
+    timestamp = request.headers.get("X-HubSpot-Request-Timestamp")
+    if not signature or not timestamp:
+        raise HTTPException(status_code=401, detail="Missing HubSpot signature")
+
+    try:
+        age_ms = time.time() * 1000 - int(timestamp)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid HubSpot request timestamp")
+    if abs(age_ms) > HUBSPOT_WEBHOOK_MAX_AGE_MS:
+        raise HTTPException(status_code=401, detail="Expired HubSpot request timestamp")
+
+    hubspot = import_integration("hubspot")
+    url = HUBSPOT_WEBHOOK_URL or str(request.url)
+    source = request.method.encode("utf-8") + url.encode("utf-8") + body + timestamp.encode("utf-8")
+    expected = base64.b64encode(
+        hmac.new(hubspot.HUBSPOT_CLIENT_SECRET.encode("utf-8"), source, hashlib.sha256).digest()
+    ).decode("utf-8")
+    if not hmac.compare_digest(expected, signature):
+        raise HTTPException(status_code=401, detail="Invalid HubSpot signature")
+
+def enqueue_events(events: List[Dict[str, Any]]) -> None:
+    """
+    Queue webhook events for the background worker.
+    """
+    if _queue is None:
+        raise HTTPException(status_code=503, detail="Webhook worker is not running")
+    for event in events:
+        try:
+            _queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # HubSpot retries failed deliveries, so ask it to come back later
+            raise HTTPException(status_code=503, detail="Webhook queue is full")
+
+def _event_object_type(event: Dict[str, Any]) -> Optional[str]:
+    subscription_type = event.get("subscriptionType", "")
+    prefix = subscription_type.split(".", 1)[0]
+    if prefix == "object":
+        return OBJECT_TYPE_IDS.get(event.get("objectTypeId", ""))
+    return SUBSCRIPTION_OBJECT_TYPES.get(prefix)
+
+def _group_events(events: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Set[str]]]:
+    """
+    Group events by portal and object type into the IDs to re-read and the IDs to delete.
+
+    The last event for an ID wins, so a record deleted after being changed is only deleted.
+    """
+    changes: Dict[Tuple[str, str], Dict[str, Set[str]]] = defaultdict(lambda: {"upsert": set(), "delete": set()})
+    for event in sorted(events, key=lambda event: event.get("occurredAt", 0)):
+        object_type = _event_object_type(event)
+        if object_type is None or event.get("portalId") is None:
+            continue
+
+        group = changes[(str(event["portalId"]), object_type)]
+        object_id = str(event.get("objectId", ""))
+        action = event.get("subscriptionType", "").split(".", 1)[-1]
+
+        if action in ("deletion", "privacyDeletion"):
+            group["upsert"].discard(object_id)
+            group["delete"].add(object_id)
+        else:
+            # Creation, property changes, restores and merges: re-read the record
+            group["delete"].discard(object_id)
+            group["upsert"].add(object_id)
+            # Records merged into this one no longer exist
+            for merged_id in event.get("mergedObjectIds", []) or []:
+                group["upsert"].discard(str(merged_id))
+                group["delete"].add(str(merged_id))
+    return changes
+
+async def _portal_users(portal_id: str) -> List[Tuple[str, Optional[str]]]:
+    hubspot = import_integration("hubspot")
+    members = await get_redis().smembers(hubspot.portal_key(portal_id))
+    return [tuple(json.loads(member)) for member in members]
+
+async def apply_events(events: List[Dict[str, Any]]) -> None:
+    """
+    Apply a batch of webhook events to the item store of every user connected to each portal.
+
+    Changed records are re-read through the batch read endpoint, deleted ones are removed,
+    and the affected item caches are invalidated. Users whose credentials are gone only
+    have their cache invalidated.
+    """
+    hubspot = import_integration("hubspot")
+    for (portal_id, object_type), group in _group_events(events).items():
+        for user_id, org_id in await _portal_users(portal_id):
+            try:
+                await item_store.delete_items("hubspot", user_id, org_id, object_type, group["delete"])
+                if group["upsert"]:
+                    auth = await hubspot.get_hubspot_credentials(user_id, org_id)
+                    if auth.get("authenticated"):
+                        credentials = json.dumps(auth["credentials"])
+                        items = await hubspot.batch_read_hubspot(credentials, object_type, list(group["upsert"]))
+                        await item_store.merge_items("hubspot", user_id, org_id, object_type, items)
+            except Exception as e:
+                print(f"Error applying HubSpot webhook events for {user_id}: {str(e)}")
+            finally:
+                await invalidate_items("hubspot", user_id, org_id)
+
+async def _drain_batch() -> List[Dict[str, Any]]:
+    # Wait for one event, then collect whatever else arrives within the batch window
+    events = [await _queue.get()]
+    deadline = time.monotonic() + HUBSPOT_WEBHOOK_BATCH_WINDOW
+    while len(events) < HUBSPOT_WEBHOOK_BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            events.append(await asyncio.wait_for(_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return events
+
+async def _run_worker() -> None:
+    while True:
+        events = await _drain_batch()
+        try:
+            with background_priority():
+                await apply_events(events)
+        except Exception as e:
+            print(f"Error processing HubSpot webhook events: {str(e)}")
+
+def start_webhook_worker() -> None:
+    """
+    Start the background task that applies queued webhook events.
+    """
+    global _queue, _worker
+    if _worker is None:
+        _queue = asyncio.Queue(maxsize=HUBSPOT_WEBHOOK_QUEUE_SIZE)
+        _worker = asyncio.create_task(_run_worker())
+
+async def stop_webhook_worker() -> None:
+    global _queue, _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
+        _queue = None
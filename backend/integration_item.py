@@ -1,31 +1,29 @@
-
+from dataclasses import dataclass, field, fields
 from typing import Dict, Any, Optional
 
+@dataclass(slots=True)
 class IntegrationItem:
     """
     Represents an integration item retrieved from external services like HubSpot, Notion, or Airtable.
+
+    Instances are slotted (no per-instance __dict__) and are serialized directly by
+    item_serializer, without being converted to dicts first.
     """
-    
-    def __init__(
-        self,
-        id: str,
-        name: str,
-        icon: str,
-        description: str,
-        type: str,
-        created_at: str,
-        created_by: str,
-        updated_at: str,
-        url: str,
-        metadata: Dict[str, Any] = None
-    ):
-        self.id = id
-        self.name = name
-        self.icon = icon
-        self.description = description
-        self.type = type
-        self.created_at = created_at
-        self.created_by = created_by
-        self.updated_at = updated_at
-        self.url = url
-        self.metadata = metadata or {}
+
+    id: str
+    name: str
+    icon: str
+    description: str
+    type: str
+    created_at: str
+    created_by: str
+    updated_at: str
+    url: str
+    metadata: Optional[Dict[str, Any]] = field(default=None)
+
+    def __post_init__(self):
+        if self.metadata is None:
+            self.metadata = {}
+
+# Field names clients can select in item responses
+ITEM_FIELDS = tuple(item_field.name for item_field in fields(IntegrationItem))
@@ -0,0 +1,113 @@
+
+import os
+import json
+import uuid
+import asyncio
+from typing import Callable, Dict, Optional
+
+from redis.asyncio.client import Pipeline
+
+from redis_store import REDIS_SOCKET_TIMEOUT, get_redis
+
+# Channel carrying invalidations of process-local caches between API and prefetch processes
+INVALIDATION_CHANNEL = os.environ.get("INVALIDATION_CHANNEL", "cache_invalidation")
+INVALIDATION_RETRY_DELAY = 1.0
+# How long one read waits for a message; kept below the Redis socket timeout
+INVALIDATION_POLL_TIMEOUT = min(1.0, REDIS_SOCKET_TIMEOUT / 2)
+
+# Identifies this process's messages, which it has already applied to its own caches
+_origin = uuid.uuid4().hex
+# Per cache name: called with a key to drop, or None to drop everything
+_handlers: Dict[str, Callable[[Optional[str]], None]] = {}
+_listener: Optional[asyncio.Task] = None
+_subscribed = False
+# Bumped whenever local caches are invalidated, so a value read before an invalidation isn't cached after it
+_generation = 0
+
+def register_invalidation_handler(cache: str, handler: Callable[[Optional[str]], None]) -> None:
+    """
+    Register how a process-local cache drops a key (or everything, when given None).
+    """
+    _handlers[cache] = handler
+
+def invalidation_active() -> bool:
+    """
+    Whether this process is currently receiving invalidations.
+
+    Local caches must not be trusted otherwise, since writes by other processes would go unnoticed.
+    """
+    return _subscribed
+
+def invalidation_generation() -> int:
+    """
+    Return a counter that changes whenever this process applies an invalidation.
+
+    Read it before loading a value and only cache the value if it is unchanged afterwards.
+    """
+    return _generation
+
+def publish_invalidation(cache: str, key: str, pipe: Pipeline) -> None:
+    """
+    Queue an invalidation of one cache key on a Redis pipeline, so it is sent with the write it follows.
+    """
+    pipe.publish(INVALIDATION_CHANNEL, json.dumps({"origin": _origin, "cache": cache, "key": key}))
+
+def _clear_all() -> None:
+    global _generation
+    _generation += 1
+    for handler in _handlers.values():
+        handler(None)
+
+def _apply(data: bytes) -> None:
+    global _generation
+    message = json.loads(data)
+    if message.get("origin") == _origin:
+        return
+    _generation += 1
+    handler = _handlers.get(message.get("cache"))
+    if handler is not None:
+        handler(message.get("key"))
+
+async def _listen() -> None:
+    global _subscribed, _generation
+    while True:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while unsubscribed was missed, so start from empty caches
+            _clear_all()
+            _subscribed = True
+            while True:
+                message = await pubsub.get_message(timeout=INVALIDATION_POLL_TIMEOUT)
+                if message is not None and message["type"] == "message":
+                    _apply(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error receiving cache invalidations: {str(e)}")
+        finally:
+            _subscribed = False
+            _generation += 1
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+        await asyncio.sleep(INVALIDATION_RETRY_DELAY)
+
+def start_invalidation_listener() -> None:
+    """
+    Start the background task that applies invalidations published by other processes.
+    """
+    global _listener
+    if _listener is None:
+        _listener = asyncio.create_task(_listen())
+
+async def stop_invalidation_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+        _listener = None
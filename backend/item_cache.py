@@ -0,0 +1,111 @@
+
+import os
+import json
+import hashlib
+from typing import Any, NamedTuple, Optional, Sequence, Tuple
+
+from invalidation import invalidation_active, invalidation_generation, publish_invalidation, register_invalidation_handler
+from item_serializer import dump_items
+from metrics import ITEM_CACHE_LOOKUPS, span
+from redis_store import get_redis
+from ttl_cache import TTLCache
+
+# Item cache configuration
+ITEM_CACHE_TTL = float(os.environ.get("ITEM_CACHE_TTL", "60"))
+ITEM_CACHE_MAX_ENTRIES = int(os.environ.get("ITEM_CACHE_MAX_ENTRIES", "1000"))
+# Lists served stale (the integration couldn't be synced) are only cached briefly, so
+# the sync is tried again soon; the circuit breaker keeps those retries cheap
+ITEM_CACHE_STALE_TTL = float(os.environ.get("ITEM_CACHE_STALE_TTL", "5"))
+
+class CachedItems(NamedTuple):
+    """
+    A serialized item list, the ETag derived from its content, the number of items and
+    the parts of it that are stale (left as they were because the integration couldn't be synced).
+    """
+    body: bytes
+    etag: str
+    count: int
+    stale: Tuple[str, ...] = ()
+
+# Kept consistent across API and prefetch processes by an invalidation published whenever items change
+ITEMS_CACHE = "items"
+_cache = TTLCache(ITEM_CACHE_MAX_ENTRIES, ITEM_CACHE_TTL)
+
+def _cache_key(integration_type: str, user_id: str, org_id: Optional[str] = None) -> tuple:
+    return (integration_type, user_id, org_id)
+
+def _invalidate_cached_items(key: Optional[str]) -> None:
+    if key is None:
+        _cache.clear()
+    else:
+        _cache.delete(tuple(json.loads(key)))
+
+register_invalidation_handler(ITEMS_CACHE, _invalidate_cached_items)
+
+def get_cached_items(integration_type: str, user_id: str, org_id: Optional[str] = None) -> Optional[CachedItems]:
+    """
+    Return the cached item list for an integration and user/org, if still fresh.
+
+    The cache is bypassed while invalidations aren't being received, since changes made
+    by other processes would go unnoticed.
+    """
+    cached = _cache.get(_cache_key(integration_type, user_id, org_id)) if invalidation_active() else None
+    ITEM_CACHE_LOOKUPS.inc(integration_type, "miss" if cached is None else "hit")
+    return cached
+
+def serialize_items(items: Sequence[Any], stale: Sequence[str] = ()) -> CachedItems:
+    """
+    Serialize an item list and derive its ETag, without caching it.
+    """
+    with span("cache_items", "serialize"):
+        body = dump_items(items)
+    return CachedItems(
+        body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"', count=len(items), stale=tuple(stale)
+    )
+
+def cache_items(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    items: Sequence[Any],
+    stale: Sequence[str] = (),
+    generation: Optional[int] = None
+) -> CachedItems:
+    """
+    Serialize an item list once and cache it together with its content hash.
+
+    Args:
+        integration_type: The integration the items were loaded from
+        user_id: The ID of the user
+        org_id: The ID of the organization (optional)
+        items: The normalized items
+        stale: The parts of the list that are stale (optional)
+        generation: invalidation_generation() from before the items were loaded; the list
+            isn't cached if an invalidation arrived since, as it may predate the change (optional)
+
+    Returns:
+        CachedItems: The serialized body and its ETag
+    """
+    cached = serialize_items(items, stale)
+    if invalidation_active() and (generation is None or generation == invalidation_generation()):
+        _cache.set(_cache_key(integration_type, user_id, org_id), cached, ITEM_CACHE_STALE_TTL if stale else None)
+    return cached
+
+async def invalidate_items(integration_type: str, user_id: str, org_id: Optional[str] = None) -> None:
+    """
+    Drop the cached item list for an integration and user/org, in this process and every other one.
+    """
+    _cache.delete(_cache_key(integration_type, user_id, org_id))
+    async with get_redis().pipeline(transaction=False) as pipe:
+        publish_invalidation(ITEMS_CACHE, json.dumps([integration_type, user_id, org_id]), pipe)
+        await pipe.execute()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header value against an ETag.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
@@ -0,0 +1,222 @@
+
+import os
+import re
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from ttl_cache import TTLCache
+
+# Item index configuration
+ITEM_INDEX_TTL = float(os.environ.get("ITEM_INDEX_TTL", "3600"))
+ITEM_INDEX_MAX_ENTRIES = int(os.environ.get("ITEM_INDEX_MAX_ENTRIES", "1000"))
+
+# Metadata fields searched alongside name and description
+ITEM_INDEX_METADATA_FIELDS = ("email", "company", "domain", "website", "phone", "city", "industry")
+
+SORT_FIELDS = ("created_at", "updated_at")
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens ("john@example.com" -> john, example, com).
+    """
+    return _TOKEN.findall(text.lower())
+
+def _field(item: Any, name: str) -> Any:
+    # Items are normally IntegrationItems, but other integrations may return plain dicts
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name, None)
+
+def _item_key(item: Any) -> str:
+    # IDs are only unique within an object type (a contact and a deal can share one)
+    return f"{_field(item, 'type')}:{_field(item, 'id')}"
+
+def _item_tokens(item: Any) -> Set[str]:
+    texts = [_field(item, "name"), _field(item, "description")]
+    metadata = _field(item, "metadata") or {}
+    texts.extend(metadata.get(name) for name in ITEM_INDEX_METADATA_FIELDS)
+    tokens: Set[str] = set()
+    for text in texts:
+        if isinstance(text, str):
+            tokens.update(tokenize(text))
+    return tokens
+
+class ItemIndex:
+    """
+    Search index over one user's items for one integration.
+
+    Tokens from each item's name, description and selected metadata fields are kept
+    in a sorted list, so a query token matches every indexed token it is a prefix of
+    with a bisect. Items are also kept sorted by created_at and updated_at. Updates
+    only re-index the items that changed.
+    """
+
+    def __init__(self):
+        self._items: Dict[str, Any] = {}
+        # Items are keyed by "<type>:<id>"; the sorted keys are the order used when no sort is requested
+        self._ids: List[str] = []
+        self._item_tokens: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._terms: List[str] = []
+        self._sorted: Dict[str, List[Tuple[str, str]]] = {field: [] for field in SORT_FIELDS}
+        # ETag of the item list the index was last brought in line with
+        self.version: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _add(self, item_id: str, item: Any) -> None:
+        self._items[item_id] = item
+        insort(self._ids, item_id)
+        tokens = _item_tokens(item)
+        self._item_tokens[item_id] = tokens
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                insort(self._terms, token)
+            postings.add(item_id)
+        for field, keys in self._sorted.items():
+            insort(keys, (_field(item, field) or "", item_id))
+
+    def _remove(self, item_id: str) -> None:
+        item = self._items.pop(item_id)
+        del self._ids[bisect_left(self._ids, item_id)]
+        for token in self._item_tokens.pop(item_id):
+            postings = self._postings[token]
+            postings.discard(item_id)
+            if not postings:
+                del self._postings[token]
+                del self._terms[bisect_left(self._terms, token)]
+        for field, keys in self._sorted.items():
+            position = bisect_left(keys, (_field(item, field) or "", item_id))
+            if position < len(keys) and keys[position][1] == item_id:
+                del keys[position]
+
+    def upsert(self, items: Iterable[Any]) -> int:
+        """
+        Add new items and re-index changed ones. Returns how many were (re)indexed.
+        """
+        changed = 0
+        for item in items:
+            item_id = _item_key(item)
+            current = self._items.get(item_id)
+            if current is not None:
+                if current == item:
+                    continue
+                self._remove(item_id)
+            self._add(item_id, item)
+            changed += 1
+        return changed
+
+    def remove(self, item_ids: Iterable[str]) -> None:
+        """
+        Drop items by key ("<type>:<id>").
+        """
+        for item_id in item_ids:
+            if item_id in self._items:
+                self._remove(item_id)
+
+    def replace(self, items: List[Any]) -> int:
+        """
+        Make the index match a full item list, touching only added, changed and removed items.
+        """
+        current_ids = {_item_key(item) for item in items}
+        removed = [item_id for item_id in self._items if item_id not in current_ids]
+        self.remove(removed)
+        return self.upsert(items) + len(removed)
+
+    def _match_token(self, token: str) -> Set[str]:
+        matches: Set[str] = set()
+        position = bisect_left(self._terms, token)
+        while position < len(self._terms) and self._terms[position].startswith(token):
+            matches |= self._postings[self._terms[position]]
+            position += 1
+        return matches
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        types: Optional[Set[str]] = None,
+        sort: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Tuple[int, List[Any]]:
+        """
+        Find items matching every query token (as a prefix) and any of the given types.
+
+        Args:
+            query: Free text; each token must prefix-match a token of the item
+            types: Item types to keep (e.g. {"contact", "deal"})
+            sort: created_at or updated_at, or None for type and ID order
+            descending: Sort newest first
+            limit: Maximum number of items to return
+            offset: Number of matching items to skip
+
+        Returns:
+            Tuple[int, List[Any]]: The total number of matches and the requested slice
+        """
+        candidates: Optional[Set[str]] = None
+        for token in set(tokenize(query or "")):
+            matches = self._match_token(token)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return 0, []
+
+        if candidates is not None and len(candidates) * 8 < len(self._items):
+            # Few matches: sorting them directly beats walking every key
+            sort_key = (lambda item_id: (_field(self._items[item_id], sort) or "", item_id)) if sort else None
+            ordered = sorted(candidates, key=sort_key, reverse=descending)
+        elif sort is not None:
+            keys = self._sorted[sort]
+            ordered: Iterable[str] = (item_id for _, item_id in (reversed(keys) if descending else keys))
+        else:
+            ordered = reversed(self._ids) if descending else self._ids
+
+        matching = [
+            item_id for item_id in ordered
+            if (candidates is None or item_id in candidates)
+            and (not types or _field(self._items[item_id], "type") in types)
+        ]
+        end = None if limit is None else offset + limit
+        return len(matching), [self._items[item_id] for item_id in matching[offset:end]]
+
+_indexes = TTLCache(ITEM_INDEX_MAX_ENTRIES, ITEM_INDEX_TTL)
+
+def get_item_index(integration_type: str, user_id: str, org_id: Optional[str] = None) -> Optional[ItemIndex]:
+    """
+    Return the item index for an integration and user/org, if one has been built.
+    """
+    return _indexes.get((integration_type, user_id, org_id))
+
+def update_item_index(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    items: List[Any],
+    version: Optional[str] = None
+) -> ItemIndex:
+    """
+    Bring the item index for an integration and user/org in line with its current items.
+
+    Args:
+        integration_type: The integration the items were loaded from
+        user_id: The ID of the user
+        org_id: The ID of the organization (optional)
+        items: The user's full current item list
+        version: An identifier of the item list (its ETag), to tell when the index is stale
+
+    Returns:
+        ItemIndex: The updated index
+    """
+    key = (integration_type, user_id, org_id)
+    index = _indexes.get(key)
+    if index is None:
+        index = ItemIndex()
+    index.replace(items)
+    index.version = version
+    _indexes.set(key, index)
+    return index
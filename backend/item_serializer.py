@@ -0,0 +1,53 @@
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import orjson
+
+from integration_item import IntegrationItem
+
+# orjson encodes slotted dataclasses natively, so item lists are written straight to
+# bytes without building an intermediate dict per item or going through FastAPI's
+# jsonable_encoder. Plain dicts (e.g. from other integrations) are encoded as-is.
+
+def _field(item: Any, name: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name, None)
+
+def project_items(items: Iterable[Any], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Keep only the selected fields of each item.
+    """
+    return [{name: _field(item, name) for name in fields} for item in items]
+
+def dump_items(items: Sequence[Any], fields: Optional[Sequence[str]] = None) -> bytes:
+    """
+    Serialize a list of items to a JSON array, optionally with only the selected fields.
+    """
+    return orjson.dumps(project_items(items, fields) if fields else items)
+
+def dump_item(item: Any) -> bytes:
+    """
+    Serialize a single item to a JSON object.
+    """
+    return orjson.dumps(item)
+
+def dump_items_ndjson(items: Iterable[Any], fields: Optional[Sequence[str]] = None) -> bytes:
+    """
+    Serialize items as newline-delimited JSON, optionally with only the selected fields.
+    """
+    if fields:
+        items = project_items(items, fields)
+    return b"".join(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE) for item in items)
+
+def load_item(data: bytes) -> IntegrationItem:
+    """
+    Rebuild an IntegrationItem from its serialized JSON object.
+    """
+    return IntegrationItem(**orjson.loads(data))
+
+def load_item_dicts(data: bytes) -> List[Dict[str, Any]]:
+    """
+    Parse a serialized item array into plain dicts, without rebuilding IntegrationItems.
+    """
+    return orjson.loads(data)
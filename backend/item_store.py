@@ -0,0 +1,158 @@
+
+from typing import Dict, Iterable, List, Optional
+
+from redis.asyncio.client import Pipeline
+
+from integration_item import IntegrationItem
+from item_serializer import dump_item, load_item
+from redis_store import get_redis
+
+# Redis-backed store of normalized items, used for incremental sync.
+# Each integration/user/org/object type has a hash of item ID -> item JSON, plus a
+# sync watermark (epoch milliseconds) recording when that object type was last synced.
+
+def _scope(integration_type: str, user_id: str, org_id: Optional[str]) -> str:
+    return f"{integration_type}:{user_id}:{org_id or ''}"
+
+def items_key(integration_type: str, user_id: str, org_id: Optional[str], object_type: str) -> str:
+    return f"items:{_scope(integration_type, user_id, org_id)}:{object_type}"
+
+def watermark_key(integration_type: str, user_id: str, org_id: Optional[str], object_type: str) -> str:
+    return f"items_watermark:{_scope(integration_type, user_id, org_id)}:{object_type}"
+
+def full_sync_key(integration_type: str, user_id: str, org_id: Optional[str], object_type: str) -> str:
+    return f"items_full_sync:{_scope(integration_type, user_id, org_id)}:{object_type}"
+
+async def get_sync_state(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_type: str
+) -> Dict[str, Optional[int]]:
+    """
+    Return the watermark and the time of the last full sync (both epoch ms, or None).
+    """
+    async with get_redis().pipeline(transaction=False) as pipe:
+        watermark, full_sync_at = await (
+            pipe.get(watermark_key(integration_type, user_id, org_id, object_type))
+            .get(full_sync_key(integration_type, user_id, org_id, object_type))
+            .execute()
+        )
+    return {
+        "watermark": int(watermark) if watermark else None,
+        "full_sync_at": int(full_sync_at) if full_sync_at else None,
+    }
+
+async def write_full_sync_page(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_type: str,
+    items: List[IntegrationItem]
+) -> None:
+    """
+    Stage one page of a full sync. Staged pages replace the stored items on commit_full_sync.
+    """
+    if not items:
+        return
+    staging_key = items_key(integration_type, user_id, org_id, object_type) + ":staging"
+    await get_redis().hset(staging_key, mapping={item.id: dump_item(item) for item in items})
+
+async def commit_full_sync(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_type: str,
+    watermark: int
+) -> None:
+    """
+    Atomically swap the staged items in and record the new watermark.
+    """
+    key = items_key(integration_type, user_id, org_id, object_type)
+    staging_key = key + ":staging"
+    redis = get_redis()
+
+    async with redis.pipeline(transaction=True) as pipe:
+        # An object type with no records never creates a staging hash
+        if await redis.exists(staging_key):
+            pipe.rename(staging_key, key)
+        else:
+            pipe.delete(key)
+        pipe.set(watermark_key(integration_type, user_id, org_id, object_type), watermark)
+        pipe.set(full_sync_key(integration_type, user_id, org_id, object_type), watermark)
+        await pipe.execute()
+
+async def discard_full_sync(integration_type: str, user_id: str, org_id: Optional[str], object_type: str) -> None:
+    await get_redis().delete(items_key(integration_type, user_id, org_id, object_type) + ":staging")
+
+async def merge_items(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_type: str,
+    items: List[IntegrationItem],
+    watermark: Optional[int] = None
+) -> None:
+    """
+    Upsert changed items and optionally advance the watermark, in one round-trip.
+    """
+    async with get_redis().pipeline(transaction=True) as pipe:
+        if items:
+            pipe.hset(
+                items_key(integration_type, user_id, org_id, object_type),
+                mapping={item.id: dump_item(item) for item in items}
+            )
+        if watermark is not None:
+            pipe.set(watermark_key(integration_type, user_id, org_id, object_type), watermark)
+        await pipe.execute()
+
+async def delete_items(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_type: str,
+    item_ids: Iterable[str]
+) -> None:
+    item_ids = list(item_ids)
+    if item_ids:
+        await get_redis().hdel(items_key(integration_type, user_id, org_id, object_type), *item_ids)
+
+async def load_items(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_types: List[str]
+) -> List[IntegrationItem]:
+    """
+    Read the stored items of several object types in one round-trip.
+
+    Items are ordered by object type, then ID, so the same content always
+    serializes to the same bytes.
+    """
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for object_type in object_types:
+            pipe.hgetall(items_key(integration_type, user_id, org_id, object_type))
+        results = await pipe.execute()
+
+    items = []
+    for stored in results:
+        items.extend(load_item(stored[item_id]) for item_id in sorted(stored))
+    return items
+
+def clear_items(
+    integration_type: str,
+    user_id: str,
+    org_id: Optional[str],
+    object_types: List[str],
+    pipe: Pipeline
+) -> None:
+    """
+    Queue removal of the stored items and sync state on a Redis pipeline,
+    forcing the next load to do a full sync.
+    """
+    keys = []
+    for object_type in object_types:
+        keys.append(items_key(integration_type, user_id, org_id, object_type))
+        keys.append(watermark_key(integration_type, user_id, org_id, object_type))
+        keys.append(full_sync_key(integration_type, user_id, org_id, object_type))
+    pipe.delete(*keys)
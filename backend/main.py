@@ -1,18 +1,65 @@
 
-from fastapi import FastAPI, HTTPException, Request, Depends, Form
+from fastapi import FastAPI, HTTPException, Request, Depends, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, field_validator
+import os
+import sys
 import json
-from typing import Dict, Any, Optional
-
-# Import integration modules
-import airtable
-import notion
-import hubspot
-from integration_item import IntegrationItem
+import math
+import time
+import asyncio
+import hashlib
+import httpx
+from typing import AsyncIterator, Dict, Any, List, Optional, Set, Tuple, Union
+
+# Integration modules are imported lazily through the registry, and the modules built on
+# them (exports, webhooks, prefetch, associations) by the routes and hooks that use them
+from registry import CONNECTORS, Connector, gather_connectors, get_connector, import_integration
+from integration_item import ITEM_FIELDS, IntegrationItem
+from circuit_breaker import CircuitOpenError
+from deadline import DeadlineExceeded, DeadlineMiddleware, extended_deadline
+from file_response import RangedFileResponse
+from invalidation import invalidation_generation, start_invalidation_listener, stop_invalidation_listener
+from item_cache import CachedItems, cache_items, etag_matches, get_cached_items, invalidate_items, serialize_items
+from item_index import SORT_FIELDS, get_item_index, update_item_index
+from item_serializer import dump_items, dump_items_ndjson, load_item_dicts
+from metrics import RequestMetricsMiddleware, render_metrics, span
+from redis_store import close_redis
+from singleflight import singleflight
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def start_background_workers():
+    # Apply cache invalidations published by other workers (credential writes and refreshes)
+    start_invalidation_listener()
+    from hubspot_webhooks import start_webhook_worker
+    start_webhook_worker()
+    # Delete export files once their job records expire
+    from exports import start_export_sweeper
+    start_export_sweeper()
+    # Keep connected users' tokens and items warm (or run them separately: python -m prefetch)
+    from prefetch import PREFETCH_MODE, start_prefetch_workers
+    if PREFETCH_MODE == "app":
+        start_prefetch_workers()
+
+# Stop background work and release pooled HubSpot and Redis connections when the server stops.
+# Only modules that were loaded have anything to stop.
+@app.on_event("shutdown")
+async def shutdown_clients():
+    for module_name, stop in (
+        ("hubspot_webhooks", "stop_webhook_worker"),
+        ("prefetch", "stop_prefetch_workers"),
+        ("exports", "stop_export_jobs"),
+    ):
+        if module_name in sys.modules:
+            await getattr(sys.modules[module_name], stop)()
+    await stop_invalidation_listener()
+    if "hubspot_client" in sys.modules:
+        await sys.modules["hubspot_client"].close_hubspot_client()
+    await close_redis()
+
 # Configure CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -20,12 +67,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Total-Count", "X-Degraded", "Retry-After"],
 )
 
+# Give every request a deadline that its outbound calls are cut to
+app.add_middleware(DeadlineMiddleware)
+
+# Record request latency for the /metrics endpoint
+app.add_middleware(RequestMetricsMiddleware)
+
+# An upstream that is failing (open circuit) or too slow for the request's deadline is
+# reported as unavailable rather than as a server error
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 class OAuthCallbackRequest(BaseModel):
     code: str
     state: str
 
+class HubSpotBatchReadRequest(BaseModel):
+    object_type: str
+    # HubSpot record IDs are numeric strings, which clients may send as JSON numbers
+    ids: List[Union[str, int]]
+    fields: Optional[List[str]] = None
+
+    @field_validator("ids")
+    @classmethod
+    def ids_as_strings(cls, ids: List[Union[str, int]]) -> List[str]:
+        return [str(item_id) for item_id in ids]
+
+class ExportRequest(BaseModel):
+    object_types: Optional[List[str]] = None
+    fields: Optional[List[str]] = None
+
 # Simulated user authentication - in a real app, this would use proper authentication
 def get_current_user_id():
     # For demo purposes, return a fixed user ID
@@ -37,16 +120,15 @@ async def get_auth_urls():
     # Get the current user ID
     current_user_id = get_current_user_id()
     
-    # Generate authorization URLs for each integration
-    hubspot_auth = await authorize_hubspot(current_user_id)
-    notion_auth = await authorize_notion(current_user_id)
-    airtable_auth = await authorize_airtable(current_user_id)
+    # Generate authorization URLs for every integration concurrently; one that fails gets an empty URL
+    results = await gather_connectors(lambda connector: connector.authorize(current_user_id))
     
-    auth_urls = {
-        "hubspot": hubspot_auth.get("auth_url", ""),
-        "notion": notion_auth.get("auth_url", ""),
-        "airtable": airtable_auth.get("auth_url", ""),
-    }
+    auth_urls = {}
+    for integration_type, result in results.items():
+        if isinstance(result, BaseException):
+            print(f"Error authorizing {integration_type}: {result!r}")
+            result = {}
+        auth_urls[integration_type] = result.get("auth_url", "")
     
     return auth_urls
 
@@ -54,47 +136,328 @@ async def get_auth_urls():
 @app.get("/authorize/{integration_type}")
 async def authorize_integration(integration_type: str):
     current_user_id = get_current_user_id()
-    
-    if integration_type == "hubspot":
-        return await authorize_hubspot(current_user_id)
-    elif integration_type == "notion":
-        return await authorize_notion(current_user_id)
-    elif integration_type == "airtable":
-        return await authorize_airtable(current_user_id)
-    else:
-        raise HTTPException(status_code=404, detail="Integration not found")
+    return await get_connector(integration_type).authorize(current_user_id)
 
 # OAuth callback routes
 @app.post("/oauth2callback/{integration_type}")
 async def oauth2_callback(integration_type: str, request_data: OAuthCallbackRequest):
-    if integration_type == "hubspot":
-        return await oauth2callback_hubspot(request_data.code, request_data.state)
-    elif integration_type == "notion":
-        return await oauth2callback_notion(request_data.code, request_data.state)
-    elif integration_type == "airtable":
-        return await oauth2callback_airtable(request_data.code, request_data.state)
-    else:
-        raise HTTPException(status_code=404, detail="Integration not found")
+    connector = get_connector(integration_type)
+    return await connector.callback_with_code(request_data.code, request_data.state)
 
 # Check authentication status
 @app.get("/check-auth/{integration_type}")
 async def check_auth(integration_type: str):
     current_user_id = get_current_user_id()
+    authenticated = await get_connector(integration_type).has_credentials(current_user_id)
+    if authenticated:
+        # The user is likely about to load items; put them on the frequent prefetch schedule
+        from prefetch import record_activity
+        await record_activity(integration_type, current_user_id)
+    return {"authenticated": authenticated}
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated selection of IntegrationItem fields (None selects every field).
+    """
+    if fields is None:
+        return None
+    selected = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in selected if name not in ITEM_FIELDS]
+    if not selected or unknown:
+        raise HTTPException(status_code=400, detail=f"fields must be a comma-separated list of: {', '.join(ITEM_FIELDS)}")
+    return selected
+
+# Related data that can be added to items with ?include=
+INCLUDE_OPTIONS = ("associations",)
+
+def parse_include(include: Optional[str]) -> List[str]:
+    """
+    Parse a comma-separated list of INCLUDE_OPTIONS.
+    """
+    if include is None:
+        return []
+    selected = [name.strip() for name in include.split(",") if name.strip()]
+    if not selected or any(name not in INCLUDE_OPTIONS for name in selected):
+        raise HTTPException(status_code=400, detail=f"include must be a comma-separated list of: {', '.join(INCLUDE_OPTIONS)}")
+    return selected
+
+async def with_associations(token: str, body: bytes, user_id: str) -> bytes:
+    """
+    Link the HubSpot items of a serialized item array to their associated records.
+
+    Raises:
+        HTTPException: 502 if HubSpot fails to return the associations
+    """
+    from hubspot_associations import attach_associations
+    from hubspot_scheduler import for_portal
+    hubspot = import_integration("hubspot")
+    items = [IntegrationItem(**item) for item in load_item_dicts(body)]
+    portal = await hubspot.hubspot_portal(token, user_id)
+    with span("get_items_hubspot", "associations"), for_portal(portal):
+        try:
+            await attach_associations(hubspot.parse_access_token(token), items)
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Error loading HubSpot associations: {str(e)}")
+    return dump_items(items)
+
+def project_body(body: bytes, fields: Optional[List[str]]) -> bytes:
+    """
+    Trim a serialized item array to the selected fields.
+    """
+    if not fields:
+        return body
+    with span("project_items", "serialize"):
+        return dump_items(load_item_dicts(body), fields)
+
+# Streaming encoders for item pages
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+class StreamIncomplete(Exception):
+    """
+    Raised to end a response abnormally when part of what it streams failed after it started.
+    """
+
+async def stream_ndjson(
+    pages: AsyncIterator[List[IntegrationItem]],
+    fields: Optional[List[str]] = None,
+    failed: Optional[List[str]] = None,
+    reported: int = 0
+) -> AsyncIterator[bytes]:
+    async for page in pages:
+        if page:
+            yield dump_items_ndjson(page, fields)
+    # Object types that failed are missing from the stream; a closing status record lists
+    # them (items never have an "error" key), so clients can tell the stream is incomplete
+    if failed:
+        status = {"error": "Some object types failed to load", "failed_types": failed}
+        yield json.dumps(status).encode("utf-8") + b"\n"
+
+async def stream_json_array(
+    pages: AsyncIterator[List[IntegrationItem]],
+    fields: Optional[List[str]] = None,
+    failed: Optional[List[str]] = None,
+    reported: int = 0
+) -> AsyncIterator[bytes]:
+    """
+    Stream pages as one JSON array.
     
-    if integration_type == "hubspot":
-        authenticated = await has_hubspot_credentials(current_user_id)
-    elif integration_type == "notion":
-        authenticated = await has_notion_credentials(current_user_id)
-    elif integration_type == "airtable":
-        authenticated = await has_airtable_credentials(current_user_id)
-    else:
-        raise HTTPException(status_code=404, detail="Integration not found")
+    An array has no room for a status record, so if an object type fails after the
+    X-Degraded header (listing the first reported failures) was sent, the array is left
+    unclosed and the response ends abnormally rather than looking complete.
+    """
+    yield b"["
+    first = True
+    async for page in pages:
+        if not page:
+            continue
+        # Each page is encoded as one array; strip its brackets to splice it into the stream
+        chunk = dump_items(page, fields)[1:-1]
+        yield chunk if first else b"," + chunk
+        first = False
+    if failed and len(failed) > reported:
+        raise StreamIncomplete(f"HubSpot {', '.join(failed[reported:])} failed after the stream started")
+    yield b"]"
+
+async def start_stream(pages: AsyncIterator[List[IntegrationItem]]) -> AsyncIterator[List[IntegrationItem]]:
+    """
+    Wait for the first page of a stream, so a load that fails before any items arrive
+    (every object type failed) is an error response rather than an empty stream.
+    """
+    try:
+        first_page = await pages.__anext__()
+    except StopAsyncIteration:
+        first_page = None
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error loading HubSpot items: {str(e)}")
     
-    return {"authenticated": authenticated}
+    async def resume() -> AsyncIterator[List[IntegrationItem]]:
+        if first_page is None:
+            return
+        yield first_page
+        async for page in pages:
+            yield page
+    return resume()
+
+async def load_cached_items(connector: Connector, credentials: str, user_id: str, full: bool = False) -> CachedItems:
+    """
+    Return a user's serialized items for an integration from the item cache, loading them on a miss.
+    
+    Concurrent misses with the same credentials share one load and one serialization, which
+    isn't bound by any one caller's deadline (see extended_deadline). When the integration
+    can't be synced, or the shared load outlasts the caller's deadline, the items it last
+    stored are returned, marked stale.
+    """
+    cached = None if full else get_cached_items(connector.name, user_id)
+    if cached is None:
+        async def load() -> CachedItems:
+            generation = invalidation_generation()
+            # Integrations with an item store (HubSpot) only fetch records modified since the last load
+            items, stale = await connector.sync_items(credentials, user_id, full=full)
+            return cache_items(connector.name, user_id, None, items, stale, generation)
+        
+        credentials_hash = hashlib.sha256(credentials.encode("utf-8")).hexdigest()[:32]
+        key = f"load_items:{connector.name}:{user_id}:{credentials_hash}:{'full' if full else 'incremental'}"
+        try:
+            cached = await singleflight(key, load)
+        except DeadlineExceeded:
+            if connector.spec.sync is None:
+                raise
+            # Past the deadline, a syncing integration answers from its store at once. The
+            # list isn't cached, so the shared load's fresh one isn't overwritten.
+            items, stale = await connector.sync_items(credentials, user_id, full=full)
+            cached = serialize_items(items, stale)
+    return cached
+
+# Latency budget for the aggregated /items endpoint
+ITEMS_DEFAULT_BUDGET_MS = int(os.environ.get("ITEMS_DEFAULT_BUDGET_MS", "5000"))
+ITEMS_MAX_BUDGET_MS = int(os.environ.get("ITEMS_MAX_BUDGET_MS", "30000"))
+
+async def load_source(connector: Connector, user_id: str, full: bool) -> Dict[str, Any]:
+    """
+    Load one integration's items with its stored credentials, reporting how it went.
+    """
+    started = time.perf_counter()
+    source: Dict[str, Any] = {"status": "ok"}
+    try:
+        cached = None if full else get_cached_items(connector.name, user_id)
+        if cached is not None:
+            source["status"] = "cached"
+        else:
+            auth = await connector.get_credentials(user_id)
+            if not auth or not auth.get("authenticated"):
+                source["status"] = "not_connected"
+            else:
+                cached = await load_cached_items(connector, json.dumps(auth["credentials"]), user_id, full)
+        if cached is not None:
+            source["count"] = cached.count
+            source["body"] = cached.body
+            if cached.stale:
+                source["status"] = "degraded"
+                source["stale"] = list(cached.stale)
+    except CircuitOpenError as e:
+        source["status"] = "unavailable"
+        source["error"] = str(e)
+    except HTTPException as e:
+        source["status"] = "unavailable" if e.status_code == 501 else "error"
+        source["error"] = e.detail
+    except Exception as e:
+        print(f"Error loading {connector.name} items: {str(e)}")
+        source["status"] = "error"
+        source["error"] = str(e)
+    source["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return source
+
+# Loads still running after their /items request answered, referenced until they finish
+_background_loads: Set[asyncio.Task] = set()
+
+def _finish_background_load(task: asyncio.Task) -> None:
+    _background_loads.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error loading items in the background: {str(task.exception())}")
+
+# Items from every connected integration, loaded concurrently
+@app.get("/items")
+async def get_all_items(
+    budget_ms: int = ITEMS_DEFAULT_BUDGET_MS,
+    sync: str = "incremental",
+    integrations: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    current_user_id = get_current_user_id()
+    
+    if sync not in ("incremental", "full"):
+        raise HTTPException(status_code=400, detail="sync must be 'incremental' or 'full'")
+    selected_fields = parse_fields(fields)
+    if budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="budget_ms must be positive")
+    budget_ms = min(budget_ms, ITEMS_MAX_BUDGET_MS)
+    
+    names = [name.strip() for name in integrations.split(",")] if integrations else list(CONNECTORS)
+    from prefetch import record_activity
+    connectors = [get_connector(name) for name in names]
+    for connector in connectors:
+        await record_activity(connector.name, current_user_id)
+    tasks = {
+        connector.name: asyncio.ensure_future(load_source(connector, current_user_id, sync == "full"))
+        for connector in connectors
+    }
+    
+    # Whatever hasn't finished by the deadline is reported as timed out. It keeps running
+    # in the background, so its items are in the cache for the next request.
+    await asyncio.wait(tasks.values(), timeout=budget_ms / 1000)
+    
+    sources = {}
+    bodies = []
+    for name, task in tasks.items():
+        if not task.done():
+            _background_loads.add(task)
+            task.add_done_callback(_finish_background_load)
+            sources[name] = {"status": "timeout", "elapsed_ms": budget_ms}
+            continue
+        source = task.result()
+        body = source.pop("body", None)
+        # Splice each source's serialized array into the combined one without re-encoding it
+        if body and body != b"[]":
+            body = project_body(body, selected_fields)
+            bodies.append(body[1:-1])
+        sources[name] = source
+    
+    content = b'{"items":[' + b",".join(bodies) + b'],"sources":' + json.dumps(sources).encode("utf-8") + b"}"
+    return Response(content=content, media_type="application/json", headers={"Cache-Control": "private, no-cache"})
+
+def search_items(
+    integration_type: str,
+    user_id: str,
+    cached: CachedItems,
+    q: Optional[str],
+    item_types: Optional[str],
+    sort: Optional[str],
+    limit: Optional[int],
+    offset: int,
+    fields: Optional[List[str]] = None
+) -> Tuple[int, bytes]:
+    """
+    Answer a search/filter/sort query from the user's item index, refreshing it if the items changed.
+    
+    Returns:
+        Tuple[int, bytes]: The total number of matches and the serialized requested slice
+    """
+    index = get_item_index(integration_type, user_id)
+    if index is None or index.version != cached.etag:
+        # Only items that were added, changed or removed since the last query are re-indexed
+        with span("search_items", "index"):
+            index = update_item_index(integration_type, user_id, None, load_item_dicts(cached.body), cached.etag)
+    
+    descending = bool(sort) and sort.startswith("-")
+    with span("search_items", "search"):
+        total, items = index.search(
+            query=q,
+            types={item_type.strip() for item_type in item_types.split(",")} if item_types else None,
+            sort=sort.lstrip("-") if sort else None,
+            descending=descending,
+            limit=limit,
+            offset=offset,
+        )
+    return total, dump_items(items, fields)
 
 # Routes to get integration items
 @app.get("/items/{integration_type}")
-async def get_items(integration_type: str, request: Request):
+async def get_items(
+    integration_type: str,
+    request: Request,
+    stream: Optional[str] = None,
+    sync: str = "incremental",
+    q: Optional[str] = None,
+    item_type: Optional[str] = Query(None, alias="type"),
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = None,
+    include: Optional[str] = None
+):
     current_user_id = get_current_user_id()
     
     # Get authorization header
@@ -104,121 +467,224 @@ async def get_items(integration_type: str, request: Request):
     
     token = auth_header[7:]  # Remove "Bearer " prefix
     
+    if sync not in ("incremental", "full"):
+        raise HTTPException(status_code=400, detail="sync must be 'incremental' or 'full'")
+    
+    if sort and sort.lstrip("-") not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail="sort must be created_at or updated_at, optionally prefixed with '-'")
+    searching = q is not None or item_type is not None or sort is not None or limit is not None or offset > 0
+    selected_fields = parse_fields(fields)
+    include_associations = "associations" in parse_include(include)
+    if include_associations and integration_type != "hubspot":
+        raise HTTPException(status_code=400, detail="Associations are only supported for HubSpot")
+    
+    # Streaming mode sends items page by page while HubSpot is still being paged
+    if stream:
+        if searching:
+            raise HTTPException(status_code=400, detail="Search parameters can't be combined with streaming")
+        if stream not in STREAM_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'json'")
+        if integration_type != "hubspot":
+            raise HTTPException(status_code=400, detail="Streaming is only supported for HubSpot")
+        
+        hubspot = import_integration("hubspot")
+        # A field selection is pushed upstream, so HubSpot only sends the properties it needs.
+        # A stream lasts as long as paging HubSpot takes, so it isn't bound by the request's
+        # deadline but by the longest one a request may have.
+        from hubspot_scheduler import for_portal
+        failed: List[str] = []
+        portal = await hubspot.hubspot_portal(token, current_user_id)
+        with extended_deadline(), for_portal(portal):
+            pages = await start_stream(hubspot.iter_items_hubspot(
+                hubspot.parse_access_token(token),
+                fields=selected_fields,
+                include_associations=include_associations,
+                failed=failed,
+            ))
+        # Object types that failed are left out of the stream. Those that failed before it
+        # started are reported in a header, and the encoder marks the stream incomplete
+        # for any that fail later
+        headers = {"X-Degraded": ",".join(failed)} if failed else None
+        encoder = stream_ndjson if stream == "ndjson" else stream_json_array
+        return StreamingResponse(
+            encoder(pages, selected_fields, failed, len(failed)), media_type=STREAM_MEDIA_TYPES[stream], headers=headers
+        )
+    
+    from prefetch import record_activity
+    connector = get_connector(integration_type)
+    await record_activity(integration_type, current_user_id)
+    
     try:
-        if integration_type == "hubspot":
-            items = await hubspot.get_items_hubspot(token)
-        elif integration_type == "notion":
-            items = await notion.get_items_notion(token)
-        elif integration_type == "airtable":
-            items = await airtable.get_items_airtable(token)
-        else:
-            raise HTTPException(status_code=404, detail="Integration not found")
+        # Serve repeat loads from the item cache; a matching If-None-Match gets a 304
+        cached = await load_cached_items(connector, token, current_user_id, full=sync == "full")
+        
+        if include_associations:
+            # Associations aren't kept in the item store: they are linked to the items being
+            # returned (mostly from the edge cache) and the response is versioned by its content
+            headers = {"Cache-Control": "private, no-cache"}
+            if cached.stale:
+                headers["X-Degraded"] = ",".join(cached.stale)
+            body = cached.body
+            if searching:
+                total, body = search_items(integration_type, current_user_id, cached, q, item_type, sort, limit, offset)
+                headers["X-Total-Count"] = str(total)
+            body = project_body(await with_associations(token, body, current_user_id), selected_fields)
+            headers["ETag"] = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            if etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+        
+        etag = cached.etag
+        if searching or selected_fields:
+            # A slice is versioned by the item list it came from and the query that selected it
+            etag = f'"{hashlib.sha256((cached.etag + request.url.query).encode("utf-8")).hexdigest()[:32]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if cached.stale:
+            # Served from the last sync because the integration couldn't be reached
+            headers["X-Degraded"] = ",".join(cached.stale)
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        # The item store keeps full items, so a field selection only trims the response here
+        if not searching:
+            return Response(content=project_body(cached.body, selected_fields), media_type="application/json", headers=headers)
         
-        return items
-    except HTTPException:
+        # Only the requested slice is sent; the total number of matches goes in a header
+        total, body = search_items(
+            integration_type, current_user_id, cached, q, item_type, sort, limit, offset, selected_fields
+        )
+        headers["X-Total-Count"] = str(total)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except (HTTPException, CircuitOpenError, DeadlineExceeded):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Fetch specific HubSpot records by ID
+@app.post("/items/hubspot/batch")
+async def batch_read_hubspot_items(request: Request, batch: HubSpotBatchReadRequest):
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+    
+    from hubspot_scheduler import for_portal
+    hubspot = import_integration("hubspot")
+    fields = parse_fields(",".join(batch.fields)) if batch.fields is not None else None
+    token = auth_header[7:]
+    with for_portal(await hubspot.hubspot_portal(token, get_current_user_id())):
+        items = await hubspot.batch_read_hubspot(token, batch.object_type, batch.ids, fields)
+    return Response(content=dump_items(items, fields), media_type="application/json")
+
+# Bulk exports: every record of the requested object types is written to a gzipped
+# NDJSON file in the background, then downloaded (ranges supported)
+@app.post("/exports/hubspot", status_code=202)
+async def submit_hubspot_export(export: ExportRequest):
+    current_user_id = get_current_user_id()
+    if not await get_connector("hubspot").has_credentials(current_user_id):
+        raise HTTPException(status_code=401, detail="HubSpot authentication required")
+    
+    from exports import create_export, export_status
+    fields = parse_fields(",".join(export.fields)) if export.fields is not None else None
+    job = await create_export(current_user_id, None, export.object_types, fields)
+    return export_status(job)
+
+async def get_user_export(job_id: str) -> Dict[str, Any]:
+    """
+    Return an export job of the current user.
+    """
+    from exports import get_export
+    job = await get_export(job_id)
+    if job is None or job["user_id"] != get_current_user_id():
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@app.get("/exports/{job_id}")
+async def get_export_status(job_id: str):
+    from exports import export_status
+    return export_status(await get_user_export(job_id))
+
+@app.post("/exports/{job_id}/resume", status_code=202)
+async def resume_user_export(job_id: str):
+    from exports import export_status, resume_export
+    job = await resume_export(await get_user_export(job_id))
+    return export_status(job)
+
+@app.get("/exports/{job_id}/download")
+async def download_export(job_id: str, request: Request):
+    from exports import EXPORT_MEDIA_TYPE, export_path
+    job = await get_user_export(job_id)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail="Export is not complete")
+    path = export_path(job_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Export file not found")
+    return RangedFileResponse(
+        path,
+        request.headers.get("Range"),
+        media_type=EXPORT_MEDIA_TYPE,
+        filename=f"hubspot-export-{job_id}.ndjson.gz",
+    )
+
+# Drop cached items so the next load goes back to the integration
+@app.delete("/items/{integration_type}/cache")
+async def invalidate_items_cache(integration_type: str):
+    current_user_id = get_current_user_id()
+    await invalidate_items(integration_type, current_user_id)
+    return {"invalidated": True}
+
 # API endpoints for direct integrations as required in the assessment
-# Airtable
-@app.post('/integrations/airtable/authorize')
-async def authorize_airtable_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await airtable.authorize_airtable(user_id, org_id)
-
-@app.get('/integrations/airtable/oauth2callback')
-async def oauth2callback_airtable_integration(request: Request):
-    return await airtable.oauth2callback_airtable(request)
-
-@app.post('/integrations/airtable/credentials')
-async def get_airtable_credentials_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await airtable.get_airtable_credentials(user_id, org_id)
-
-@app.post('/integrations/airtable/load')
-async def get_airtable_items_integration(credentials: str = Form(...)):
-    return await airtable.get_items_airtable(credentials)
-
-# Notion
-@app.post('/integrations/notion/authorize')
-async def authorize_notion_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await notion.authorize_notion(user_id, org_id)
-
-@app.get('/integrations/notion/oauth2callback')
-async def oauth2callback_notion_integration(request: Request):
-    return await notion.oauth2callback_notion(request)
-
-@app.post('/integrations/notion/credentials')
-async def get_notion_credentials_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await notion.get_notion_credentials(user_id, org_id)
-
-@app.post('/integrations/notion/load')
-async def get_notion_items_integration(credentials: str = Form(...)):
-    return await notion.get_items_notion(credentials)
-
-# HubSpot
-@app.post('/integrations/hubspot/authorize')
-async def authorize_hubspot_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await hubspot.authorize_hubspot(user_id, org_id)
-
-@app.get('/integrations/hubspot/oauth2callback')
-async def oauth2callback_hubspot_integration(request: Request):
-    return await hubspot.oauth2callback_hubspot(request)
-
-@app.post('/integrations/hubspot/credentials')
-async def get_hubspot_credentials_integration(user_id: str = Form(...), org_id: str = Form(...)):
-    return await hubspot.get_hubspot_credentials(user_id, org_id)
-
-@app.post('/integrations/hubspot/load')
-async def load_hubspot_data_integration(credentials: str = Form(...)):
-    return await hubspot.get_items_hubspot(credentials)
-
-# Helper functions to match the signature required in the new routes
-async def authorize_hubspot(user_id: str, org_id: str = None):
-    return hubspot.authorize_hubspot(user_id, org_id)
-
-async def oauth2callback_hubspot(code: str, state: str):
-    # Create a mock request object with the code and state
-    class MockRequest:
-        def __init__(self, code, state):
-            self.query_params = {"code": code, "state": state}
-    
-    mock_request = MockRequest(code, state)
-    return await hubspot.oauth2callback_hubspot(mock_request)
-
-async def has_hubspot_credentials(user_id: str):
-    result = await hubspot.get_hubspot_credentials(user_id)
-    return result.get("authenticated", False)
-
-# Similar functions for Notion and Airtable
-async def authorize_notion(user_id: str, org_id: str = None):
-    return notion.authorize_notion(user_id, org_id)
-
-async def oauth2callback_notion(code: str, state: str):
-    class MockRequest:
-        def __init__(self, code, state):
-            self.query_params = {"code": code, "state": state}
-    
-    mock_request = MockRequest(code, state)
-    return await notion.oauth2callback_notion(mock_request)
-
-async def has_notion_credentials(user_id: str):
-    result = await notion.get_notion_credentials(user_id)
-    return result.get("authenticated", False)
-
-async def authorize_airtable(user_id: str, org_id: str = None):
-    return airtable.authorize_airtable(user_id, org_id)
-
-async def oauth2callback_airtable(code: str, state: str):
-    class MockRequest:
-        def __init__(self, code, state):
-            self.query_params = {"code": code, "state": state}
-    
-    mock_request = MockRequest(code, state)
-    return await airtable.oauth2callback_airtable(mock_request)
-
-async def has_airtable_credentials(user_id: str):
-    result = await airtable.get_airtable_credentials(user_id)
-    return result.get("authenticated", False)
+@app.post('/integrations/{integration_type}/authorize')
+async def authorize_integration_direct(integration_type: str, user_id: str = Form(...), org_id: str = Form(...)):
+    return await get_connector(integration_type).authorize(user_id, org_id)
+
+@app.get('/integrations/{integration_type}/oauth2callback')
+async def oauth2callback_integration_direct(integration_type: str, request: Request):
+    return await get_connector(integration_type).callback(request)
+
+@app.post('/integrations/{integration_type}/credentials')
+async def get_credentials_integration_direct(integration_type: str, user_id: str = Form(...), org_id: str = Form(...)):
+    return await get_connector(integration_type).get_credentials(user_id, org_id)
+
+@app.post('/integrations/{integration_type}/load')
+async def load_integration_direct(
+    integration_type: str,
+    credentials: str = Form(...),
+    fields: Optional[str] = Form(None)
+):
+    connector = get_connector(integration_type)
+    selected_fields = parse_fields(fields)
+    failed: List[str] = []
+    items = await connector.load_items(credentials, selected_fields, failed)
+    with span(f"get_items_{connector.name}", "serialize"):
+        body = dump_items(items, selected_fields)
+    # The parts that couldn't be loaded are missing from the list rather than failing it
+    headers = {"X-Degraded": ",".join(failed)} if failed else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# HubSpot change events are verified, queued and applied in the background,
+# so HubSpot gets an immediate response
+@app.post('/integrations/hubspot/webhook')
+async def hubspot_webhook(request: Request):
+    from hubspot_webhooks import enqueue_events, verify_signature
+    body = await request.body()
+    verify_signature(request, body)
+    
+    try:
+        events = json.loads(body)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    
+    enqueue_events(events)
+    return Response(status_code=204)
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
 
 # Root endpoint
 @app.get("/")
@@ -0,0 +1,236 @@
+
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from redis_store import get_round_trip_count
+
+# Latency buckets in seconds, from a Redis round-trip up to a slow full HubSpot sync
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+class Counter:
+    """
+    A monotonically increasing count per label set.
+    """
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+class CallbackCounter(Counter):
+    """
+    A counter whose value is read from a function when metrics are rendered.
+    """
+
+    def __init__(self, name: str, description: str, read: Callable[[], float]):
+        super().__init__(name, description)
+        self._read = read
+
+    def render(self) -> List[str]:
+        self._values = {(): self._read()}
+        return super().render()
+
+class Histogram:
+    """
+    Observations bucketed per label set, with their count and sum.
+
+    Observing is a bisect and a few additions, so it is cheap enough for every request.
+    """
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (the last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {repr(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+STAGE_DURATION = Histogram(
+    "integration_stage_duration_seconds",
+    "Time spent in each stage of an integration operation.",
+    ("operation", "stage"),
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "integration_upstream_request_duration_seconds",
+    "Latency of requests to integration APIs, per attempt, by object type and response status.",
+    ("integration", "object_type", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latency of requests served by this API, up to the response headers.",
+    ("method", "route", "status"),
+)
+ITEM_CACHE_LOOKUPS = Counter(
+    "item_cache_lookups_total",
+    "Item list cache lookups by integration and result (hit or miss).",
+    ("integration", "result"),
+)
+CREDENTIAL_CACHE_LOOKUPS = Counter(
+    "credential_cache_lookups_total",
+    "In-process credential cache lookups by integration and result (hit or miss).",
+    ("integration", "result"),
+)
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Coalesced loads by operation and role: leader ran the load, joined shared one in this process, waited on another worker's.",
+    ("operation", "role"),
+)
+PREFETCH_JOBS = Counter(
+    "prefetch_jobs_total",
+    "Background prefetch jobs run by this process, by kind (refresh or items) and result.",
+    ("kind", "result"),
+)
+CIRCUIT_BREAKER_EVENTS = Counter(
+    "circuit_breaker_events_total",
+    "Circuit breaker transitions (open, half_open, closed) and calls rejected while open, by upstream and endpoint.",
+    ("upstream", "endpoint", "event"),
+)
+REQUEST_DEADLINES_EXCEEDED = Counter(
+    "request_deadlines_exceeded_total",
+    "Upstream calls not made, or given up on, because the request's deadline had passed, by upstream.",
+    ("upstream",),
+)
+REDIS_ROUND_TRIPS = CallbackCounter(
+    "redis_round_trips_total",
+    "Requests written to Redis by this process; a pipeline counts once.",
+    get_round_trip_count,
+)
+
+_metrics = [
+    STAGE_DURATION, UPSTREAM_REQUEST_DURATION, HTTP_REQUEST_DURATION, ITEM_CACHE_LOOKUPS,
+    CREDENTIAL_CACHE_LOOKUPS, SINGLEFLIGHT_CALLS, PREFETCH_JOBS, CIRCUIT_BREAKER_EVENTS,
+    REQUEST_DEADLINES_EXCEEDED, REDIS_ROUND_TRIPS,
+]
+
+@contextmanager
+def span(operation: str, stage: str) -> Iterator[None]:
+    """
+    Time a stage of an operation, whether or not it raises.
+
+    Args:
+        operation: The operation the stage belongs to (e.g. "get_items_hubspot")
+        stage: The stage being timed (e.g. "fetch")
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, operation, stage)
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware that times each request up to its response headers.
+
+    Requests are labelled by route template, so path parameters don't create new series.
+    It wraps send directly instead of going through BaseHTTPMiddleware, which would add
+    a task and a memory stream per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status: int) -> None:
+            nonlocal recorded
+            recorded = True
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
+
+        async def send_with_metrics(message) -> None:
+            if message["type"] == "http.response.start" and not recorded:
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if not recorded:
+                record(500)
+
+_OBJECT_PATH = re.compile(r"/crm/v\d+/(?:objects|associations)/([^/?]+)")
+
+def upstream_object_type(url: str) -> str:
+    """
+    Derive a low-cardinality object type label from an upstream request URL.
+    """
+    match = _OBJECT_PATH.search(url)
+    if match:
+        return match.group(1)
+    if "/oauth/" in url:
+        return "oauth"
+    return "other"
+
+def observe_upstream(integration: str, url: str, status: Optional[int], seconds: float) -> None:
+    """
+    Record one upstream request attempt; a status of None means it failed without a response.
+    """
+    UPSTREAM_REQUEST_DURATION.observe(
+        seconds, integration, upstream_object_type(url), str(status) if status is not None else "error"
+    )
+
+def render_metrics() -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+    """
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
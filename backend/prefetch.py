@@ -0,0 +1,269 @@
+
+import os
+import json
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.asyncio.client import Pipeline
+
+from hubspot_scheduler import background_priority
+from invalidation import start_invalidation_listener, stop_invalidation_listener
+from item_cache import invalidate_items
+from metrics import PREFETCH_JOBS, span
+from redis_store import close_redis, get_redis
+from registry import import_integration
+from ttl_cache import TTLCache
+
+# Prefetch configuration: "app" runs the scheduler and workers inside every API process,
+# "off" leaves them to a separate `python -m prefetch` process
+PREFETCH_MODE = os.environ.get("PREFETCH_MODE", "app")
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "2"))
+# How often connected users are scanned for due work; one process scans per interval
+PREFETCH_SCHEDULE_INTERVAL = float(os.environ.get("PREFETCH_SCHEDULE_INTERVAL", "10"))
+# Access tokens expiring within this many seconds are refreshed ahead of the request path
+PREFETCH_REFRESH_AHEAD = int(os.environ.get("PREFETCH_REFRESH_AHEAD", "900"))
+PREFETCH_REFRESH_RETRY = 60
+# Users who loaded items within the active window are synced every active interval,
+# those within the idle window every idle interval; older ones only get token refreshes
+PREFETCH_ACTIVE_WINDOW = int(os.environ.get("PREFETCH_ACTIVE_WINDOW", str(15 * 60)))
+PREFETCH_ACTIVE_INTERVAL = int(os.environ.get("PREFETCH_ACTIVE_INTERVAL", "30"))
+PREFETCH_IDLE_WINDOW = int(os.environ.get("PREFETCH_IDLE_WINDOW", str(24 * 3600)))
+PREFETCH_IDLE_INTERVAL = int(os.environ.get("PREFETCH_IDLE_INTERVAL", str(15 * 60)))
+# Each process writes a user's activity to Redis at most this often
+PREFETCH_ACTIVITY_THROTTLE = float(os.environ.get("PREFETCH_ACTIVITY_THROTTLE", "30"))
+
+# Queue wait per poll; kept below the Redis socket timeout
+PREFETCH_POLL_TIMEOUT = 2
+PREFETCH_SCAN_COUNT = 500
+
+# Redis keys: the job queue shared by every worker, the last activity per user
+# (a sorted set scored by epoch seconds) and the scheduler lease
+PREFETCH_QUEUE_KEY = "prefetch:jobs"
+PREFETCH_ACTIVITY_KEY = "prefetch:activity"
+PREFETCH_SCHEDULER_KEY = "prefetch:scheduler"
+PREFETCH_JOB_KINDS = ("refresh", "items")
+
+_recent_activity = TTLCache(10000, PREFETCH_ACTIVITY_THROTTLE)
+_tasks: List[asyncio.Task] = []
+
+def _member(integration_type: str, user_id: str, org_id: Optional[str]) -> str:
+    return json.dumps([integration_type, user_id, org_id])
+
+def _last_run_key(kind: str, integration_type: str, user_id: str, org_id: Optional[str]) -> str:
+    # When a job of this kind was last queued for the user/org (epoch seconds)
+    return f"prefetch:last_run:{kind}:{integration_type}:{user_id}:{org_id or ''}"
+
+def _job(kind: str, integration_type: str, user_id: str, org_id: Optional[str]) -> str:
+    return json.dumps({"kind": kind, "integration": integration_type, "user_id": user_id, "org_id": org_id})
+
+def _parse_job(data: bytes) -> Dict[str, Any]:
+    """
+    Decode a queued job.
+
+    Raises:
+        ValueError: If the job isn't one _job() could have written
+    """
+    job = json.loads(data)
+    if (
+        not isinstance(job, dict)
+        or job.get("kind") not in PREFETCH_JOB_KINDS
+        or not isinstance(job.get("integration"), str)
+        or not isinstance(job.get("user_id"), str)
+        or not isinstance(job.get("org_id"), (str, type(None)))
+    ):
+        raise ValueError("unknown kind or missing fields")
+    return job
+
+def queue_prefetch(integration_type: str, user_id: str, org_id: Optional[str], pipe: Pipeline) -> None:
+    """
+    Queue an immediate item prefetch for a user/org on a Redis pipeline and mark them active.
+
+    Called when an integration is connected, so the first load after login finds its items synced.
+    """
+    now = time.time()
+    pipe.zadd(PREFETCH_ACTIVITY_KEY, {_member(integration_type, user_id, org_id): now})
+    pipe.set(_last_run_key("items", integration_type, user_id, org_id), now, ex=PREFETCH_IDLE_INTERVAL)
+    pipe.lpush(PREFETCH_QUEUE_KEY, _job("items", integration_type, user_id, org_id))
+
+async def record_activity(integration_type: str, user_id: str, org_id: Optional[str] = None) -> None:
+    """
+    Note that a user is using an integration, which moves them to the frequent prefetch schedule.
+    """
+    key = (integration_type, user_id, org_id)
+    if _recent_activity.get(key) is not None:
+        return
+    _recent_activity.set(key, True)
+    await get_redis().zadd(PREFETCH_ACTIVITY_KEY, {_member(*key): time.time()})
+
+def _parse_credentials_key(key: str) -> Optional[Tuple[str, Optional[str]]]:
+    # hubspot_credentials:<user_id>[:<org_id>]; refresh leases share the prefix
+    parts = key.split(":")
+    if parts[-1] == "refresh_lock" or len(parts) not in (2, 3):
+        return None
+    return parts[1], parts[2] if len(parts) == 3 else None
+
+def _items_interval(last_active: Optional[float], now: float) -> Optional[int]:
+    if last_active is None:
+        return None
+    idle = now - last_active
+    if idle <= PREFETCH_ACTIVE_WINDOW:
+        return PREFETCH_ACTIVE_INTERVAL
+    if idle <= PREFETCH_IDLE_WINDOW:
+        return PREFETCH_IDLE_INTERVAL
+    return None
+
+async def _schedule_users(users: List[Tuple[bytes, str, Optional[str]]]) -> int:
+    """
+    Queue the refreshes and item syncs that are due for a batch of HubSpot users, in two round-trips.
+    """
+    redis = get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        for creds_key, user_id, org_id in users:
+            pipe.get(creds_key)
+            pipe.get(_last_run_key("refresh", "hubspot", user_id, org_id))
+            pipe.get(_last_run_key("items", "hubspot", user_id, org_id))
+        pipe.zmscore(PREFETCH_ACTIVITY_KEY, [_member("hubspot", user_id, org_id) for _, user_id, org_id in users])
+        results = await pipe.execute()
+
+    now = time.time()
+    due: List[Tuple[str, str, Optional[str], int]] = []
+    for position, (_, user_id, org_id) in enumerate(users):
+        credentials_json, last_refresh, last_items = results[position * 3:position * 3 + 3]
+        if not credentials_json:
+            continue
+        credentials = json.loads(credentials_json)
+        expires_at = credentials.get("expires_at")
+        if (
+            "refresh_token" in credentials
+            and last_refresh is None
+            and (expires_at is None or expires_at - now <= PREFETCH_REFRESH_AHEAD)
+        ):
+            due.append(("refresh", user_id, org_id, PREFETCH_REFRESH_RETRY))
+        interval = _items_interval(results[-1][position], now)
+        if interval is not None and (last_items is None or now - float(last_items) >= interval):
+            due.append(("items", user_id, org_id, PREFETCH_IDLE_INTERVAL))
+
+    if due:
+        async with redis.pipeline(transaction=False) as pipe:
+            for kind, user_id, org_id, ttl in due:
+                pipe.set(_last_run_key(kind, "hubspot", user_id, org_id), now, ex=ttl)
+            pipe.lpush(PREFETCH_QUEUE_KEY, *(_job(kind, "hubspot", user_id, org_id) for kind, user_id, org_id, _ in due))
+            await pipe.execute()
+    return len(due)
+
+async def schedule_prefetch() -> int:
+    """
+    Scan the connected HubSpot users and queue the work that is due for them.
+
+    Tokens close to expiry are refreshed, and items are synced on a schedule that
+    follows how recently the user was active. Returns the number of jobs queued.
+    """
+    redis = get_redis()
+    # Users idle for longer than the idle window drop back to token refreshes only
+    await redis.zremrangebyscore(PREFETCH_ACTIVITY_KEY, "-inf", time.time() - PREFETCH_IDLE_WINDOW)
+
+    queued = 0
+    users: List[Tuple[bytes, str, Optional[str]]] = []
+    async for key in redis.scan_iter(match="hubspot_credentials:*", count=PREFETCH_SCAN_COUNT):
+        user = _parse_credentials_key(key.decode("utf-8"))
+        if user is not None:
+            users.append((key, *user))
+        if len(users) >= PREFETCH_SCAN_COUNT:
+            queued += await _schedule_users(users)
+            users = []
+    if users:
+        queued += await _schedule_users(users)
+    return queued
+
+async def run_job(job: Dict[str, Any]) -> str:
+    """
+    Run one HubSpot prefetch job and return its outcome (ok, not_connected, or error if
+    an object type failed to sync).
+
+    Both kinds load the credentials with the wider prefetch refresh window, so a token
+    close to expiry is refreshed here instead of on a user's request. Item jobs then
+    sync the item store, and drop every process's cached list if anything changed.
+    """
+    hubspot = import_integration(job["integration"])
+    user_id, org_id = job["user_id"], job["org_id"]
+    with span("prefetch", job["kind"]):
+        auth = await hubspot.get_hubspot_credentials(user_id, org_id, refresh_window=PREFETCH_REFRESH_AHEAD)
+        if not auth.get("authenticated"):
+            return "not_connected"
+        if job["kind"] == "items":
+            written, failed = await hubspot.sync_hubspot_store(json.dumps(auth["credentials"]), user_id, org_id)
+            if written:
+                await invalidate_items(job["integration"], user_id, org_id)
+            if failed:
+                return "error"
+    return "ok"
+
+async def _run_worker() -> None:
+    while True:
+        try:
+            popped = await get_redis().brpop(PREFETCH_QUEUE_KEY, timeout=PREFETCH_POLL_TIMEOUT)
+        except Exception as e:
+            print(f"Error reading the prefetch queue: {str(e)}")
+            await asyncio.sleep(PREFETCH_POLL_TIMEOUT)
+            continue
+        if popped is None:
+            continue
+
+        try:
+            job = _parse_job(popped[1])
+        except ValueError as e:
+            # Dropped rather than retried, since it would fail the same way every time
+            print(f"Skipping invalid prefetch job {popped[1]!r}: {str(e)}")
+            PREFETCH_JOBS.inc("invalid", "error")
+            continue
+        try:
+            with background_priority():
+                result = await run_job(job)
+        except Exception as e:
+            print(f"Error prefetching {job['integration']} {job['kind']} for {job['user_id']}: {str(e)}")
+            result = "error"
+        PREFETCH_JOBS.inc(job["kind"], result)
+
+async def _run_scheduler() -> None:
+    lease_ms = int(PREFETCH_SCHEDULE_INTERVAL * 1000)
+    while True:
+        try:
+            # The lease is left to expire, so only one process scans per interval
+            if await get_redis().set(PREFETCH_SCHEDULER_KEY, os.getpid(), nx=True, px=lease_ms):
+                await schedule_prefetch()
+        except Exception as e:
+            print(f"Error scheduling prefetch jobs: {str(e)}")
+        await asyncio.sleep(PREFETCH_SCHEDULE_INTERVAL)
+
+def start_prefetch_workers(workers: int = PREFETCH_WORKERS) -> None:
+    """
+    Start the prefetch scheduler and worker tasks in this process.
+    """
+    if not _tasks:
+        _tasks.append(asyncio.create_task(_run_scheduler()))
+        _tasks.extend(asyncio.create_task(_run_worker()) for _ in range(workers))
+
+async def stop_prefetch_workers() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+async def _serve() -> None:
+    from hubspot_client import close_hubspot_client
+    start_invalidation_listener()
+    start_prefetch_workers()
+    try:
+        await asyncio.gather(*_tasks)
+    finally:
+        await stop_prefetch_workers()
+        await stop_invalidation_listener()
+        await close_hubspot_client()
+        await close_redis()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
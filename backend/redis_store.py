@@ -0,0 +1,63 @@
+
+import os
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+# Redis connection configuration
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "5"))
+
+# Number of requests written to Redis; a pipeline counts as a single round-trip
+_round_trips = 0
+
+class _RoundTripCounter:
+    """
+    Connection mixin that counts every packet sent to Redis.
+    """
+
+    async def send_packed_command(self, command, check_health: bool = True) -> None:
+        global _round_trips
+        _round_trips += 1
+        await super().send_packed_command(command, check_health)
+
+_pool: Optional[aioredis.ConnectionPool] = None
+_client: Optional[aioredis.Redis] = None
+
+def get_redis() -> aioredis.Redis:
+    """
+    Return the shared async Redis client, creating its connection pool on first use.
+    """
+    global _pool, _client
+    if _client is None:
+        _pool = aioredis.ConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+        )
+        # Count round-trips on whichever connection class the URL selected (plain, TLS or unix socket)
+        _pool.connection_class = type(
+            f"Counting{_pool.connection_class.__name__}",
+            (_RoundTripCounter, _pool.connection_class),
+            {},
+        )
+        _client = aioredis.Redis(connection_pool=_pool)
+    return _client
+
+def get_round_trip_count() -> int:
+    """
+    Return the number of Redis round-trips made by this process so far.
+    """
+    return _round_trips
+
+async def close_redis() -> None:
+    """
+    Close the shared Redis client and disconnect its pool.
+    """
+    global _pool, _client
+    if _client is not None:
+        await _client.aclose()
+        await _pool.disconnect()
+        _client = None
+        _pool = None
@@ -0,0 +1,217 @@
+
+import asyncio
+import inspect
+import importlib
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+
+class ConnectorSpec(NamedTuple):
+    """
+    Where an integration's module lives and which of its functions implement the connector interface.
+
+    The module is only imported the first time one of the functions is needed.
+    """
+    name: str
+    module: str
+    authorize: str
+    callback: str
+    credentials: str
+    load: str
+    # Optional incremental loader that syncs into the item store:
+    # sync(credentials, user_id, org_id, full=...) -> (items, parts served stale)
+    sync: Optional[str] = None
+    # Whether load accepts fields=[...] and fetches only what those fields need
+    load_fields: bool = False
+    # Whether load accepts failed=[...], where it lists the parts (e.g. object types) it
+    # couldn't load while still returning the rest
+    load_partial: bool = False
+
+class _CallbackRequest:
+    """
+    Stand-in for a Request, for OAuth callbacks that arrive as a JSON body instead of a redirect.
+    """
+
+    def __init__(self, code: str, state: str):
+        self.query_params = {"code": code, "state": state}
+
+class Connector:
+    """
+    The authorize, callback, credentials and load operations of one integration.
+
+    Integration functions may be sync or async; both are awaited the same way.
+    """
+
+    def __init__(self, spec: ConnectorSpec):
+        self.spec = spec
+        self.name = spec.name
+        self._module: Optional[ModuleType] = None
+        self._unavailable = False
+
+    @property
+    def module(self) -> ModuleType:
+        """
+        The integration module, imported on first use.
+
+        Raises:
+            HTTPException: 501 if the module (or one of its dependencies) can't be imported
+        """
+        if self._module is None:
+            if not self._unavailable:
+                try:
+                    self._module = importlib.import_module(self.spec.module)
+                    return self._module
+                except ImportError as e:
+                    # Remember the failure so it is logged once rather than on every request
+                    print(f"Error loading the {self.name} integration: {str(e)}")
+                    self._unavailable = True
+            raise HTTPException(status_code=501, detail=f"The {self.name} integration is not available")
+        return self._module
+
+    async def _call(self, function_name: str, *args: Any, **kwargs: Any) -> Any:
+        result = getattr(self.module, function_name)(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def authorize(self, user_id: str, org_id: Optional[str] = None) -> Any:
+        return await self._call(self.spec.authorize, user_id, org_id)
+
+    async def callback(self, request: Any) -> Any:
+        """
+        Complete the OAuth flow from a request carrying code and state query parameters.
+        """
+        return await self._call(self.spec.callback, request)
+
+    async def callback_with_code(self, code: str, state: str) -> Any:
+        return await self.callback(_CallbackRequest(code, state))
+
+    async def get_credentials(self, user_id: str, org_id: Optional[str] = None) -> Any:
+        return await self._call(self.spec.credentials, user_id, org_id)
+
+    async def has_credentials(self, user_id: str, org_id: Optional[str] = None) -> bool:
+        result = await self.get_credentials(user_id, org_id)
+        return bool(result and result.get("authenticated", False))
+
+    async def load_items(
+        self,
+        credentials: str,
+        fields: Optional[List[str]] = None,
+        failed: Optional[List[str]] = None
+    ) -> List[Any]:
+        """
+        Load the integration's items directly from the integration.
+
+        Args:
+            credentials: The credentials JSON string or access token
+            fields: IntegrationItem fields the caller needs; passed on where the integration
+                can fetch less upstream, otherwise the caller trims the items itself (optional)
+            failed: Collects the parts the integration couldn't load, where it serves the
+                rest without them; other integrations fail the whole load instead (optional)
+
+        Returns:
+            List[Any]: The integration items
+        """
+        kwargs: Dict[str, Any] = {}
+        if fields is not None and self.spec.load_fields:
+            kwargs["fields"] = fields
+        if failed is not None and self.spec.load_partial:
+            kwargs["failed"] = failed
+        return await self._call(self.spec.load, credentials, **kwargs)
+
+    async def sync_items(
+        self,
+        credentials: str,
+        user_id: str,
+        org_id: Optional[str] = None,
+        full: bool = False
+    ) -> Tuple[List[Any], List[str]]:
+        """
+        Load a user's items, syncing incrementally where the integration supports it.
+
+        Integrations with an item store serve what it holds when they can't be synced,
+        and report which parts of it (e.g. HubSpot object types) are stale.
+
+        Args:
+            credentials: The credentials JSON string or access token
+            user_id: The ID of the user the items belong to
+            org_id: The ID of the organization (optional)
+            full: Reload everything instead of only what changed since the last sync
+
+        Returns:
+            Tuple[List[Any], List[str]]: The integration items, and the parts that couldn't
+                be brought up to date (empty when everything is current)
+        """
+        if self.spec.sync is None:
+            return await self.load_items(credentials), []
+        return await self._call(self.spec.sync, credentials, user_id, org_id, full=full)
+
+CONNECTORS: Dict[str, Connector] = {
+    spec.name: Connector(spec)
+    for spec in (
+        ConnectorSpec(
+            name="hubspot",
+            module="hubspot",
+            authorize="authorize_hubspot",
+            callback="oauth2callback_hubspot",
+            credentials="get_hubspot_credentials",
+            load="get_items_hubspot",
+            sync="sync_items_hubspot",
+            load_fields=True,
+            load_partial=True,
+        ),
+        ConnectorSpec(
+            name="notion",
+            module="notion",
+            authorize="authorize_notion",
+            callback="oauth2callback_notion",
+            credentials="get_notion_credentials",
+            load="get_items_notion",
+        ),
+        ConnectorSpec(
+            name="airtable",
+            module="airtable",
+            authorize="authorize_airtable",
+            callback="oauth2callback_airtable",
+            credentials="get_airtable_credentials",
+            load="get_items_airtable",
+        ),
+    )
+}
+
+def get_connector(integration_type: str) -> Connector:
+    """
+    Return the connector for an integration.
+
+    Raises:
+        HTTPException: 404 if no such integration is registered
+    """
+    connector = CONNECTORS.get(integration_type)
+    if connector is None:
+        raise HTTPException(status_code=404, detail="Integration not found")
+    return connector
+
+def import_integration(integration_type: str) -> ModuleType:
+    """
+    Return an integration's module, importing it on first use.
+    """
+    return get_connector(integration_type).module
+
+async def gather_connectors(
+    call: Callable[[Connector], Any],
+    integration_types: Optional[List[str]] = None
+) -> Mapping[str, Any]:
+    """
+    Run one operation against several integrations concurrently.
+
+    Args:
+        call: Takes a connector and returns an awaitable
+        integration_types: The integrations to include (defaults to every registered one)
+
+    Returns:
+        Mapping[str, Any]: Each integration's result, or the exception it raised
+    """
+    connectors = [get_connector(name) for name in (integration_types or list(CONNECTORS))]
+    results = await asyncio.gather(*(call(connector) for connector in connectors), return_exceptions=True)
+    return {connector.name: result for connector, result in zip(connectors, results)}
@@ -0,0 +1,93 @@
+
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from redis.exceptions import LockError
+
+from deadline import extended_deadline, within_deadline
+from metrics import SINGLEFLIGHT_CALLS
+from redis_store import get_redis
+
+# Cross-worker lease: how long one load may hold it, and how often waiting workers check for its release
+SINGLEFLIGHT_LEASE_TTL = float(os.environ.get("SINGLEFLIGHT_LEASE_TTL", "30"))
+SINGLEFLIGHT_POLL_INTERVAL = 0.05
+
+T = TypeVar("T")
+
+# Loads in flight in this process, keyed by what they load
+_flights: Dict[str, asyncio.Future] = {}
+
+def _operation(key: str) -> str:
+    # Keys are "<operation>:<parameters>"; only the operation is used as a metric label
+    return key.split(":", 1)[0]
+
+def _finish(key: str, flight: asyncio.Future) -> None:
+    if _flights.get(key) is flight:
+        del _flights[key]
+    # Every caller may have been cancelled; don't leave the exception unretrieved
+    if not flight.cancelled():
+        flight.exception()
+
+async def _run_leased(
+    key: str,
+    load: Callable[[], Awaitable[T]],
+    after_wait: Optional[Callable[[], Awaitable[T]]]
+) -> T:
+    lock = get_redis().lock(f"singleflight:{key}", timeout=SINGLEFLIGHT_LEASE_TTL)
+    if await lock.acquire(blocking=False):
+        try:
+            return await load()
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                # The lease expired during the load; another worker may already hold it
+                pass
+
+    # Another worker is running the same load: wait for it to finish, then pick up its result
+    SINGLEFLIGHT_CALLS.inc(_operation(key), "waited")
+    deadline = time.monotonic() + SINGLEFLIGHT_LEASE_TTL
+    while time.monotonic() < deadline and await lock.locked():
+        await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+    return await (after_wait or load)()
+
+async def singleflight(
+    key: str,
+    load: Callable[[], Awaitable[T]],
+    lease: bool = False,
+    after_wait: Optional[Callable[[], Awaitable[T]]] = None
+) -> T:
+    """
+    Run a load once for every concurrent caller with the same key, and give each caller its result.
+
+    Args:
+        key: "<operation>:<parameters>", identifying what is loaded, for whom and how
+        load: Starts the load
+        lease: Also coalesce with other worker processes through a short Redis lease. Workers
+            that find it held wait for its release and then call after_wait (or load), so
+            this suits loads that leave their result somewhere cheap to read, like the item store
+        after_wait: Picks up the result after another worker's load (defaults to load)
+
+    Returns:
+        T: The result of the shared load; its exception is raised to every caller
+
+    Raises:
+        DeadlineExceeded: If the caller's deadline passes first; the load goes on for the others
+    """
+    flight = _flights.get(key)
+    if flight is None:
+        # The load is shared by callers with different deadlines, so it gets the longest one
+        # a request may have rather than its first caller's
+        with extended_deadline():
+            flight = asyncio.ensure_future(_run_leased(key, load, after_wait) if lease else load())
+        _flights[key] = flight
+        flight.add_done_callback(lambda done: _finish(key, done))
+        SINGLEFLIGHT_CALLS.inc(_operation(key), "leader")
+    else:
+        SINGLEFLIGHT_CALLS.inc(_operation(key), "joined")
+
+    # Each caller waits until its own deadline; the shared load is shielded, so one cancelled
+    # or timed out caller doesn't cancel it for the others
+    return await within_deadline(flight)
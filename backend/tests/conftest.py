@@ -0,0 +1,39 @@
+
+import os
+import sys
+from typing import Callable
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PREFETCH_MODE", "off")
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import circuit_breaker
+import hubspot_client
+import redis_store
+
+@pytest.fixture
+def redis(monkeypatch):
+    """
+    An in-memory Redis behind the shared client.
+    """
+    client = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(redis_store, "_client", client)
+    return client
+
+@pytest.fixture
+def hubspot_api(monkeypatch) -> Callable[[Callable[[httpx.Request], httpx.Response]], None]:
+    """
+    Answer HubSpot calls with a handler instead of the network.
+    """
+    def install(handler: Callable[[httpx.Request], httpx.Response]) -> None:
+        client = hubspot_client.HubSpotClient()
+        client._client = httpx.AsyncClient(
+            base_url=hubspot_client.HUBSPOT_API_BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        monkeypatch.setattr(hubspot_client, "_client", client)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    return install
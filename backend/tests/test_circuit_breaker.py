@@ -0,0 +1,60 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+def _fail(breaker, count):
+    for _ in range(count):
+        breaker.record(failed=True, probe=breaker.acquire())
+
+def test_a_circuit_opens_at_the_failure_rate_once_enough_calls_were_made(clock):
+    breaker = CircuitBreaker("hubspot", "contacts")
+    _fail(breaker, circuit_breaker.CIRCUIT_BREAKER_MIN_CALLS - 1)
+    assert breaker.state == CLOSED
+
+    _fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+def test_failures_that_left_the_window_are_forgotten(clock):
+    breaker = CircuitBreaker("hubspot", "contacts")
+    _fail(breaker, circuit_breaker.CIRCUIT_BREAKER_MIN_CALLS - 1)
+    clock[0] += circuit_breaker.CIRCUIT_BREAKER_WINDOW + 1
+    _fail(breaker, 1)
+    assert breaker.state == CLOSED
+
+def test_one_probe_after_the_open_period_closes_or_reopens_the_circuit(clock):
+    breaker = CircuitBreaker("hubspot", "contacts")
+    _fail(breaker, circuit_breaker.CIRCUIT_BREAKER_MIN_CALLS)
+    clock[0] += circuit_breaker.CIRCUIT_BREAKER_OPEN_SECONDS
+
+    probe = breaker.acquire()
+    assert probe and breaker.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.record(failed=True, probe=probe)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    clock[0] += circuit_breaker.CIRCUIT_BREAKER_OPEN_SECONDS
+    probe = breaker.acquire()
+    breaker.record(failed=False, probe=probe)
+    assert breaker.state == CLOSED
+    assert breaker.acquire() is False
+
+def test_a_probe_cut_short_lets_the_next_call_probe(clock):
+    breaker = CircuitBreaker("hubspot", "contacts")
+    _fail(breaker, circuit_breaker.CIRCUIT_BREAKER_MIN_CALLS)
+    clock[0] += circuit_breaker.CIRCUIT_BREAKER_OPEN_SECONDS
+
+    breaker.release(breaker.acquire())
+    assert breaker.acquire() is True
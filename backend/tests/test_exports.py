@@ -0,0 +1,126 @@
+import gzip
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import exports
+from file_response import RangedFileResponse, parse_range
+
+def _page(request):
+    after = request.url.params.get("after")
+    if after is None:
+        return httpx.Response(200, json={
+            "results": [{"id": "1", "properties": {"firstname": "Ada"}}],
+            "paging": {"next": {"after": "2"}},
+        })
+    return httpx.Response(200, json={"results": [{"id": after, "properties": {"firstname": "Grace"}}]})
+
+async def _connect(redis):
+    credentials = {"access_token": "token", "refresh_token": "refresh", "expires_at": int(time.time()) + 3600}
+    await redis.set("hubspot_credentials:demo_user", json.dumps(credentials))
+
+def _exported_ids(path):
+    with gzip.open(path, "rt") as file:
+        return [json.loads(line)["id"] for line in file]
+
+def test_a_resumed_export_drops_what_was_written_after_its_checkpoint(redis, hubspot_api, tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(tmp_path))
+    hubspot_api(_page)
+
+    async def scenario():
+        await _connect(redis)
+        job = await exports.create_export("demo_user", object_types=["contacts"], fields=["id"])
+        await exports._running[job["id"]]
+        complete = _exported_ids(exports.export_path(job["id"]))
+
+        # The first page is checkpointed, then a write of the second is cut short
+        job = await exports.get_export(job["id"])
+        with gzip.open(exports.export_path(job["id"]), "rb") as file:
+            first_page = gzip.compress(file.read().split(b"\n", 1)[0] + b"\n")
+        with open(exports.export_path(job["id"]), "wb") as file:
+            file.write(first_page + b"partial")
+        job.update(status="failed", object_type_index=0, after="2", bytes_written=len(first_page), items_written=1,
+                   items_by_type={"contacts": 1})
+        await exports._save(job)
+
+        await exports.resume_export(job)
+        await exports._running[job["id"]]
+        job = await exports.get_export(job["id"])
+        assert job["status"] == "completed"
+        assert job["items_written"] == 2
+        assert _exported_ids(exports.export_path(job["id"])) == complete == ["1", "2"]
+
+    asyncio.run(scenario())
+
+def test_an_export_file_shorter_than_its_checkpoint_starts_over(redis, hubspot_api, tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(tmp_path))
+    hubspot_api(_page)
+
+    async def scenario():
+        await _connect(redis)
+        job = await exports.create_export("demo_user", object_types=["contacts"], fields=["id"])
+        await exports._running[job["id"]]
+        job = await exports.get_export(job["id"])
+        with open(exports.export_path(job["id"]), "r+b") as file:
+            file.truncate(job["bytes_written"] // 2)
+        job.update(status="failed", object_type_index=0, after="2")
+        await exports._save(job)
+
+        await exports.resume_export(job)
+        await exports._running[job["id"]]
+        assert _exported_ids(exports.export_path(job["id"])) == ["1", "2"]
+
+    asyncio.run(scenario())
+
+def test_files_of_expired_export_jobs_are_swept(redis, tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(tmp_path))
+
+    async def scenario():
+        await redis.set("export_job:live", "{}")
+        for job_id in ("live", "expired"):
+            (tmp_path / f"{job_id}.ndjson.gz").write_bytes(b"")
+        (tmp_path / "notes.txt").write_bytes(b"")
+
+        assert await exports.sweep_export_files() == 1
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["live.ndjson.gz", "notes.txt"]
+
+    asyncio.run(scenario())
+
+def _download(path, range_header=None):
+    response = RangedFileResponse(str(path), range_header)
+    body = []
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message["body"])
+
+    asyncio.run(response({"type": "http"}, None, send))
+    return response, b"".join(body)
+
+def test_a_range_request_gets_only_the_bytes_it_asked_for(tmp_path, monkeypatch):
+    monkeypatch.setattr("file_response.FILE_CHUNK_SIZE", 3)
+    path = tmp_path / "export.ndjson.gz"
+    path.write_bytes(b"0123456789")
+
+    response, body = _download(path)
+    assert (response.status_code, body) == (200, b"0123456789")
+
+    response, body = _download(path, "bytes=2-7")
+    assert (response.status_code, body) == (206, b"234567")
+    assert response.headers["content-range"] == "bytes 2-7/10"
+    assert response.headers["content-length"] == "6"
+
+    response, body = _download(path, "bytes=-3")
+    assert (response.status_code, body) == (206, b"789")
+
+def test_a_range_outside_the_file_is_not_satisfiable():
+    with pytest.raises(HTTPException) as error:
+        parse_range("bytes=10-", 10)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */10"
+    # Anything but a single byte range is ignored and the whole file is sent
+    assert parse_range("bytes=0-1,4-5", 10) is None
@@ -0,0 +1,43 @@
+
+import json
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import hubspot
+
+def _answer(failing):
+    def handler(request):
+        object_type = request.url.path.rsplit("/", 1)[-1]
+        if object_type in failing:
+            return httpx.Response(403, json={"message": "missing scope"})
+        return httpx.Response(200, json={"results": [{"id": "1", "properties": {"firstname": "Ada"}}]})
+    return handler
+
+def test_a_failing_object_type_is_left_out_and_reported(redis, hubspot_api):
+    hubspot_api(_answer({"deals"}))
+    failed = []
+
+    items = asyncio.run(hubspot.get_items_hubspot("token", ["contacts", "deals"], failed=failed))
+    assert [(item.type, item.id) for item in items] == [("contact", "1")]
+    assert failed == ["deals"]
+
+def test_a_load_fails_when_every_object_type_does(redis, hubspot_api):
+    hubspot_api(_answer({"contacts", "deals"}))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(hubspot.get_items_hubspot("token", ["contacts", "deals"]))
+    assert error.value.status_code == 502
+
+def test_the_portal_of_a_bare_token_comes_from_the_stored_credentials(redis):
+    async def scenario():
+        credentials = {"access_token": "token", "refresh_token": "refresh", "hub_id": 111}
+        await redis.set("hubspot_credentials:demo_user", json.dumps(credentials))
+        assert await hubspot.hubspot_portal(json.dumps(credentials)) == 111
+        assert await hubspot.hubspot_portal("token", "demo_user") == 111
+        # A token the user's credentials don't hold isn't attributed to their portal
+        assert await hubspot.hubspot_portal("another token", "demo_user") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import hubspot
+import hubspot_scheduler
+from registry import _CallbackRequest
+
+def test_reconnecting_to_another_portal_moves_the_user_between_portal_indexes(redis, hubspot_api):
+    hub_ids = iter([111, 222])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/oauth/v1/token":
+            return httpx.Response(200, json={"access_token": "token", "refresh_token": "refresh", "expires_in": 3600})
+        return httpx.Response(200, json={"hub_id": next(hub_ids)})
+    hubspot_api(handler)
+
+    async def connect(state: str) -> None:
+        await redis.set(f"state:{state}", "demo_user")
+        await hubspot.oauth2callback_hubspot(_CallbackRequest("code", state))
+
+    async def scenario():
+        member = json.dumps(["demo_user", None]).encode("utf-8")
+        await connect("first")
+        assert await redis.smembers(hubspot.portal_key(111)) == {member}
+
+        await connect("second")
+        assert await redis.smembers(hubspot.portal_key(111)) == set()
+        assert await redis.smembers(hubspot.portal_key(222)) == {member}
+        stored = json.loads(await redis.get("hubspot_credentials:demo_user"))
+        assert stored["hub_id"] == 222
+
+    asyncio.run(scenario())
+
+def _store_expired_credentials(redis):
+    credentials = {"access_token": "expired", "refresh_token": "refresh", "expires_at": int(time.time()) - 60}
+    return redis.set("hubspot_credentials:demo_user", json.dumps(credentials))
+
+def test_expired_credentials_survive_a_failing_token_endpoint(redis, hubspot_api, monkeypatch):
+    monkeypatch.setattr(hubspot_scheduler, "HUBSPOT_RETRY_ATTEMPTS", 0)
+    hubspot_api(lambda request: httpx.Response(503, json={"message": "unavailable"}))
+
+    async def scenario():
+        await _store_expired_credentials(redis)
+        with pytest.raises(HTTPException) as error:
+            await hubspot.get_hubspot_credentials("demo_user")
+        assert error.value.status_code == 502
+        assert await redis.exists("hubspot_credentials:demo_user")
+
+    asyncio.run(scenario())
+
+def test_a_rejected_refresh_token_disconnects_the_user(redis, hubspot_api):
+    hubspot_api(lambda request: httpx.Response(400, json={"error": "invalid_grant"}))
+
+    async def scenario():
+        await _store_expired_credentials(redis)
+        assert await hubspot.get_hubspot_credentials("demo_user") == {"authenticated": False}
+        assert not await redis.exists("hubspot_credentials:demo_user")
+
+    asyncio.run(scenario())
+
+def test_a_failed_portal_lookup_still_connects_without_logging_the_token(redis, hubspot_api, monkeypatch, capsys):
+    monkeypatch.setattr(hubspot_scheduler, "HUBSPOT_RETRY_ATTEMPTS", 0)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/oauth/v1/token":
+            return httpx.Response(200, json={"access_token": "secret-token", "refresh_token": "refresh", "expires_in": 3600})
+        return httpx.Response(503, json={"message": "unavailable"})
+    hubspot_api(handler)
+
+    async def scenario():
+        await redis.set("state:lookup", "demo_user")
+        result = await hubspot.oauth2callback_hubspot(_CallbackRequest("code", "lookup"))
+        assert result["success"]
+        stored = json.loads(await redis.get("hubspot_credentials:demo_user"))
+        assert stored["access_token"] == "secret-token" and "hub_id" not in stored
+
+    asyncio.run(scenario())
+    logged = capsys.readouterr().out
+    assert "Error looking up HubSpot portal" in logged and "secret-token" not in logged
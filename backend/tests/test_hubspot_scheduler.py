@@ -0,0 +1,88 @@
+
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import hubspot_scheduler
+from deadline import DeadlineExceeded, deadline_after
+from hubspot_scheduler import (
+    BACKGROUND, HubSpotScheduler, RateLimitExceeded, TokenBucket, background_priority, for_portal, portal_key
+)
+
+def test_tokens_of_one_portal_share_a_bucket():
+    with for_portal(111):
+        assert portal_key("first user's token") == portal_key("second user's token") == "portal:111"
+        # A caller that doesn't know the portal keeps the enclosing one
+        with for_portal(None):
+            assert portal_key("first user's token") == "portal:111"
+    # Without a known portal, each token is its own bucket
+    assert portal_key("first user's token") != portal_key("second user's token")
+    assert portal_key(None) == "oauth"
+
+def _responses(*responses):
+    sent = []
+    pending = list(responses)
+
+    async def send():
+        sent.append(time.monotonic())
+        return pending.pop(0)
+    return send, sent
+
+def test_a_429_is_retried_after_retry_after_and_holds_back_the_portal():
+    scheduler = HubSpotScheduler()
+    send, sent = _responses(httpx.Response(429, headers={"Retry-After": "0.05"}), httpx.Response(200))
+
+    response = asyncio.run(scheduler.send("portal:111", send))
+    assert response.status_code == 200
+    assert sent[1] - sent[0] >= 0.05
+    assert scheduler.bucket("portal:111").blocked_until > 0
+
+def test_5xx_responses_are_retried_until_attempts_run_out(monkeypatch):
+    monkeypatch.setattr(hubspot_scheduler, "HUBSPOT_RETRY_ATTEMPTS", 2)
+    monkeypatch.setattr(hubspot_scheduler, "HUBSPOT_RETRY_BASE_DELAY", 0.001)
+    send, sent = _responses(*(httpx.Response(503) for _ in range(3)))
+
+    response = asyncio.run(HubSpotScheduler().send("portal:111", send))
+    assert response.status_code == 503
+    assert len(sent) == 3
+
+def test_retries_stop_when_the_wait_would_pass_the_deadline():
+    send, sent = _responses(httpx.Response(429, headers={"Retry-After": "5"}), httpx.Response(200))
+
+    async def call():
+        with deadline_after(0.5):
+            return await HubSpotScheduler().send("portal:111", send)
+
+    assert asyncio.run(call()).status_code == 429
+    assert len(sent) == 1
+
+def test_buckets_follow_the_limits_hubspot_reports():
+    bucket = TokenBucket(capacity=100, interval=10)
+    bucket.update_from_headers(httpx.Headers({
+        "X-HubSpot-RateLimit-Max": "10",
+        "X-HubSpot-RateLimit-Interval-Milliseconds": "1000",
+        "X-HubSpot-RateLimit-Remaining": "0",
+    }))
+    assert (bucket.capacity, bucket.rate, bucket.tokens) == (10, 10.0, 0.0)
+
+    async def acquire():
+        with deadline_after(0.01):
+            await bucket.acquire()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(acquire())
+
+def test_background_calls_stop_at_the_daily_reserve():
+    bucket = TokenBucket()
+    bucket.update_from_headers(httpx.Headers({"X-HubSpot-RateLimit-Daily-Remaining": "10"}))
+
+    async def acquire():
+        with background_priority():
+            await bucket.acquire(BACKGROUND)
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(acquire())
+    # Interactive calls may still use the reserve
+    asyncio.run(bucket.acquire())
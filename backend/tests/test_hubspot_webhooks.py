@@ -0,0 +1,37 @@
+
+import time
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import hubspot_webhooks
+import main
+from hubspot_webhooks import HUBSPOT_WEBHOOK_MAX_AGE_MS, verify_signature
+
+class _Request:
+    method = "POST"
+    url = "https://example.com/integrations/hubspot/webhook"
+
+    def __init__(self, timestamp_ms: int):
+        self.headers = {"X-HubSpot-Signature-v3": "signature", "X-HubSpot-Request-Timestamp": str(timestamp_ms)}
+
+@pytest.mark.parametrize("offset_ms", [-HUBSPOT_WEBHOOK_MAX_AGE_MS - 1000, HUBSPOT_WEBHOOK_MAX_AGE_MS + 1000])
+def test_timestamps_outside_the_window_are_rejected(offset_ms):
+    with pytest.raises(HTTPException) as error:
+        verify_signature(_Request(int(time.time() * 1000) + offset_ms), b"[]")
+    assert error.value.detail == "Expired HubSpot request timestamp"
+
+@pytest.mark.parametrize("body", [b"5", b'"event"', b"null", b"[5]", b'[{"objectId": 1}, "event"]'])
+def test_payloads_that_are_not_events_are_rejected(body, monkeypatch):
+    monkeypatch.setattr(hubspot_webhooks, "verify_signature", lambda request, body: None)
+    monkeypatch.setattr(hubspot_webhooks, "enqueue_events", lambda events: pytest.fail("enqueued"))
+
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.post("/integrations/hubspot/webhook", content=body)
+
+    response = asyncio.run(post())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid webhook payload"
@@ -0,0 +1,39 @@
+
+import asyncio
+import json
+
+import invalidation
+import item_cache
+
+def test_invalidated_items_are_dropped_by_other_processes(redis, monkeypatch):
+    monkeypatch.setattr(invalidation, "_subscribed", True)
+    item_cache.cache_items("hubspot", "demo_user", "demo_org", [])
+    assert item_cache.get_cached_items("hubspot", "demo_user", "demo_org") is not None
+
+    async def publish():
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(invalidation.INVALIDATION_CHANNEL)
+        await item_cache.invalidate_items("hubspot", "demo_user", "demo_org")
+        for _ in range(10):
+            message = await pubsub.get_message(timeout=0.1)
+            if message is not None:
+                break
+        await pubsub.aclose()
+        return message
+
+    message = asyncio.run(publish())
+    assert item_cache.get_cached_items("hubspot", "demo_user", "demo_org") is None
+
+    # The same message, received by a process that still has the list cached
+    item_cache.cache_items("hubspot", "demo_user", "demo_org", [])
+    published = json.loads(message["data"])
+    invalidation._apply(json.dumps({**published, "origin": "another-process"}).encode())
+    assert item_cache.get_cached_items("hubspot", "demo_user", "demo_org") is None
+
+def test_if_none_match_accepts_lists_weak_tags_and_wildcards():
+    etag = item_cache.serialize_items([]).etag
+    assert item_cache.etag_matches(etag, etag)
+    assert item_cache.etag_matches(f'"other", W/{etag}', etag)
+    assert item_cache.etag_matches("*", etag)
+    assert not item_cache.etag_matches('"other"', etag)
+    assert not item_cache.etag_matches(None, etag)
@@ -0,0 +1,48 @@
+from item_index import ItemIndex
+
+def _item(item_id, name, item_type="contact", updated_at=None):
+    return {"id": item_id, "type": item_type, "name": name, "updated_at": updated_at}
+
+def _ids(result):
+    total, items = result
+    return total, [f"{item['type']}:{item['id']}" for item in items]
+
+def test_queries_prefix_match_every_token_and_filter_by_type():
+    index = ItemIndex()
+    index.replace([
+        _item("1", "Ada Lovelace"),
+        _item("2", "Grace Hopper"),
+        _item("1", "Lovelace Analytics", item_type="company"),
+    ])
+
+    assert _ids(index.search("love")) == (2, ["company:1", "contact:1"])
+    assert _ids(index.search("ada love")) == (1, ["contact:1"])
+    assert _ids(index.search("love", types={"company"})) == (1, ["company:1"])
+    assert _ids(index.search("turing")) == (0, [])
+
+def test_replacing_the_item_list_only_reindexes_what_changed():
+    index = ItemIndex()
+    assert index.replace([_item("1", "Ada Lovelace"), _item("2", "Grace Hopper"), _item("3", "Alan Turing")]) == 3
+
+    # One renamed, one removed, one added, one unchanged
+    changed = index.replace([_item("1", "Ada King"), _item("2", "Grace Hopper"), _item("4", "Edsger Dijkstra")])
+    assert changed == 3
+    assert len(index) == 3
+    assert _ids(index.search("lovelace")) == (0, [])
+    assert _ids(index.search("king")) == (1, ["contact:1"])
+    assert _ids(index.search("turing")) == (0, [])
+    assert _ids(index.search("dijk")) == (1, ["contact:4"])
+    assert index.replace([_item("1", "Ada King"), _item("2", "Grace Hopper"), _item("4", "Edsger Dijkstra")]) == 0
+
+def test_sorting_and_paging_follow_reindexed_values():
+    index = ItemIndex()
+    index.replace([
+        _item("1", "Ada", updated_at="2024-01-03"),
+        _item("2", "Grace", updated_at="2024-01-01"),
+        _item("3", "Alan", updated_at="2024-01-02"),
+    ])
+    index.upsert([_item("2", "Grace", updated_at="2024-01-04")])
+
+    assert _ids(index.search(sort="updated_at")) == (3, ["contact:3", "contact:1", "contact:2"])
+    assert _ids(index.search(sort="updated_at", descending=True, limit=2)) == (3, ["contact:2", "contact:1"])
+    assert _ids(index.search(limit=1, offset=1)) == (3, ["contact:2"])
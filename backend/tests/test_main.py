@@ -0,0 +1,114 @@
+
+import json
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import main
+from integration_item import IntegrationItem
+from item_cache import serialize_items
+from item_serializer import dump_items
+
+def _item(item_id):
+    return IntegrationItem(
+        id=item_id, type="contact", name="Ada Lovelace", icon=None, description=None,
+        created_at=None, created_by=None, updated_at=None, url=None
+    )
+
+def test_failed_association_reads_are_reported_as_bad_gateway(redis, hubspot_api):
+    hubspot_api(lambda request: httpx.Response(403, json={"message": "missing scope"}))
+    body = dump_items([_item("1")])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.with_associations("token", body, "demo_user"))
+    assert error.value.status_code == 502
+
+async def _pages_failing(failed, late_failure):
+    yield [_item("1")]
+    # An object type fails after the response (and its X-Degraded header) started
+    failed.append(late_failure)
+    yield [_item("2")]
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+def test_ndjson_streams_end_with_a_status_record_listing_failed_types():
+    failed = ["deals"]
+    chunks = asyncio.run(_collect(main.stream_ndjson(_pages_failing(failed, "tickets"), None, failed, 1)))
+    lines = b"".join(chunks).splitlines()
+    assert [json.loads(line)["id"] for line in lines[:-1]] == ["1", "2"]
+    assert json.loads(lines[-1]) == {"error": "Some object types failed to load", "failed_types": ["deals", "tickets"]}
+
+def test_json_streams_are_left_unclosed_when_a_type_fails_after_they_started():
+    failed = []
+    chunks = []
+
+    async def consume():
+        async for chunk in main.stream_json_array(_pages_failing(failed, "tickets"), None, failed, 0):
+            chunks.append(chunk)
+
+    with pytest.raises(main.StreamIncomplete):
+        asyncio.run(consume())
+    assert not b"".join(chunks).endswith(b"]")
+
+def test_json_streams_close_when_every_failure_was_reported_up_front():
+    async def pages():
+        yield [_item("1")]
+
+    body = b"".join(asyncio.run(_collect(main.stream_json_array(pages(), None, ["deals"], 1))))
+    assert [item["id"] for item in json.loads(body)] == ["1"]
+
+def test_loads_past_the_items_budget_are_kept_until_they_finish(redis, monkeypatch, capsys):
+    release = None
+
+    async def slow_load(connector, user_id, full):
+        await release.wait()
+        raise RuntimeError("HubSpot went away")
+
+    monkeypatch.setattr(main, "load_source", slow_load)
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        response = await main.get_all_items(budget_ms=10, sync="incremental", integrations="hubspot", fields=None)
+        assert json.loads(response.body)["sources"]["hubspot"]["status"] == "timeout"
+        assert len(main._background_loads) == 1
+
+        release.set()
+        await asyncio.gather(*main._background_loads, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert not main._background_loads
+
+    asyncio.run(scenario())
+    assert "HubSpot went away" in capsys.readouterr().out
+
+def test_repeat_item_loads_with_a_matching_etag_get_a_304(redis, monkeypatch):
+    cached = serialize_items([_item("1")])
+
+    async def load_cached_items(connector, credentials, user_id, full):
+        return cached
+
+    monkeypatch.setattr(main, "load_cached_items", load_cached_items)
+
+    async def get(url, if_none_match=None):
+        headers = {"Authorization": "Bearer token"}
+        if if_none_match:
+            headers["If-None-Match"] = if_none_match
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.get(url, headers=headers)
+
+    first = asyncio.run(get("/items/hubspot"))
+    assert first.status_code == 200
+    assert first.headers["ETag"] == cached.etag
+
+    repeat = asyncio.run(get("/items/hubspot", cached.etag))
+    assert (repeat.status_code, repeat.content) == (304, b"")
+    assert repeat.headers["ETag"] == cached.etag
+
+    # A field selection is versioned separately from the full list
+    projected = asyncio.run(get("/items/hubspot?fields=id,name", cached.etag))
+    assert projected.status_code == 200
+    assert projected.headers["ETag"] != cached.etag
+    assert asyncio.run(get("/items/hubspot?fields=id,name", projected.headers["ETag"])).status_code == 304
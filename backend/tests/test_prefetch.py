@@ -0,0 +1,32 @@
+
+import asyncio
+
+import prefetch
+from metrics import PREFETCH_JOBS
+
+def test_worker_skips_invalid_jobs_and_keeps_running(redis, monkeypatch):
+    ran = []
+
+    async def run_job(job):
+        ran.append(job)
+        return "ok"
+
+    monkeypatch.setattr(prefetch, "run_job", run_job)
+    monkeypatch.setattr(prefetch, "PREFETCH_POLL_TIMEOUT", 0.01)
+    monkeypatch.setattr(PREFETCH_JOBS, "_values", {})
+
+    async def run():
+        await redis.lpush(prefetch.PREFETCH_QUEUE_KEY, b"{not json", b'{"kind": "items"}')
+        await redis.lpush(prefetch.PREFETCH_QUEUE_KEY, prefetch._job("items", "hubspot", "demo_user", None))
+        worker = asyncio.create_task(prefetch._run_worker())
+        for _ in range(100):
+            if await redis.llen(prefetch.PREFETCH_QUEUE_KEY) == 0:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    asyncio.run(run())
+    assert ran == [{"kind": "items", "integration": "hubspot", "user_id": "demo_user", "org_id": None}]
+    assert PREFETCH_JOBS._values == {("invalid", "error"): 2, ("items", "ok"): 1}
@@ -0,0 +1,90 @@
+
+import asyncio
+
+from deadline import REQUEST_MAX_DEADLINE, DeadlineExceeded, deadline_after, remaining
+from singleflight import singleflight
+
+def test_callers_of_a_shared_load_each_wait_until_their_own_deadline():
+    load_deadlines = []
+
+    async def load():
+        load_deadlines.append(remaining())
+        await asyncio.sleep(0.1)
+        return "items"
+
+    async def call(seconds):
+        with deadline_after(seconds):
+            return await singleflight("test:shared", load)
+
+    async def run():
+        # The short-deadline caller starts the load, and the other one joins it
+        return await asyncio.gather(call(0.02), call(None), return_exceptions=True)
+
+    short, unbounded = asyncio.run(run())
+    assert isinstance(short, DeadlineExceeded)
+    assert unbounded == "items"
+    # The load isn't cut to its first caller's deadline, but it isn't unbounded either
+    assert 1 < load_deadlines[0] <= REQUEST_MAX_DEADLINE
+
+def test_a_load_started_by_background_work_has_no_deadline():
+    load_deadlines = []
+
+    async def load():
+        load_deadlines.append(remaining())
+        return "items"
+
+    assert asyncio.run(singleflight("test:background", load)) == "items"
+    assert load_deadlines == [None]
+
+def test_concurrent_callers_share_one_load_and_its_failure():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) > 1:
+            return "items"
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        failures = await asyncio.gather(*(singleflight("test:failing", load) for _ in range(3)), return_exceptions=True)
+        # The flight is gone once it finished, so the next caller starts a new load
+        return failures, await singleflight("test:failing", load)
+
+    failures, retried = asyncio.run(run())
+    assert [str(failure) for failure in failures] == ["upstream failed"] * 3
+    assert retried == "items"
+    assert len(calls) == 2
+
+def test_a_cancelled_caller_leaves_the_load_running_for_the_others():
+    async def load():
+        await asyncio.sleep(0.05)
+        return "items"
+
+    async def run():
+        first = asyncio.ensure_future(singleflight("test:cancelled", load))
+        second = asyncio.ensure_future(singleflight("test:cancelled", load))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        return first.cancelled(), await second
+
+    assert asyncio.run(run()) == (True, "items")
+
+def test_workers_that_find_the_lease_held_pick_up_the_result_after_it_is_released(redis):
+    async def load():
+        raise AssertionError("loaded again")
+
+    async def after_wait():
+        return "stored items"
+
+    async def run():
+        lease = redis.lock("singleflight:test:leased", timeout=5)
+        await lease.acquire()
+        waiter = asyncio.ensure_future(singleflight("test:leased", load, lease=True, after_wait=after_wait))
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        await lease.release()
+        return await waiter
+
+    assert asyncio.run(run()) == "stored items"